@@ -3,6 +3,7 @@ import sys
 import logging
 import asyncio
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -12,10 +13,41 @@ from config.logging_config import setup_logging
 setup_logging()
 logger = logging.getLogger("app")
 from services.binary_manager import initialize_binaries
-from routers import status, downloader, utils
+from routers import status, downloader, files, metrics, queue, utils
+from services.live_watcher import live_watcher
+from services.log_spool import log_spool
+from services.resource_sampler import resource_sampler
+from services.metrics import StatusMetricsMiddleware, monitor_event_loop
+from services.storage import storage
+from services.task_history import task_history
+from services.task_registry import task_registry
+from services.task_store import task_store
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Restores persisted tasks and starts the log spool on startup; flushes pending writes on shutdown."""
+    initialize_binaries()
+    await log_spool.start()
+    for uid in await task_store.start():
+        live_watcher.submit(uid)
+    await task_registry.start(status.describe_task)
+    live_watcher.start()
+    resource_sampler.start()
+    task_history.start()
+    lag_monitor = asyncio.create_task(monitor_event_loop())
+    yield
+    lag_monitor.cancel()
+    live_watcher.stop()
+    resource_sampler.stop()
+    task_history.stop()
+    await task_registry.stop()
+    await task_store.stop()
+    await log_spool.stop()
+    storage.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 app.add_middleware(
@@ -24,15 +56,22 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"]
 )
+app.add_middleware(StatusMetricsMiddleware)
 
 app.include_router(downloader.router)
 app.include_router(status.router)
+app.include_router(queue.router)
+app.include_router(files.router)
+app.include_router(metrics.router)
 app.include_router(utils.router)
 
 @app.get("/reboot")
 async def reboot():
     """Triggers an application exit, useful for containerized environments to restart."""
     logger.critical("Reboot endpoint called. Exiting application.")
+    await task_registry.stop()
+    await task_store.stop()
+    await log_spool.stop()
     os._exit(0)
 
 @app.get("/")
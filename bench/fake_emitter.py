@@ -0,0 +1,82 @@
+"""
+Stand-in for ytarchive/yt-dlp that replays realistic progress output.
+
+It ignores the arguments the app passes and is configured through
+environment variables, so the app's command builder can be used unchanged:
+
+    BENCH_MODE      ytdlp or ytarchive (default: ytdlp)
+    BENCH_LINES     number of progress lines to print (default: 2000)
+    BENCH_RATE      progress lines per second, 0 for as fast as possible (default: 0)
+    BENCH_FORMATS   yt-dlp only: number of "N: [download]" prefixed formats (default: 1)
+    BENCH_CR_ONLY   1 to redraw progress with bare carriage returns (default: ytarchive only)
+    BENCH_INFO_EVERY  print a regular log line every N progress lines (default: 200)
+    BENCH_SEED      seed for the jitter in the numbers (default: 1)
+"""
+import os
+import sys
+import time
+import random
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def ytdlp_line(i: int, lines: int, prefix: str, rng: random.Random) -> str:
+    percent = 100.0 * (i + 1) / lines
+    speed = 4 + rng.random() * 4
+    eta = int((lines - i) / 10)
+    return (
+        f"{prefix}[download]  {percent:5.1f}% of ~ 1.23GiB at {speed:5.2f}MiB/s "
+        f"ETA {eta // 60:02d}:{eta % 60:02d} (frag {i + 1}/{lines})"
+    )
+
+
+def ytarchive_line(i: int, rng: random.Random) -> str:
+    total = (i + 1) * (1.5 + rng.random() * 0.1)
+    return f"Video Fragments: {i + 1}; Audio Fragments: {i + 1}; Total Downloaded: {total:.2f}MiB"
+
+
+def main():
+    mode = os.environ.get("BENCH_MODE", "ytdlp")
+    lines = _env_int("BENCH_LINES", 2000)
+    rate = float(os.environ.get("BENCH_RATE", 0))
+    formats = max(1, _env_int("BENCH_FORMATS", 1))
+    cr_only = os.environ.get("BENCH_CR_ONLY", "1" if mode == "ytarchive" else "0") == "1"
+    info_every = _env_int("BENCH_INFO_EVERY", 200)
+    rng = random.Random(_env_int("BENCH_SEED", 1))
+    out = sys.stdout
+
+    out.write("[info] Fake emitter starting\n" if mode == "ytdlp" else "Selected quality: best\n")
+    interval = 1.0 / rate if rate > 0 else 0.0
+    next_at = time.monotonic()
+
+    for i in range(lines):
+        if mode == "ytarchive":
+            line = ytarchive_line(i, rng)
+        else:
+            prefix = f"{i % formats}: " if formats > 1 else ""
+            line = ytdlp_line(i, lines, prefix, rng)
+
+        out.write(f"\r{line}" if cr_only else f"{line}\n")
+        if info_every and i % info_every == info_every - 1:
+            out.write(f"{'' if not cr_only else chr(10)}[info] checkpoint {i + 1}\n")
+
+        if interval:
+            out.flush()
+            next_at += interval
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    if cr_only:
+        out.write("\n")
+    if mode == "ytarchive":
+        out.write("Muxing final file...\nFinal file: /downloads/bench.mkv\n")
+    else:
+        out.write("[Merger] Merging formats into \"/downloads/bench.mkv\"\n")
+    out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Offline load test for the server.
+
+Starts the app in-process with YTARCHIVE_BIN/YTDLP_BIN pointed at
+`fake_emitter.py`, submits N tasks through POST /record while M clients poll
+/status, and reports:
+
+  * lines/sec handled by run_download
+  * event-loop lag (p50/p99/max)
+  * RSS growth of the server process
+  * /status latency and payload size
+
+Requests are made by calling the ASGI app directly, so no network or extra
+dependencies are needed. Output is deterministic for a given set of options;
+use --json to save results and compare runs before and after a change:
+
+    python bench/run_bench.py --tasks 20 --clients 5 --lines 5000
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import tempfile
+import statistics
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+EMITTER = Path(__file__).resolve().parent / "fake_emitter.py"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=10, help="concurrent download tasks")
+    parser.add_argument("--clients", type=int, default=5, help="concurrent /status pollers")
+    parser.add_argument("--binary", choices=("ytdlp", "ytarchive", "mixed"), default="mixed")
+    parser.add_argument("--lines", type=int, default=2000, help="progress lines per task")
+    parser.add_argument("--rate", type=float, default=0, help="progress lines/sec per task, 0 = unthrottled")
+    parser.add_argument("--formats", type=int, default=2, help="yt-dlp 'N: [download]' formats per task")
+    parser.add_argument("--cr-only", choices=("auto", "0", "1"), default="auto", help="redraw progress with bare \\r")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="seconds between polls per client")
+    parser.add_argument("--status-mode", choices=("delta", "full"), default="delta", help="poll /status?since= or plain /status")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", type=Path, help="write results to this file")
+    return parser.parse_args()
+
+
+def make_fake_binaries(workdir: Path, args: argparse.Namespace) -> Dict[str, str]:
+    """Writes wrapper scripts that run the emitter and returns the env vars pointing at them."""
+    env = {}
+    for name, var in (("ytarchive", "YTARCHIVE_BIN"), ("ytdlp", "YTDLP_BIN")):
+        wrapper = workdir / name
+        wrapper.write_text(f'#!/bin/sh\nBENCH_MODE={name} exec "{sys.executable}" "{EMITTER}"\n')
+        wrapper.chmod(0o755)
+        env[var] = str(wrapper)
+    env["BENCH_LINES"] = str(args.lines)
+    env["BENCH_RATE"] = str(args.rate)
+    env["BENCH_FORMATS"] = str(args.formats)
+    env["BENCH_SEED"] = str(args.seed)
+    if args.cr_only != "auto":
+        env["BENCH_CR_ONLY"] = args.cr_only
+    return env
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def asgi_request(app, method: str, path: str, query: str = "", body: Optional[dict] = None) -> Tuple[int, bytes]:
+    """Performs one HTTP request against the ASGI app in-process."""
+    payload = json.dumps(body).encode() if body is not None else b""
+    headers = [(b"content-type", b"application/json")] if body is not None else []
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "headers": headers, "root_path": "",
+        "client": ("bench", 0), "server": ("bench", 80),
+    }
+    sent = False
+    status = 0
+    chunks: List[bytes] = []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+async def probe_loop(stop: asyncio.Event, lags: List[float], rss: List[int], interval: float = 0.05):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - start - interval))
+        rss.append(rss_bytes())
+
+
+async def poll_client(app, stop: asyncio.Event, mode: str, interval: float, latencies: List[float], sizes: List[int]):
+    cursor = 0
+    while not stop.is_set():
+        query = f"since={cursor}" if mode == "delta" else ""
+        start = time.perf_counter()
+        status, body = await asgi_request(app, "GET", "/status", query)
+        latencies.append(time.perf_counter() - start)
+        sizes.append(len(body))
+        if mode == "delta" and status == 200:
+            cursor = json.loads(body)["cursor"]
+        await asyncio.sleep(interval)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from app import app
+    from config.dependencies import tasks
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    stop = asyncio.Event()
+    lags: List[float] = []
+    rss: List[int] = []
+    latencies: List[float] = []
+    sizes: List[int] = []
+
+    async with app.router.lifespan_context(app):
+        rss_start = rss_bytes()
+        probe = asyncio.create_task(probe_loop(stop, lags, rss))
+        clients = [
+            asyncio.create_task(poll_client(app, stop, args.status_mode, args.poll_interval, latencies, sizes))
+            for _ in range(args.clients)
+        ]
+
+        started = time.perf_counter()
+        for i in range(args.tasks):
+            binary = args.binary if args.binary != "mixed" else ("ytarchive", "ytdlp")[i % 2]
+            status, body = await asgi_request(app, "POST", "/record", body={
+                "youtubeID": f"bench{i:04d}", "quality": "best", "binary": binary, "params": {},
+            })
+            if status != 200:
+                raise RuntimeError(f"POST /record failed with {status}: {body[:200]!r}")
+
+        while not all(data["completed"] for data in tasks.values()):
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+
+        stop.set()
+        await asyncio.gather(probe, *clients)
+        total_lines = sum(sum(data["line_counts"].values()) for data in tasks.values())
+
+    return {
+        "options": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "elapsed_s": round(elapsed, 3),
+        "lines_total": total_lines,
+        "lines_per_s": round(total_lines / elapsed, 1),
+        "loop_lag_ms": {
+            "p50": round(percentile(lags, 50) * 1000, 2),
+            "p99": round(percentile(lags, 99) * 1000, 2),
+            "max": round(max(lags, default=0) * 1000, 2),
+        },
+        "rss_mb": {
+            "start": round(rss_start / 2 ** 20, 1),
+            "peak": round(max(rss, default=rss_start) / 2 ** 20, 1),
+            "growth": round((max(rss, default=rss_start) - rss_start) / 2 ** 20, 1),
+        },
+        "status": {
+            "requests": len(latencies),
+            "latency_ms_p50": round(percentile(latencies, 50) * 1000, 2),
+            "latency_ms_p99": round(percentile(latencies, 99) * 1000, 2),
+            "bytes_mean": round(statistics.fmean(sizes), 1) if sizes else 0,
+            "bytes_max": max(sizes, default=0),
+        },
+    }
+
+
+def main():
+    args = parse_args()
+    workdir = Path(tempfile.mkdtemp(prefix="ytarchive-ui-bench-"))
+    os.environ.update(make_fake_binaries(workdir, args))
+    # Keep the benchmark self-contained: no task database, logs in the temp dir.
+    os.environ["TASK_DB_PATH"] = ""
+    os.environ["LOG_DIR"] = str(workdir / "logs")
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
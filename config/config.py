@@ -11,7 +11,7 @@ YTDLP_MAP = {
     "wait_for_live": ["--live-from-start", True, False],
     "embed_metadata": ["--embed-metadata", True, False],
     "embed_thumbnail": ["--embed-thumbnail", True, False],
-    "use_cookies": [f" --cookies '{COOKIE_FILE_PATH}'", True, False],
+    "use_cookies": ["--cookies", True, False],
     "force_mkv": ["--mkv", True, False],
     "output_filename": ["--output", False, False],
 }
@@ -23,6 +23,122 @@ YTARCHIVE_MAP = {
     "embed_metadata": ["--add-metadata", True, False],
     "embed_thumbnail": ["--thumbnail", True, False],
     "force_mkv": ["--mkv", True, False],
-    "use_cookies": [f" --cookies '{COOKIE_FILE_PATH}'", True, False],
+    "use_cookies": ["--cookies", True, False],
     "output_filename": ["--output", False, True],
 }
+
+# Per-task in-memory log tail: the number of lines kept and the length a single line is cut to.
+LOG_MAX_LINES = int(os.environ.get("LOG_MAX_LINES", 1000))
+LOG_MAX_LINE_LENGTH = int(os.environ.get("LOG_MAX_LINE_LENGTH", 4096))
+
+# Maximum number of times per second a single progress slot of a task is updated (0 = every line).
+PROGRESS_UPDATE_RATE = float(os.environ.get("PROGRESS_UPDATE_RATE", 4))
+
+# /status/stream: how often changes are coalesced into one event, and the keep-alive period (seconds).
+STATUS_STREAM_TICK = float(os.environ.get("STATUS_STREAM_TICK", 0.25))
+STATUS_STREAM_HEARTBEAT = float(os.environ.get("STATUS_STREAM_HEARTBEAT", 15))
+
+# Download scheduler limits; 0 means unlimited.
+MAX_CONCURRENT_DOWNLOADS = int(os.environ.get("MAX_CONCURRENT_DOWNLOADS", 0))
+MAX_CONCURRENT_PER_BINARY = {
+    "ytarchive": int(os.environ.get("MAX_CONCURRENT_YTARCHIVE", 0)),
+    "ytdlp": int(os.environ.get("MAX_CONCURRENT_YTDLP", 0)),
+}
+
+# Post-download callbacks: pool type ("thread" or "process"), worker count and per-callback timeout (seconds, 0 = none).
+CALLBACK_EXECUTOR = os.environ.get("CALLBACK_EXECUTOR", "thread")
+CALLBACK_WORKERS = int(os.environ.get("CALLBACK_WORKERS", 2))
+CALLBACK_TIMEOUT = float(os.environ.get("CALLBACK_TIMEOUT", 0))
+# Niceness of the callback workers (0 leaves it unchanged), so post-processing yields to running downloads.
+CALLBACK_NICE = int(os.environ.get("CALLBACK_NICE", 0))
+
+# Total download bandwidth in bytes per second shared between tasks as they start (0 disables the controller).
+# Live recordings weigh BANDWIDTH_LIVE_WEIGHT times as much as VOD downloads, and no task gets less than
+# BANDWIDTH_MIN_RATE. Thread counts assume AUTOTUNE_THREAD_RATE bytes/s per thread until a speed has been
+# measured, and are capped at AUTOTUNE_MAX_THREADS.
+BANDWIDTH_BUDGET = int(os.environ.get("BANDWIDTH_BUDGET", 0))
+BANDWIDTH_LIVE_WEIGHT = float(os.environ.get("BANDWIDTH_LIVE_WEIGHT", 4))
+BANDWIDTH_MIN_RATE = int(os.environ.get("BANDWIDTH_MIN_RATE", 256 * 1024))
+AUTOTUNE_THREAD_RATE = int(os.environ.get("AUTOTUNE_THREAD_RATE", 1024 * 1024))
+AUTOTUNE_MAX_THREADS = int(os.environ.get("AUTOTUNE_MAX_THREADS", 8))
+
+# Default scheduling of download processes; each task can override them.
+# PROCESS_IO_CLASS is "realtime", "best-effort" or "idle" (empty leaves it unchanged), PROCESS_IO_LEVEL 0-7.
+PROCESS_NICE = int(os.environ.get("PROCESS_NICE", 0))
+PROCESS_IO_CLASS = os.environ.get("PROCESS_IO_CLASS", "")
+PROCESS_IO_LEVEL = int(os.environ["PROCESS_IO_LEVEL"]) if os.environ.get("PROCESS_IO_LEVEL") else None
+# Resource limits for download processes, e.g. "nofile=4096,as=8589934592".
+PROCESS_RLIMITS = {
+    name.strip(): int(value)
+    for name, _, value in (item.partition("=") for item in os.environ.get("PROCESS_RLIMITS", "").split(",") if item.strip())
+}
+
+# Where finished downloads end up. With STAGING_DIR set (e.g. local SSD), tasks download and merge there and
+# the result is moved to DOWNLOAD_DIR afterwards by MOVE_WORKERS threads; progress is reported every MOVE_REPORT_INTERVAL seconds.
+DOWNLOAD_DIR = os.environ.get("DOWNLOAD_DIR", "/downloads")
+STAGING_DIR = os.environ.get("STAGING_DIR", "")
+MOVE_WORKERS = int(os.environ.get("MOVE_WORKERS", 2))
+MOVE_REPORT_INTERVAL = float(os.environ.get("MOVE_REPORT_INTERVAL", 1))
+# Disk admission control: a queued task only starts if its estimated size fits on the staging and download
+# filesystems next to what running tasks still have to write, leaving DISK_RESERVE bytes free. Sizes the
+# binary has not reported are estimated as DISK_ESTIMATE_LIVE/VOD bytes; queued tasks are rechecked every
+# DISK_RECHECK_INTERVAL seconds. Set DISK_ADMISSION=0 to disable.
+DISK_ADMISSION = os.environ.get("DISK_ADMISSION", "1") != "0"
+DISK_ESTIMATE_LIVE = int(os.environ.get("DISK_ESTIMATE_LIVE", 4 * 1024 ** 3))
+DISK_ESTIMATE_VOD = int(os.environ.get("DISK_ESTIMATE_VOD", 1024 ** 3))
+DISK_RESERVE = int(os.environ.get("DISK_RESERVE", 512 * 1024 ** 2))
+DISK_RECHECK_INTERVAL = float(os.environ.get("DISK_RECHECK_INTERVAL", 30))
+
+# Live-stream watcher: tasks that would start a binary waiting for a stream (ytarchive --wait/--retry-stream,
+# yt-dlp --wait-for-video) are held in the app and checked by LIVE_PROBE ("ytdlp", "stub" to read statuses from
+# LIVE_PROBE_STUB_FILE, or "off" to start the waiting binary right away), up to LIVE_PROBE_BATCH videos per check.
+# Checks back off from LIVE_CHECK_MIN_INTERVAL to LIVE_CHECK_MAX_INTERVAL seconds, randomized by +-LIVE_CHECK_JITTER;
+# after LIVE_PROBE_MAX_FAILURES failed checks in a row (0 = never) the binary is started to wait by itself.
+LIVE_PROBE = os.environ.get("LIVE_PROBE", "ytdlp")
+LIVE_PROBE_STUB_FILE = os.environ.get("LIVE_PROBE_STUB_FILE", "./live_status.json")
+LIVE_PROBE_BATCH = int(os.environ.get("LIVE_PROBE_BATCH", 50))
+LIVE_PROBE_TIMEOUT = float(os.environ.get("LIVE_PROBE_TIMEOUT", 300))
+LIVE_PROBE_MAX_FAILURES = int(os.environ.get("LIVE_PROBE_MAX_FAILURES", 5))
+LIVE_CHECK_MIN_INTERVAL = float(os.environ.get("LIVE_CHECK_MIN_INTERVAL", 60))
+LIVE_CHECK_MAX_INTERVAL = float(os.environ.get("LIVE_CHECK_MAX_INTERVAL", 1800))
+LIVE_CHECK_JITTER = float(os.environ.get("LIVE_CHECK_JITTER", 0.2))
+
+# CPU, memory and I/O of running downloads are sampled every RESOURCE_SAMPLE_INTERVAL seconds (0 disables it,
+# needs /proc); the last RESOURCE_HISTORY samples are kept per task.
+RESOURCE_SAMPLE_INTERVAL = float(os.environ.get("RESOURCE_SAMPLE_INTERVAL", 5))
+RESOURCE_HISTORY = int(os.environ.get("RESOURCE_HISTORY", 120))
+
+# Persistent task store (SQLite). An empty TASK_DB_PATH keeps tasks in memory only.
+TASK_DB_PATH = os.environ.get("TASK_DB_PATH", "./tasks.db")
+TASK_STORE_FLUSH_INTERVAL = float(os.environ.get("TASK_STORE_FLUSH_INTERVAL", 2))
+# What to do with tasks that were still running when the server stopped: "requeue" or "fail".
+TASK_RECOVERY_POLICY = os.environ.get("TASK_RECOVERY_POLICY", "fail")
+
+# Full task logs are spooled to one file per task in LOG_DIR (empty disables), flushed every LOG_FLUSH_INTERVAL seconds.
+LOG_DIR = os.environ.get("LOG_DIR", "./logs")
+LOG_FLUSH_INTERVAL = float(os.environ.get("LOG_FLUSH_INTERVAL", 0.5))
+# Number of log lines /status sends per task unless asked otherwise.
+STATUS_TAIL_LINES = int(os.environ.get("STATUS_TAIL_LINES", 200))
+
+# Finished tasks move to the compressed history once older than HISTORY_HOT_TTL seconds or when more than
+# HISTORY_HOT_MAX are kept (0 disables either rule). At most HISTORY_MAX_TASKS are archived (0 = unlimited)
+# and the logs of the HISTORY_CACHE_SIZE most recently read ones are kept decompressed.
+HISTORY_HOT_TTL = float(os.environ.get("HISTORY_HOT_TTL", 3600))
+HISTORY_HOT_MAX = int(os.environ.get("HISTORY_HOT_MAX", 50))
+HISTORY_MAX_TASKS = int(os.environ.get("HISTORY_MAX_TASKS", 1000))
+HISTORY_CACHE_SIZE = int(os.environ.get("HISTORY_CACHE_SIZE", 16))
+HISTORY_SWEEP_INTERVAL = float(os.environ.get("HISTORY_SWEEP_INTERVAL", 60))
+
+# Task registry shared by several app instances (workers or nodes): "local" keeps everything in this process,
+# "sqlite" publishes each instance's tasks to the SQLite database REGISTRY_PATH every REGISTRY_SYNC_INTERVAL seconds
+# and routes control actions to the instance that owns a task. WORKER_ID names this instance (unique per instance;
+# without it an ID is generated on the first start and kept in WORKER_ID_PATH, which must persist like TASK_DB_PATH)
+# and WORKER_URL is its base URL for logs and files, e.g. "http://node-1:8099". Instances that have not synced for
+# REGISTRY_WORKER_TIMEOUT seconds are considered gone.
+TASK_REGISTRY = os.environ.get("TASK_REGISTRY", "local")
+REGISTRY_PATH = os.environ.get("REGISTRY_PATH", "./registry.db")
+REGISTRY_SYNC_INTERVAL = float(os.environ.get("REGISTRY_SYNC_INTERVAL", 1))
+REGISTRY_WORKER_TIMEOUT = float(os.environ.get("REGISTRY_WORKER_TIMEOUT", 15))
+WORKER_ID = os.environ.get("WORKER_ID", "")
+WORKER_ID_PATH = os.environ.get("WORKER_ID_PATH", "./worker_id")
+WORKER_URL = os.environ.get("WORKER_URL", "").rstrip("/")
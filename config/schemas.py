@@ -1,7 +1,10 @@
 from enum import IntEnum
 from pydantic import BaseModel, Field
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Literal, Optional, Union
 import asyncio
+from services.progress import TaskProgress
+from services.proc_stats import ResourceSeries
+from services.task_log import TaskLog
 
 class TaskStatus(IntEnum):
     """
@@ -17,15 +20,99 @@ class TaskStatus(IntEnum):
 class TaskInternal:
     """Internal structure for the tasks dictionary."""
     binary: str
-    cmd: str
+    cmd: List[str]
+    process_settings: Dict[str, Any]
+    bandwidth: Optional[Dict[str, Any]]
+    share_key: tuple
+    source: Optional[Dict[str, Any]]
+    source_uid: Optional[str]
+    subscribers: List[str]
+    output_path: Optional[str]
+    disk_wait: Optional[str]
+    move: Optional[Dict[str, Any]]
+    finalize_task: Optional[asyncio.Task]
+    live_wait: Optional[Dict[str, Any]]
+    resources: Optional[ResourceSeries]
     process: Optional[asyncio.subprocess.Process]
     task: Optional[asyncio.Task]
-    progress_log: str
+    log: TaskLog
+    progress: TaskProgress
     final_log: Optional[str] = None
     active: bool
     completed: bool
     callbacks: List[str]
+    callback_state: Dict[str, str]
+    callback_task: Optional[asyncio.Task]
     started_log: bool
+    error_output: bool
+    item_cache: Optional[tuple]
+    version: int
+    status: int
+    priority: int
+    queued_at: float
+    wait_time: Optional[float]
+
+class ProgressInfo(BaseModel):
+    """Structured download progress parsed from the binary's output."""
+    percent: Optional[float] = Field(None, description="Download progress in percent (yt-dlp only).")
+    downloadedBytes: Optional[int] = Field(None, description="Bytes downloaded so far.")
+    totalBytes: Optional[int] = Field(None, description="Expected total size in bytes (yt-dlp only).")
+    speed: Optional[int] = Field(None, description="Current download speed in bytes per second.")
+    eta: Optional[int] = Field(None, description="Estimated seconds remaining (yt-dlp only).")
+    fragment: Optional[int] = Field(None, description="Current fragment (yt-dlp fragmented downloads).")
+    fragmentCount: Optional[int] = Field(None, description="Total number of fragments (yt-dlp fragmented downloads).")
+    videoFragments: Optional[int] = Field(None, description="Video fragments downloaded (ytarchive only).")
+    audioFragments: Optional[int] = Field(None, description="Audio fragments downloaded (ytarchive only).")
+    updatedAt: Optional[float] = Field(None, description="Unix time of the last progress update.")
+
+class BandwidthInfo(BaseModel):
+    """The bandwidth controller's decision for a task, made when it started."""
+    live: bool = Field(..., description="Whether the task was treated as a live recording.")
+    share: int = Field(..., description="Bandwidth share in bytes per second.")
+    threads: int = Field(..., description="Download threads / concurrent fragments the task was started with.")
+    rateLimit: Optional[int] = Field(None, description="--limit-rate passed to the binary in bytes per second, if any.")
+    perThreadRate: int = Field(..., description="Throughput per thread assumed for the thread count, in bytes per second.")
+    runningTasks: int = Field(..., description="Number of other downloads running at the time.")
+    reason: str = Field(..., description="Which rule determined the share.")
+
+class MoveInfo(BaseModel):
+    """Progress of moving a finished task's file from the staging directory to the download directory."""
+    state: Literal["moving", "done", "failed"] = Field(..., description="State of the move.")
+    bytes: int = Field(..., description="Bytes moved so far.")
+    total: int = Field(..., description="Size of the file and its sidecar files in bytes.")
+    destination: str = Field(..., description="Path the file is moved to; sidecar files go next to it.")
+    error: Optional[str] = Field(None, description="Why the move failed; the file then stays in the staging directory.")
+
+class LiveWaitInfo(BaseModel):
+    """State of a task held by the live watcher until its stream starts."""
+    videoId: str = Field(..., description="YouTube ID of the watched stream.")
+    liveStatus: Optional[str] = Field(None, description="Live status from the last check (e.g. 'is_upcoming').")
+    scheduledStart: Optional[float] = Field(None, description="Unix time the stream is scheduled to start, if announced.")
+    checks: int = Field(0, description="Number of checks so far.")
+    failures: int = Field(0, description="Failed checks in a row.")
+    lastCheck: Optional[float] = Field(None, description="Unix time of the last check.")
+    nextCheck: float = Field(..., description="Unix time of the next check.")
+    since: float = Field(..., description="Unix time the task started waiting.")
+
+class ResourceInfo(BaseModel):
+    """The latest resource sample of a task's process tree."""
+    time: float = Field(..., description="Unix time of the sample.")
+    cpuPercent: float = Field(..., description="CPU use since the previous sample, in percent of one core.")
+    rssBytes: int = Field(..., description="Resident memory of all processes of the task.")
+    readRate: int = Field(..., description="Bytes per second read from storage since the previous sample.")
+    writeRate: int = Field(..., description="Bytes per second written to storage since the previous sample.")
+    children: int = Field(..., description="Number of child processes (e.g. ffmpeg).")
+    readBytes: int = Field(..., description="Bytes read from storage so far.")
+    writeBytes: int = Field(..., description="Bytes written to storage so far.")
+
+class ResourceSeriesResponse(BaseModel):
+    """Rolling resource samples of a task, one list per field, oldest first."""
+    time: List[float] = Field([], description="Unix time of each sample.")
+    cpuPercent: List[float] = Field([], description="CPU use in percent of one core.")
+    rssBytes: List[int] = Field([], description="Resident memory in bytes.")
+    readRate: List[int] = Field([], description="Storage read rate in bytes per second.")
+    writeRate: List[int] = Field([], description="Storage write rate in bytes per second.")
+    children: List[int] = Field([], description="Number of child processes.")
 
 class TaskStatusResponseItem(BaseModel):
     """The structure of a single item in the /status response."""
@@ -33,20 +120,101 @@ class TaskStatusResponseItem(BaseModel):
     status: int = Field(..., description="Status code of the task.")
     output: str = Field(..., description="The complete, consolidated output log (STDOUT, STDERR, errors) for the task.")
     isUnfinished: bool = Field(False, description="Always False for this implementation's response structure.")
+    version: int = Field(0, description="Version of the task state; increases on every change.")
+    offset: int = Field(0, description="Absolute log line index at which `output` starts.")
+    logStart: int = Field(0, description="Absolute index of the oldest log line still kept by the server.")
+    queuePosition: Optional[int] = Field(None, description="0-based position in the download queue while the task is waiting.")
+    waitTime: Optional[float] = Field(None, description="Seconds spent in the download queue so far (or in total, once started).")
+    callbacks: Dict[str, str] = Field({}, description="State of each callback: queued, running, done, failed or timeout.")
+    progress: Optional[ProgressInfo] = Field(None, description="Structured progress, once the binary has reported any.")
+    binary: Optional[str] = Field(None, description="The binary running the task ('ytdlp' or 'ytarchive').")
+    createdAt: Optional[float] = Field(None, description="Unix time the task was created.")
+    finishedAt: Optional[float] = Field(None, description="Unix time the task finished.")
+    archived: bool = Field(False, description="True if the task has been moved to the compressed history.")
+    bandwidth: Optional[BandwidthInfo] = Field(None, description="Bandwidth share, threads and rate limit chosen when the task started.")
+    sharedWith: Optional[str] = Field(None, description="ID of the task whose download this task shares, while it is running.")
+    diskWait: Optional[str] = Field(None, description="Why a queued task is held back by disk admission control.")
+    move: Optional[MoveInfo] = Field(None, description="Progress of moving the output file out of the staging directory.")
+    liveWait: Optional[LiveWaitInfo] = Field(None, description="Set while the task waits in the live watcher for its stream to start.")
+    resources: Optional[ResourceInfo] = Field(None, description="Latest CPU, memory and I/O sample of the task's processes; see /status/{id}/resources for the series.")
+    worker: Optional[str] = Field(None, description="Worker owning the task, for tasks of other workers sharing the task registry.")
+
+class TaskStatusDeltaResponse(BaseModel):
+    """The structure of an incremental /status?since=<cursor> response."""
+    cursor: int = Field(..., description="Cursor to pass as `since` on the next poll.")
+    full: bool = Field(False, description="True if `tasks` holds every task and the client should drop the rest.")
+    tasks: Dict[str, TaskStatusResponseItem] = Field({}, description="Tasks changed since the cursor, with only their new log lines.")
+    removed: List[str] = Field([], description="IDs of tasks removed since the cursor.")
 
 class RecordRequest(BaseModel):
     """Request body for starting a new download/record task."""
     youtubeID: str = Field(..., description="The ID of the YouTube video (e.g., 'dQw4w9WgXcQ').")
     quality: str = Field(..., description="The desired quality (e.g., '1080p', 'audio_only', 'best').")
-    binary: str = Field(..., description="The binary to use ('ytdlp' or 'ytarchive').")
+    binary: Literal["ytdlp", "ytarchive"] = Field(..., description="The binary to use.")
     params: Dict[str, Any] = Field({}, description="Dictionary of CLI parameters for the binary.")
     callbacks: Optional[List[str]] = Field(None, description="List of callback function IDs to run on completion.")
+    priority: int = Field(0, description="Scheduling priority; higher values start first when downloads are queued.")
+    nice: Optional[int] = Field(None, ge=-20, le=19, description="CPU niceness of the download process tree; defaults to PROCESS_NICE.")
+    ioClass: Optional[Literal["realtime", "best-effort", "idle"]] = Field(None, description="I/O scheduling class; defaults to PROCESS_IO_CLASS.")
+    ioLevel: Optional[int] = Field(None, ge=0, le=7, description="I/O priority within the class (0 is highest); defaults to PROCESS_IO_LEVEL.")
+    rlimits: Dict[str, int] = Field({}, description="Resource limits for the process tree by name (as, core, cpu, fsize, nofile, nproc), added to PROCESS_RLIMITS.")
+
+class RecordBatchRequest(BaseModel):
+    """Request body for queueing many downloads at once."""
+    items: List[Dict[str, Any]] = Field([], description="RecordRequest objects; fields missing from an item are taken from `template`.")
+    ids: Union[List[str], str] = Field([], description="Video IDs or URLs, as a list or a newline-separated string, each recorded with `template`.")
+    template: Dict[str, Any] = Field({}, description="RecordRequest fields shared by every entry.")
+    onDuplicate: Literal["share", "skip"] = Field("share", description="Whether an entry for a video that is already being downloaded shares that download or is skipped.")
+
+class RecordBatchResult(BaseModel):
+    """Outcome of a single entry of a batch."""
+    index: int = Field(..., description="Position of the entry in the submission.")
+    youtubeID: Optional[str] = Field(None, description="The entry's video ID, if it could be read.")
+    status: Literal["queued", "shared", "skipped", "error"] = Field(..., description="What happened to the entry.")
+    id: Optional[str] = Field(None, description="ID of the task created for the entry.")
+    sharedWith: Optional[str] = Field(None, description="ID of the task already downloading the same video, binary and quality.")
+    error: Optional[str] = Field(None, description="Why the entry was rejected.")
+
+class RecordBatchResponse(BaseModel):
+    """Response of a non-streaming batch submission."""
+    results: List[RecordBatchResult] = Field(..., description="One result per entry, in submission order.")
+    counts: Dict[str, int] = Field(..., description="Number of entries per result status.")
 
 class StatusDeleteRequest(BaseModel):
     """Request body for deleting a task from the status list."""
     id: str = Field(..., description="The unique ID of the task to delete.")
 
+class QueueMoveRequest(BaseModel):
+    """Request body for moving a waiting task within the download queue."""
+    id: str = Field(..., description="The unique ID of the queued task.")
+    position: int = Field(..., ge=0, description="New 0-based queue position.")
+
+class QueueItem(BaseModel):
+    """A single waiting task in the /queue response."""
+    id: str
+    binary: str
+    priority: int
+    position: int
+    waitTime: float
+
+class OutputFile(BaseModel):
+    """A task's output file in the /files response."""
+    id: str = Field(..., description="ID of the task that wrote the file.")
+    name: str = Field(..., description="File name.")
+    path: str = Field(..., description="Path of the file on the server.")
+    size: int = Field(..., description="Current size in bytes.")
+    complete: bool = Field(..., description="False while the task is still writing the file.")
+    modifiedAt: float = Field(..., description="Unix time of the last write.")
+
 class UpdateBinaryResponse(BaseModel):
-    """Response structure for the yt-dlp update endpoint."""
+    """Response structure for the binary update endpoints."""
     status: str
     message: str
+
+class BinaryInfo(BaseModel):
+    """State of a managed binary in the /binaries response."""
+    path: str = Field(..., description="Path the binary is run from.")
+    installed: bool = Field(..., description="Whether the binary exists at that path.")
+    state: Optional[str] = Field(None, description="State of the last install/update job: running, done or failed.")
+    message: Optional[str] = Field(None, description="Message from the last install/update job.")
+    version: Optional[str] = Field(None, description="Version installed by the last successful job.")
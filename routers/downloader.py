@@ -1,50 +1,255 @@
-import asyncio
+import json
 import logging
-from fastapi import APIRouter, HTTPException
-from typing import Dict, Any
-from config.schemas import RecordRequest
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from config.schemas import RecordBatchRequest, RecordBatchResponse, RecordBatchResult, RecordRequest
 from config.dependencies import tasks
 from services.command_builder import build_ytarchive_cmd, build_ytdlp_cmd
-from services.task_runner import get_id, run_download
+from services.process_launcher import RLIMITS, process_settings
+from services.live_watcher import live_watcher
+from services.task_history import task_history
+from services.task_registry import RemoteTask, task_registry
+from services.task_runner import get_id, new_task_entry, shared_downloads, subscribe
 
 logger = logging.getLogger("app")
 router = APIRouter()
 
-@router.post("/record")
-async def record(body: RecordRequest) -> Dict[str, str]:
-    """Starts a new download/recording task."""
+# Entries of a streamed batch handed to the scheduler together.
+BATCH_CHUNK_SIZE = 500
+
+def _create_task(
+    body: RecordRequest,
+    shared: Dict[Tuple[str, str, str], str],
+    on_duplicate: str = "share",
+    remote_shared: Optional[Dict[Tuple[str, str, str], RemoteTask]] = None,
+    uid: Optional[str] = None,
+) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Creates the task for a record request, sharing the download in `shared`
+    of the same video, binary and quality if there is one. Returns the outcome
+    ("queued", "shared" or "skipped"), the new task's ID and the shared task's
+    ID. New downloads are added to `shared` but not submitted yet.
+    A download in `remote_shared` runs on another worker, so the task is sent
+    to that worker to be created there under the returned ID. `uid` is the
+    ID to create the task under instead of a new one.
+    Raises ValueError for a request that cannot be run.
+    """
+    unsupported = sorted(set(body.rlimits) - set(RLIMITS))
+    if unsupported:
+        raise ValueError(f"Unsupported resource limits: {', '.join(unsupported)}.")
+
     youtube_id = body.youtubeID
-    url = f"https://youtu.be/{youtube_id}"
-    quality = body.quality
-    params = body.params
     binary = body.binary
-    callback_ids = body.callbacks or []
-    uid = youtube_id # TODO: support multiple concurrent tasks for same video
+    share_key = (youtube_id, binary, body.quality)
+    source_uid = shared.get(share_key)
+    remote = remote_shared.get(share_key) if source_uid is None and remote_shared else None
+    if remote is not None:
+        source_uid = remote.uid
+    if source_uid is not None and on_duplicate == "skip":
+        return "skipped", None, source_uid
 
-    if uid in tasks:
-        raise HTTPException(
-            status_code=409,
-            detail=f"A task for video ID {youtube_id} (UID: {uid}) already exists. Please remove the previous one if needed."
-        )
+    uid = uid or get_id(youtube_id)
+    if remote is not None:
+        task_registry.send(remote.owner, "record", {"uid": uid, "request": body.model_dump()})
+        logger.info(f"[{uid}] Sent to worker {remote.owner}, which runs the download of task {source_uid}.")
+        return "shared", uid, source_uid
+
+    callback_ids = body.callbacks or []
+    if source_uid is not None:
+        source = tasks[source_uid]
+        tasks[uid] = new_task_entry(uid, binary, list(source["cmd"]), callback_ids, body.priority, source["process_settings"])
+        tasks[uid]["share_key"] = share_key
+        subscribe(uid, tasks[uid], source_uid)
+        logger.info(f"[{uid}] Sharing the download of task {source_uid}.")
+        return "shared", uid, source_uid
 
+    url = f"https://youtu.be/{youtube_id}"
     if binary == "ytarchive":
-        cmd = build_ytarchive_cmd(url, quality, params)
+        cmd = build_ytarchive_cmd(url, body.quality, body.params)
     else:
-        cmd = build_ytdlp_cmd(url, quality, params)
-
-    tasks[uid] = {
-        "binary": binary,
-        "cmd": cmd,
-        "process": None,
-        "task": None,
-        "progress_log": "",
-        "active": False,
-        "completed": False,
-        "output": {"out": "", "err": ""},
-        "callbacks": callback_ids
-    }
-
-    t = asyncio.create_task(run_download(uid))
-    tasks[uid]["task"] = t
+        cmd = build_ytdlp_cmd(url, body.quality, body.params)
+
+    settings = process_settings(body.nice, body.ioClass, body.ioLevel, body.rlimits)
+    tasks[uid] = new_task_entry(uid, binary, cmd, callback_ids, body.priority, settings)
+    tasks[uid]["share_key"] = share_key
+    shared[share_key] = uid
+    return "queued", uid, None
+
+@router.post("/record")
+async def record(body: RecordRequest) -> Dict[str, str]:
+    """
+    Queues a new download/recording task; it starts as soon as the scheduler has a free slot.
+    A task asked to wait for a stream is held by the live watcher until the stream goes live.
 
+    If an unfinished task is already downloading the same video with the same
+    binary and quality, the new task shares that download instead of starting
+    another one, and gets its own ID and callbacks. When that download runs on
+    another worker, the task is created there.
+    """
+    try:
+        outcome, uid, source_uid = _create_task(body, shared_downloads(), remote_shared=task_registry.shared_downloads())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if outcome == "shared":
+        return {"id": uid, "sharedWith": source_uid}
+    live_watcher.submit(uid)
     return {"id": uid}
+
+def _record_sent(payload: Dict[str, Any]):
+    """Creates a task another worker sent here because this worker runs the download it shares."""
+    body = RecordRequest.model_validate(payload["request"])
+    uid = payload["uid"]
+    if uid in tasks or uid in task_history:
+        logger.error(f"[{uid}] A task with this ID already exists; the task sent by another worker is dropped.")
+        return
+    outcome, uid, _ = _create_task(body, shared_downloads(), uid=uid)
+    if outcome == "queued":
+        live_watcher.submit(uid)
+
+task_registry.on("record", _record_sent)
+
+def _video_id(entry: str) -> str:
+    """Accepts a bare video ID or a youtu.be / youtube.com watch, live or shorts URL."""
+    entry = entry.strip()
+    if "/" not in entry:
+        return entry
+    url = urlparse(entry if "://" in entry else f"https://{entry}")
+    if "v" in parse_qs(url.query):
+        return parse_qs(url.query)["v"][0]
+    return url.path.rstrip("/").rsplit("/", 1)[-1]
+
+def _id_lines(text: str) -> Iterator[str]:
+    """Video IDs of a newline-separated list, skipping blank lines and # comments."""
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield _video_id(line)
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in e['loc']) or 'body'}: {e['msg']}" for e in error.errors())
+
+def _record_chunk(
+    entries: Iterable[Tuple[int, Any]],
+    template: Dict[str, Any],
+    on_duplicate: str,
+) -> List[RecordBatchResult]:
+    """
+    Validates and creates the tasks of a chunk of entries (an ID string, a
+    request dict, or an exception from parsing it), then submits all new
+    tasks at once. Runs without yielding to the event loop, so no other
+    request sees part of a chunk.
+    """
+    shared, remote_shared = shared_downloads(), task_registry.shared_downloads()
+    results, new_uids = [], []
+    for index, entry in entries:
+        youtube_id = entry if isinstance(entry, str) else None
+        if isinstance(entry, dict) and entry.get("youtubeID") is not None:
+            youtube_id = str(entry["youtubeID"])
+        try:
+            if isinstance(entry, Exception):
+                raise ValueError(str(entry))
+            fields = {"youtubeID": entry} if isinstance(entry, str) else entry
+            body = RecordRequest.model_validate({**template, **fields})
+            outcome, uid, source_uid = _create_task(body, shared, on_duplicate, remote_shared)
+        except ValidationError as e:
+            results.append(RecordBatchResult(index=index, youtubeID=youtube_id, status="error", error=_validation_message(e)))
+            continue
+        except ValueError as e:
+            results.append(RecordBatchResult(index=index, youtubeID=youtube_id, status="error", error=str(e)))
+            continue
+        if outcome == "queued":
+            new_uids.append(uid)
+        results.append(RecordBatchResult(index=index, youtubeID=body.youtubeID, status=outcome, id=uid, sharedWith=source_uid))
+    live_watcher.submit_many(new_uids)
+    return results
+
+async def _ndjson_entries(request: Request) -> AsyncIterator[Any]:
+    """Parses an NDJSON body line by line as it arrives: each line is a request object or an ID string."""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_ndjson_line(line)
+    if buffer.strip():
+        yield _parse_ndjson_line(buffer)
+
+def _parse_ndjson_line(line: bytes) -> Any:
+    try:
+        entry = json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Invalid JSON: {e}")
+    if isinstance(entry, str):
+        return _video_id(entry)
+    if not isinstance(entry, dict):
+        return ValueError("Each line must be a request object or a video ID.")
+    return entry
+
+def _summary(results: List[RecordBatchResult]) -> RecordBatchResponse:
+    counts = {status: 0 for status in ("queued", "shared", "skipped", "error")}
+    for result in results:
+        counts[result.status] += 1
+    return RecordBatchResponse(results=results, counts=counts)
+
+@router.post("/record/batch", response_model=RecordBatchResponse)
+async def record_batch(
+    request: Request,
+    stream: bool = Query(False, description="Answer with one NDJSON result line per entry instead of a single JSON document."),
+    quality: Optional[str] = Query(None, description="Default quality for text and NDJSON submissions."),
+    binary: Optional[str] = Query(None, description="Default binary for text and NDJSON submissions."),
+    onDuplicate: Literal["share", "skip"] = Query("share", description="Duplicate handling for text and NDJSON submissions."),
+):
+    """
+    Queues many downloads in one request. The body is either a
+    RecordBatchRequest (JSON), a newline-separated list of video IDs or URLs
+    (text/plain), or NDJSON with one request object or ID per line
+    (application/x-ndjson), which is queued in chunks of BATCH_CHUNK_SIZE as
+    it is received and always answered with NDJSON.
+
+    Entries are checked against the unfinished downloads once, share or skip
+    duplicates (also within the batch), and are handed to the scheduler
+    together. Invalid entries are reported in their result without failing
+    the batch.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    template = {key: value for key, value in (("quality", quality), ("binary", binary)) if value is not None}
+
+    if content_type == "application/x-ndjson":
+        # Entries are queued in chunks while the body is still arriving. The results are sent once it
+        # has been read, since a streaming response would compete with the body for incoming messages.
+        results, chunk = [], []
+        async for entry in _ndjson_entries(request):
+            chunk.append((len(results) + len(chunk), entry))
+            if len(chunk) >= BATCH_CHUNK_SIZE:
+                results += _record_chunk(chunk, template, onDuplicate)
+                chunk = []
+        results += _record_chunk(chunk, template, onDuplicate)
+        logger.info(f"NDJSON batch of {len(results)} entries: {_summary(results).counts}.")
+        return StreamingResponse((result.model_dump_json() + "\n" for result in results), media_type="application/x-ndjson")
+
+    raw = await request.body()
+    if content_type == "text/plain":
+        entries: List[Any] = list(_id_lines(raw.decode("utf-8", "replace")))
+        on_duplicate = onDuplicate
+    else:
+        try:
+            body = RecordBatchRequest.model_validate_json(raw or b"{}")
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+        template = {**template, **body.template}
+        ids = list(_id_lines(body.ids)) if isinstance(body.ids, str) else [_video_id(vid) for vid in body.ids]
+        entries = [*body.items, *ids]
+        on_duplicate = body.onDuplicate
+
+    summary = _summary(_record_chunk(enumerate(entries), template, on_duplicate))
+    logger.info(f"Batch of {len(summary.results)} entries: {summary.counts}.")
+    if stream:
+        return StreamingResponse(
+            (result.model_dump_json() + "\n" for result in summary.results), media_type="application/x-ndjson"
+        )
+    return summary
@@ -0,0 +1,95 @@
+import logging
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config.dependencies import tasks
+from config.schemas import OutputFile
+from services.file_server import FileRangeResponse
+from services.task_history import task_history
+from services.task_registry import task_registry
+
+logger = logging.getLogger("app")
+router = APIRouter()
+
+def _output_file(uid: str) -> Optional[Tuple[Path, Optional[Dict[str, Any]]]]:
+    """
+    Returns the file a task writes or has written, and the task data while it
+    is still running. Only paths reported by the downloader are ever served.
+    """
+    data = tasks.get(uid)
+    if data is not None:
+        data = data.get("source") or data
+        path = data.get("output_path")
+        running = None if data["completed"] else data
+    elif uid in task_history:
+        path = task_history.get(uid).output_path
+        running = None
+    else:
+        return None
+    if not path:
+        return None
+
+    path = Path(path)
+    if running is not None and not path.exists():
+        # yt-dlp writes to `<name>.part` and renames it when the download is done.
+        part = path.with_name(path.name + ".part")
+        if part.exists():
+            return part, running
+    return path, running
+
+@router.get("/files", response_model=List[OutputFile])
+async def list_files():
+    """Lists the output files of current and archived tasks that exist on disk."""
+    files = []
+    for uid in [*tasks.keys(), *(entry.uid for entry in task_history.entries())]:
+        found = _output_file(uid)
+        if found is None:
+            continue
+        path, running = found
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        files.append(OutputFile(
+            id=uid,
+            name=path.name,
+            path=str(path),
+            size=stat.st_size,
+            complete=running is None,
+            modifiedAt=stat.st_mtime,
+        ))
+    return files
+
+@router.api_route("/files/{uid}", methods=["GET", "HEAD"])
+async def get_file(
+    uid: str,
+    request: Request,
+    follow: bool = Query(False, description="Keep sending data while the task is still writing the file."),
+):
+    """
+    Serves a task's output file, with support for `Range` requests. With
+    `follow=true` a recording that is still being written is streamed as it grows.
+    The file of a task owned by another worker is served by that worker.
+    """
+    found = _output_file(uid)
+    if found is None:
+        redirect = task_registry.redirect(request, uid)
+        if redirect is not None:
+            return redirect
+        raise HTTPException(status_code=404, detail="No output file is known for this task.")
+    path, running = found
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Output file does not exist.")
+
+    def still_written() -> bool:
+        # A `.part` file stops growing once yt-dlp renames it.
+        return not running["completed"] and path.exists()
+
+    keep_following: Optional[Callable[[], bool]] = still_written if follow and running is not None else None
+    return FileRangeResponse(
+        path,
+        range_header=request.headers.get("range"),
+        follow=keep_following,
+        send_body=request.method != "HEAD",
+    )
@@ -0,0 +1,77 @@
+import logging
+
+from fastapi import APIRouter, Response
+from config.dependencies import tasks
+from services.live_watcher import live_watcher
+from services.metrics import Collected, registry
+from services.scheduler import scheduler
+from services.task_history import task_history
+
+logger = logging.getLogger("app")
+router = APIRouter()
+
+registry.register(Collected(
+    "ytarchive_ui_task_lines_total", "Output lines processed per task and stream.", "counter",
+    ("task", "stream"),
+    lambda: (((uid, stream), count) for uid, data in tasks.items() for stream, count in data["line_counts"].items()),
+))
+registry.register(Collected(
+    "ytarchive_ui_queue_depth", "Tasks waiting for a download slot.", "gauge", (),
+    lambda: [((), len(scheduler.queue))],
+))
+registry.register(Collected(
+    "ytarchive_ui_live_watched_tasks", "Tasks held by the live watcher until their stream goes live.", "gauge", (),
+    lambda: [((), len(live_watcher.watching))],
+))
+registry.register(Collected(
+    "ytarchive_ui_running_downloads", "Downloads currently holding a slot, by binary.", "gauge", ("binary",),
+    lambda: [((binary,), count) for binary, count in scheduler.running.items()],
+))
+registry.register(Collected(
+    "ytarchive_ui_tasks", "Tasks known to the server, by completion state.", "gauge", ("completed",),
+    lambda: [
+        (("true",), sum(1 for data in tasks.values() if data["completed"])),
+        (("false",), sum(1 for data in tasks.values() if not data["completed"])),
+    ],
+))
+def _resource_values(field: str):
+    for uid, data in tasks.items():
+        series = data.get("resources")
+        process = data.get("process")
+        if series is not None and process is not None and process.returncode is None:
+            latest = series.latest()
+            if latest is not None:
+                yield (uid,), latest[field]
+
+for name, help, kind, field in (
+    ("ytarchive_ui_task_cpu_percent", "CPU use of a running task's processes, in percent of one core.", "gauge", "cpuPercent"),
+    ("ytarchive_ui_task_rss_bytes", "Resident memory of a running task's processes.", "gauge", "rssBytes"),
+    ("ytarchive_ui_task_read_bytes_total", "Bytes a running task's processes read from storage.", "counter", "readBytes"),
+    ("ytarchive_ui_task_write_bytes_total", "Bytes a running task's processes wrote to storage.", "counter", "writeBytes"),
+    ("ytarchive_ui_task_child_processes", "Child processes of a running task.", "gauge", "children"),
+):
+    registry.register(Collected(name, help, kind, ("task",), lambda field=field: _resource_values(field)))
+
+registry.register(Collected(
+    "ytarchive_ui_history_tasks", "Finished tasks held in the compressed history.", "gauge", (),
+    lambda: [((), len(task_history))],
+))
+registry.register(Collected(
+    "ytarchive_ui_history_log_bytes", "Compressed size of the logs held in the history.", "gauge", (),
+    lambda: [((), task_history.compressed_bytes)],
+))
+registry.register(Collected(
+    "ytarchive_ui_bandwidth_share_bytes", "Bandwidth share allocated to running tasks, by live/VOD.", "gauge", ("live",),
+    lambda: [
+        ((live,), sum(
+            data["bandwidth"]["share"] for data in tasks.values()
+            if data.get("bandwidth") and not data["completed"] and str(data["bandwidth"]["live"]).lower() == live
+        ))
+        for live in ("true", "false")
+    ],
+))
+
+@router.get("/metrics")
+async def metrics():
+    """Exposes server metrics in the Prometheus text format."""
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
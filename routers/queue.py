@@ -0,0 +1,36 @@
+import time
+import logging
+
+from fastapi import APIRouter, HTTPException
+from typing import List
+from config.dependencies import tasks
+from config.schemas import QueueItem, QueueMoveRequest
+from services.scheduler import scheduler
+
+logger = logging.getLogger("app")
+router = APIRouter()
+
+@router.get("/queue", response_model=List[QueueItem])
+async def queue():
+    """Returns the tasks waiting for a download slot, in the order they will start."""
+    now = time.time()
+    return [
+        QueueItem(
+            id=uid,
+            binary=tasks[uid]["binary"],
+            priority=tasks[uid].get("priority", 0),
+            position=position,
+            waitTime=now - tasks[uid]["queued_at"],
+        )
+        for position, uid in enumerate(scheduler.queue)
+    ]
+
+@router.post("/queue/move")
+async def queue_move(body: QueueMoveRequest):
+    """Moves a waiting task to a new position in the download queue."""
+    if body.id not in tasks:
+        raise HTTPException(status_code=404, detail=f"Task '{body.id}' does not exist.")
+    if not scheduler.move(body.id, body.position):
+        raise HTTPException(status_code=409, detail=f"Task '{body.id}' is not queued.")
+    logger.info(f"[{body.id}] Moved to queue position {body.position}.")
+    return {}
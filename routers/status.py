@@ -1,69 +1,448 @@
+import time
 import asyncio
 import logging
 import os
 
-from fastapi import APIRouter, Request, Response
-from typing import Dict
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from itertools import chain, islice
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from config.config import STATUS_STREAM_HEARTBEAT, STATUS_STREAM_TICK, STATUS_TAIL_LINES
 from config.dependencies import tasks
-from config.schemas import StatusDeleteRequest, TaskStatusResponseItem, TaskStatus 
+from config.schemas import (
+    ResourceSeriesResponse, StatusDeleteRequest, TaskStatusDeltaResponse, TaskStatusResponseItem, TaskStatus,
+)
+from services.live_watcher import live_watcher
+from services.log_spool import log_spool
+from services.process_launcher import terminate_tree
+from services.scheduler import scheduler
+from services.task_history import ArchivedTask, finished_at, task_history
+from services.task_registry import RemoteTask, task_registry
+from services.task_state import clock, needs_full_sync, record_removal, removed_since, task_version, touch
 
 logger = logging.getLogger("app")
 router = APIRouter()
 
-@router.get("/status", response_model=Dict[str, TaskStatusResponseItem])
-async def status():
-    """Returns the status of all active and completed tasks."""
-    resp: Dict[str, TaskStatusResponseItem] = {}
+# Largest chunk a single /status/{id}/log request may return.
+LOG_READ_LIMIT = 8 * 1024 * 1024
 
+def _status_code(data: Dict[str, Any]) -> TaskStatus:
+    """
+    Works out the status code reported to clients for a task. The outcome of a
+    finished task is classified by the task runner while its output streams in.
+    """
+    if not data["completed"]:
+        return TaskStatus.ACTIVE if data["active"] else TaskStatus.PENDING
+    return TaskStatus(data["status"])
+
+def _tail_text(text: str, lines: int) -> str:
+    """Returns the last `lines` lines of a text, or all of it if `lines` is 0."""
+    if not lines:
+        return text
+    cut = len(text)
+    for _ in range(lines):
+        cut = text.rfind("\n", 0, cut)
+        if cut < 0:
+            return text
+    return f"[... earlier lines truncated, see the full log ...]{text[cut:]}"
+
+def _resources(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    series = data.get("resources")
+    return series.latest() if series is not None else None
+
+def _status_item(
+    uid: str,
+    data: Dict[str, Any],
+    since: Optional[int] = None,
+    tail: int = STATUS_TAIL_LINES,
+) -> TaskStatusResponseItem:
+    """
+    Builds the response item for a task, limited to the last `tail` log lines
+    and, if `since` is given, to the lines changed after it.
+    """
+    source = data.get("source")
+    if source is not None:
+        # The task shares another task's download: report that download under this task's ID.
+        item = _status_item(data["source_uid"], source, since, tail)
+        return item.model_copy(update={
+            "version": task_version(data),
+            "callbacks": data.get("callback_state", {}),
+            "createdAt": data.get("created_at"),
+            "sharedWith": data["source_uid"],
+        })
+
+    status_code = _status_code(data)
+    version = task_version(data)
+
+    if data["completed"]:
+        # A finished task only changes when its version does, so its item is built once per version.
+        cached = data.get("item_cache")
+        if cached and cached[0] == version and cached[1] == tail:
+            return cached[2]
+        item = TaskStatusResponseItem(
+            status=status_code,
+            output=_tail_text(data.get("final_log", ""), tail),
+            version=version,
+            waitTime=data.get("wait_time"),
+            callbacks=data.get("callback_state", {}),
+            progress=data["progress"].as_dict(),
+            binary=data["binary"],
+            createdAt=data.get("created_at"),
+            finishedAt=finished_at(data),
+            bandwidth=data.get("bandwidth"),
+            move=data.get("move"),
+            resources=_resources(data),
+        )
+        data["item_cache"] = (version, tail, item)
+        return item
+
+    position = scheduler.position(uid)
+    wait_time = time.time() - data["queued_at"] if position is not None else data.get("wait_time")
+    log = data["log"]
+    log_start = max(log.dropped, log.end - tail) if tail else log.dropped
+    if since is None:
+        offset, output = 0, log.text(tail)
+    else:
+        offset, lines = log.since(since)
+        if offset < log_start:
+            lines = lines[log_start - offset:]
+            offset = log_start
+        output = "\n".join(lines)
+
+    return TaskStatusResponseItem(
+        status=status_code,
+        output=output,
+        version=version,
+        offset=offset,
+        logStart=log_start,
+        queuePosition=position,
+        waitTime=wait_time,
+        progress=data["progress"].as_dict(),
+        binary=data["binary"],
+        createdAt=data.get("created_at"),
+        bandwidth=data.get("bandwidth"),
+        diskWait=data.get("disk_wait") if position is not None else None,
+        liveWait=data.get("live_wait"),
+        resources=_resources(data),
+    )
+
+def _history_item(entry: ArchivedTask, tail: int = STATUS_TAIL_LINES) -> TaskStatusResponseItem:
+    """Builds the response item for a task in the compressed history."""
+    return TaskStatusResponseItem(
+        status=entry.status,
+        output=_tail_text(task_history.log(entry.uid), tail),
+        version=entry.version,
+        waitTime=entry.wait_time,
+        callbacks=entry.callback_state,
+        progress=entry.progress,
+        binary=entry.binary,
+        createdAt=entry.created_at,
+        finishedAt=entry.finished_at,
+        archived=True,
+        bandwidth=entry.bandwidth,
+    )
+
+def _remote_item(remote: RemoteTask, tail: int = STATUS_TAIL_LINES) -> TaskStatusResponseItem:
+    """Builds the response item for a task owned by another worker from its published item."""
+    if remote.parsed is not None and remote.parsed[0] == tail:
+        return remote.parsed[1]
+    item = TaskStatusResponseItem.model_validate(remote.item)
+    item = item.model_copy(update={"output": _tail_text(item.output, tail), "version": remote.version, "worker": remote.owner})
+    remote.parsed = (tail, item)
+    return item
+
+def describe_task(uid: str, data: Dict[str, Any]) -> str:
+    """
+    The status item a worker publishes to the task registry for a task it
+    owns, with the last log line only: other workers redirect log requests
+    to the owner.
+    """
+    return _status_item(uid, data, tail=1).model_dump_json()
+
+def _task_filter(
+    statuses: Optional[List[int]],
+    binary: Optional[str],
+    after: Optional[float],
+    before: Optional[float],
+) -> Callable[[int, str, Optional[float]], bool]:
+    """Returns a predicate over (status code, binary, creation time) for the /status filters."""
+    wanted = set(statuses) if statuses else None
+
+    def keep(status_code: int, task_binary: str, created_at: Optional[float]) -> bool:
+        if wanted is not None and status_code not in wanted:
+            return False
+        if binary is not None and task_binary != binary:
+            return False
+        if after is not None and (created_at is None or created_at < after):
+            return False
+        if before is not None and (created_at is None or created_at >= before):
+            return False
+        return True
+
+    return keep
+
+@router.get("/status", response_model=None)
+async def status(
+    request: Request,
+    response: Response,
+    since: Optional[int] = Query(None, ge=0, description="Cursor from a previous response; only changes after it are returned."),
+    tail: int = Query(STATUS_TAIL_LINES, ge=0, description="Number of log lines sent per task; 0 sends everything kept in memory."),
+    statuses: Optional[List[int]] = Query(None, alias="status", description="Only tasks with one of these status codes."),
+    binary: Optional[str] = Query(None, description="Only tasks run by this binary."),
+    after: Optional[float] = Query(None, description="Only tasks created at or after this Unix time."),
+    before: Optional[float] = Query(None, description="Only tasks created before this Unix time."),
+    history: bool = Query(False, description="Also list finished tasks moved to the compressed history, newest first."),
+    page: int = Query(1, ge=1, description="Page to return when `per_page` is set."),
+    per_page: int = Query(0, ge=0, description="Tasks per page; 0 returns all matching tasks."),
+) -> Dict[str, TaskStatusResponseItem] | TaskStatusDeltaResponse | Response:
+    """
+    Returns the status of all active and recently completed tasks.
+
+    With `since`, only tasks changed after that cursor are returned, each with
+    just its new log lines. Responses carry an ETag and unchanged polls get a 304.
+    Only the log tail is included; the full log is served by /status/{id}/log.
+
+    Full listings can be filtered, extended with the task history and paginated;
+    `X-Total-Count` holds the number of matching tasks. Incremental responses
+    always cover every live task. With a shared task registry, the tasks of the
+    other workers are included too, tagged with their `worker`.
+    """
+    etag = f'W/"{clock.value}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    if since is not None:
+        return _status_delta(since, tail)
+
+    keep = _task_filter(statuses, binary, after, before)
+    live = [
+        (uid, data) for uid, data in tasks.items()
+        if keep(_status_code(data), data["binary"], data.get("created_at"))
+    ] + [
+        (uid, remote) for uid, remote in task_registry.remote.items()
+        if keep(remote.item["status"], remote.item["binary"], remote.item["createdAt"])
+    ]
+    archived = [
+        entry for entry in task_history.entries()
+        if keep(entry.status, entry.binary, entry.created_at)
+    ] if history else []
+    response.headers["X-Total-Count"] = str(len(live) + len(archived))
+
+    selected = chain(live, ((entry.uid, entry) for entry in archived))
+    if per_page:
+        selected = islice(selected, (page - 1) * per_page, page * per_page)
+    return {uid: _listing_item(uid, task, tail) for uid, task in selected}
+
+def _listing_item(uid: str, task: Any, tail: int) -> TaskStatusResponseItem:
+    if isinstance(task, ArchivedTask):
+        return _history_item(task, tail)
+    if isinstance(task, RemoteTask):
+        return _remote_item(task, tail)
+    return _status_item(uid, task, tail=tail)
+
+@router.get("/status/stream")
+async def status_stream(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="Cursor to resume from; defaults to a full snapshot."),
+    tail: int = Query(STATUS_TAIL_LINES, ge=0, description="Number of log lines sent per task; 0 sends everything kept in memory."),
+):
+    """
+    Pushes task changes as Server-Sent Events.
+
+    Each `status` event carries the same payload as /status?since=<cursor>,
+    coalescing everything that changed during one tick. The stream keeps one
+    cursor per client and only builds the next event once the previous one has
+    been written, so a slow client gets larger deltas rather than a growing buffer.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    cursor = int(last_event_id) if last_event_id and last_event_id.isdigit() else since
+    return StreamingResponse(
+        _status_events(request, cursor, tail),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _status_events(request: Request, cursor: Optional[int], tail: int) -> AsyncIterator[str]:
+    """Yields SSE frames for one client until it disconnects."""
+    delta = _status_delta(cursor, tail)
+    idle = 0.0
+
+    while True:
+        if delta is not None:
+            cursor = delta.cursor
+            idle = 0.0
+            yield f"id: {cursor}\nevent: status\ndata: {delta.model_dump_json()}\n\n"
+        elif idle >= STATUS_STREAM_HEARTBEAT:
+            idle = 0.0
+            yield ": keep-alive\n\n"
+
+        await asyncio.sleep(STATUS_STREAM_TICK)
+        idle += STATUS_STREAM_TICK
+        if await request.is_disconnected():
+            return
+        delta = _status_delta(cursor, tail) if clock.value > cursor else None
+
+def _status_delta(since: Optional[int], tail: int = STATUS_TAIL_LINES) -> TaskStatusDeltaResponse:
+    """
+    Builds the incremental status payload for a client that has seen everything
+    up to `since`, or a full snapshot if `since` is None or can't be served.
+    """
+    if since is None or needs_full_sync(since):
+        items = {uid: _status_item(uid, data, 0, tail) for uid, data in tasks.items()}
+        items.update((uid, _remote_item(remote, tail)) for uid, remote in task_registry.remote.items())
+        return TaskStatusDeltaResponse(cursor=clock.value, full=True, tasks=items)
+
+    changed: Dict[str, TaskStatusResponseItem] = {}
     for uid, data in tasks.items():
-        if data["completed"]:
-            log_output = data.get("final_log", "") 
-            if data["status"] == TaskStatus.ERROR.value:
-                status_code = TaskStatus.ERROR
-            elif "ERROR:" in log_output or "[CALLBACK ERROR:" in log_output or "[SYSTEM ERROR]" in log_output:
-                status_code = TaskStatus.WARNING
-            else:
-                status_code = TaskStatus.DONE
-
-            resp[uid] = TaskStatusResponseItem(
-                status=status_code,
-                output=log_output, 
-            )
-        else:
-            live_output = data.get("progress_log", "")
-            status_code = TaskStatus.ACTIVE if data["active"] else TaskStatus.PENDING
-            resp[uid] = TaskStatusResponseItem(
-                status=status_code,
-                output=live_output, 
-            )
-    return resp
+        if task_version(data) > since:
+            changed[uid] = _status_item(uid, data, since, tail)
+    for uid, remote in task_registry.remote.items():
+        if remote.version > since:
+            changed[uid] = _remote_item(remote, tail)
+
+    return TaskStatusDeltaResponse(
+        cursor=clock.value,
+        tasks=changed,
+        removed=[uid for uid in removed_since(since) if uid not in tasks and uid not in task_registry.remote],
+    )
+
+@router.get("/status/{uid}/resources", response_model=ResourceSeriesResponse)
+async def status_resources(request: Request, uid: str):
+    """Returns the rolling CPU, memory and I/O samples of a task's process tree."""
+    data = tasks.get(uid)
+    if data is None:
+        redirect = task_registry.redirect(request, uid)
+        if redirect is not None:
+            return redirect
+        raise HTTPException(status_code=404, detail=f"Task '{uid}' does not exist.")
+    series = (data.get("source") or data).get("resources")
+    return series.as_dict() if series is not None else ResourceSeriesResponse()
+
+@router.get("/status/{uid}/log")
+async def status_log(
+    request: Request,
+    uid: str,
+    offset: int = Query(0, ge=0, description="Byte offset to start reading from."),
+    limit: int = Query(LOG_READ_LIMIT, ge=1, le=LOG_READ_LIMIT, description="Maximum number of bytes to return."),
+):
+    """
+    Serves a byte range of a task's full log.
+
+    The `X-Log-Size` header holds the current size of the log and
+    `X-Log-Next-Offset` the offset to continue reading from. The log of a
+    task owned by another worker is served by that worker.
+    """
+    if uid not in tasks and uid not in task_history:
+        redirect = task_registry.redirect(request, uid)
+        if redirect is not None:
+            return redirect
+        raise HTTPException(status_code=404, detail=f"Task '{uid}' does not exist.")
+
+    if uid in tasks and "source" in tasks[uid]:
+        # Shared downloads are logged under the task that runs them.
+        uid = tasks[uid]["source_uid"]
+
+    if log_spool.enabled:
+        chunk, size = await log_spool.read(uid, offset, limit)
+    elif uid in task_history:
+        encoded = task_history.log(uid).encode("utf-8")
+        chunk, size = encoded[offset:offset + limit], len(encoded)
+    else:
+        data = tasks[uid]
+        text = data["final_log"] if data["completed"] else data["log"].text()
+        encoded = text.encode("utf-8")
+        chunk, size = encoded[offset:offset + limit], len(encoded)
+
+    return Response(
+        content=chunk,
+        media_type="text/plain; charset=utf-8",
+        headers={"X-Log-Size": str(size), "X-Log-Next-Offset": str(offset + len(chunk))},
+    )
+
+async def _hand_over(uid: str) -> bool:
+    """
+    Removes a task whose download is shared by other tasks without stopping it:
+    the download, with its queue position and log, passes to the first of them.
+    Returns False if no other task shares the download.
+    """
+    data = tasks[uid]
+    heirs = [sub_uid for sub_uid in data.get("subscribers", []) if sub_uid in tasks]
+    if data["completed"] or not heirs:
+        return False
+
+    heir_uid, heirs = heirs[0], heirs[1:]
+    heir = tasks[heir_uid]
+    callback_task = data.get("callback_task")
+    if callback_task and not callback_task.done():
+        callback_task.cancel()
+    for key in ("callbacks", "priority", "created_at"):
+        data[key] = heir[key]
+    data["subscribers"] = heirs
+    for sub_uid in heirs:
+        tasks[sub_uid]["source_uid"] = heir_uid
+
+    scheduler.rename(uid, heir_uid)
+    live_watcher.rename(uid, heir_uid)
+    await log_spool.rename(uid, heir_uid)
+    data["log"].sink = log_spool.writer(heir_uid)
+    tasks[heir_uid] = data
+    del tasks[uid]
+    touch(data)
+    record_removal(uid)
+    logger.info(f"[{heir_uid}] Took over the download of removed task {uid}.")
+    return True
 
 @router.delete("/status")
 async def status_delete(body: StatusDeleteRequest):
-    """Deletes a task by ID, terminating it if currently running."""
+    """
+    Deletes a task by ID, terminating its whole process tree if currently running.
+    A task owned by another worker is deleted by that worker.
+    """
     uid = body.id
+    owner = task_registry.owner(uid)
+    if owner is not None and owner != task_registry.worker_id:
+        task_registry.send(owner, "delete", {"id": uid})
+        logger.info(f"[{uid}] Delete sent to worker {owner}.")
+        return {"worker": owner}
 
-    if uid in tasks:
+    await _delete_task(uid)
+    return {}
+
+async def _delete_task(uid: str):
+    if uid in tasks and await _hand_over(uid):
+        logger.info(f"[{uid}] Task entry removed; its download continues for the tasks sharing it.")
+    elif uid in tasks:
         data = tasks[uid]
-        
+        source = data.get("source")
+        if source is not None and uid in source.get("subscribers", []):
+            source["subscribers"].remove(uid)
+
+        if scheduler.cancel(uid) or live_watcher.cancel(uid):
+            logger.info(f"[{uid}] Task was still queued, nothing to terminate.")
+
         process = data.get("process")
         if process and process.returncode is None:
-            logger.warning(f"[{uid}] Terminating process {process.pid}")
+            logger.warning(f"[{uid}] Terminating process group {process.pid}")
             try:
-                process.terminate()
-                await asyncio.wait_for(process.wait(), timeout=5)
-            except asyncio.TimeoutError:
-                logger.error(f"[{uid}] Process did not terminate gracefully, sending SIGKILL.")
-                process.kill()
+                if not await terminate_tree(process):
+                    logger.error(f"[{uid}] Process did not terminate gracefully, sent SIGKILL.")
             except Exception as e:
                 logger.exception(f"[{uid}] Error terminating process: {e}")
 
-        task = data.get("task")
-        if task and not task.done():
-            task.cancel()
-            logger.warning(f"[{uid}] Cancelled asyncio task.")
+        for key in ("task", "finalize_task", "callback_task"):
+            task = data.get(key)
+            if task and not task.done():
+                task.cancel()
+                logger.warning(f"[{uid}] Cancelled asyncio {key.replace('_', ' ')}.")
 
         tasks.pop(uid)
+        record_removal(uid)
+        log_spool.remove(uid)
         logger.info(f"[{uid}] Task entry removed.")
-    
-    return {}
+    elif task_history.remove(uid):
+        record_removal(uid)
+        log_spool.remove(uid)
+        logger.info(f"[{uid}] Archived task removed.")
+
+task_registry.on("delete", lambda payload: _delete_task(payload["id"]))
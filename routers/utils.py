@@ -2,11 +2,10 @@ import asyncio
 import logging
 import os
 
-from fastapi import APIRouter, Response, HTTPException
+from fastapi import APIRouter, Response
 from typing import Dict, Any, List
-from config.dependencies import tasks
-from config.schemas import UpdateBinaryResponse
-from services.binary_manager import get_ytarchive, get_ytdlp
+from config.schemas import BinaryInfo, UpdateBinaryResponse
+from services.binary_manager import BINARIES, binary_path, is_installed, job_state, start_update
 
 logger = logging.getLogger("app")
 router = APIRouter()
@@ -16,35 +15,32 @@ try:
 except ImportError:
     callbacks = None
 
+def _start_update(name: str, label: str) -> UpdateBinaryResponse:
+    if not start_update(name):
+        return UpdateBinaryResponse(status="running", message=f"A {label} update is already in progress.")
+    return UpdateBinaryResponse(status="started", message=f"{label} update started in the background.")
+
 @router.post("/update-ytdlp", response_model=UpdateBinaryResponse)
 async def update_ytdlp():
-    """Updates the yt-dlp binary, provided no yt-dlp tasks are running."""
-    for uid, data in tasks.items():
-        if data["binary"] == "ytdlp" and not data["completed"]:
-            raise HTTPException(
-                status_code=409, 
-                detail=f"Cannot update yt-dlp: task '{uid}' is still running."
-            )
-    try:
-        get_ytdlp()
-        return {"status": "success", "message": "yt-dlp updated successfully."}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Update failed: {str(e)}")
+    """Starts a background update of the yt-dlp binary. Running tasks keep the version they started with."""
+    return _start_update("ytdlp", "yt-dlp")
 
 @router.post("/update-ytarchive", response_model=UpdateBinaryResponse)
-async def update_ytdlp():
-    """Updates the ytarchive binary, provided no ytarchive tasks are running."""
-    for uid, data in tasks.items():
-        if data["binary"] == "ytarchive" and not data["completed"]:
-            raise HTTPException(
-                status_code=409, 
-                detail=f"Cannot update ytarchive: task '{uid}' is still running."
-            )
-    try:
-        get_ytarchive()
-        return {"status": "success", "message": "ytarchive updated successfully."}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Update failed: {str(e)}")
+async def update_ytarchive():
+    """Starts a background update of the ytarchive binary. Running tasks keep the version they started with."""
+    return _start_update("ytarchive", "ytarchive")
+
+@router.get("/binaries", response_model=Dict[str, BinaryInfo])
+async def binaries():
+    """Returns the path of each binary and the state of its last install/update job."""
+    return {
+        name: BinaryInfo(
+            path=str(binary_path(name)),
+            installed=is_installed(name),
+            **job_state.get(name, {}),
+        )
+        for name in BINARIES
+    }
 
 @router.get("/cookie")
 async def cookie():
@@ -0,0 +1,145 @@
+import math
+import logging
+
+from typing import Any, Dict, List, Optional
+from config.config import (
+    AUTOTUNE_MAX_THREADS, AUTOTUNE_THREAD_RATE, BANDWIDTH_BUDGET, BANDWIDTH_LIVE_WEIGHT, BANDWIDTH_MIN_RATE,
+    YTARCHIVE_MAP, YTDLP_MAP,
+)
+from config.dependencies import tasks
+
+logger = logging.getLogger("app")
+
+THREAD_FLAGS = {"ytarchive": YTARCHIVE_MAP["threads"][0], "ytdlp": YTDLP_MAP["threads"][0]}
+# Flags that make a yt-dlp task a live recording rather than a VOD download.
+LIVE_FLAGS = (YTDLP_MAP["wait_for_live"][0], YTDLP_MAP["retry_stream"][0])
+# ytarchive has no rate limit option; only its thread count is tuned.
+RATE_LIMIT_FLAG = "--limit-rate"
+
+
+def is_live(data: Dict[str, Any]) -> bool:
+    """ytarchive always records live streams; yt-dlp does when asked to wait for or record from the start of one."""
+    if data["binary"] == "ytarchive":
+        return True
+    return any(flag in data["cmd"] for flag in LIVE_FLAGS)
+
+
+def _set_option(argv: List[str], flag: str, value: str):
+    """Sets `flag value` in argv, replacing an existing value or inserting it right after the binary."""
+    if flag in argv:
+        index = argv.index(flag)
+        argv[index + 1] = value
+    else:
+        argv[1:1] = [flag, value]
+
+
+class BandwidthController:
+    """
+    Splits a total download bandwidth budget between running tasks.
+
+    Options are fixed once a process has started, so every task gets its share
+    when it is launched: a weighted fair share of the budget, live recordings
+    counting BANDWIDTH_LIVE_WEIGHT times as much as VOD downloads. A VOD
+    download is also limited to what the running tasks, measured by their
+    current speed, leave unused, and is started with `--limit-rate`; live
+    recordings are never rate limited so VOD traffic cannot make them fall
+    behind. The thread count is the share divided by the throughput a single
+    thread is currently reaching, measured across running tasks.
+    """
+
+    def __init__(
+        self,
+        budget: int = BANDWIDTH_BUDGET,
+        live_weight: float = BANDWIDTH_LIVE_WEIGHT,
+        min_rate: int = BANDWIDTH_MIN_RATE,
+        thread_rate: int = AUTOTUNE_THREAD_RATE,
+        max_threads: int = AUTOTUNE_MAX_THREADS,
+    ):
+        self.budget = budget
+        self.live_weight = live_weight
+        self.min_rate = min_rate
+        self.thread_rate = thread_rate
+        self.max_threads = max(1, max_threads)
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    @staticmethod
+    def _running(exclude: str) -> List[Dict[str, Any]]:
+        running = []
+        for uid, data in tasks.items():
+            process = data.get("process")
+            if uid != exclude and process is not None and process.returncode is None and not data["completed"]:
+                running.append(data)
+        return running
+
+    @staticmethod
+    def _measured(data: Dict[str, Any]) -> float:
+        """Current speed of a running task, or its allocated share while it has not reported one."""
+        speed = data["progress"].speed
+        if speed is not None:
+            return speed
+        allocation = data.get("bandwidth")
+        return allocation["share"] if allocation else 0
+
+    def _weight(self, data: Dict[str, Any]) -> float:
+        return self.live_weight if is_live(data) else 1.0
+
+    def per_thread_rate(self, running: List[Dict[str, Any]]) -> float:
+        """Average throughput of one download thread across running tasks that report a speed."""
+        rates = [
+            data["progress"].speed / data["bandwidth"]["threads"]
+            for data in running
+            if data["progress"].speed and data.get("bandwidth")
+        ]
+        return sum(rates) / len(rates) if rates else self.thread_rate
+
+    def allocate(self, uid: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Works out a starting task's share, thread count and rate limit, and
+        applies them to its command. Tasks of a binary without a thread
+        option are left alone.
+        """
+        thread_flag = THREAD_FLAGS.get(data["binary"])
+        if not self.enabled or thread_flag is None:
+            return None
+
+        running = self._running(uid)
+        live = is_live(data)
+        weight = self._weight(data)
+        fair = self.budget * weight / (weight + sum(self._weight(other) for other in running))
+
+        if live:
+            # VOD downloads are capped, so the rest of the budget is what live recordings can count on.
+            share = max(fair, self.budget - sum(self._measured(other) for other in running if is_live(other)))
+            reason = "live: fair share or whatever other live recordings leave"
+        else:
+            spare = self.budget - sum(self._measured(other) for other in running)
+            share = min(fair, spare)
+            reason = "vod: fair share" if share == fair else "vod: limited to unused bandwidth"
+        share = max(int(share), self.min_rate)
+
+        per_thread = self.per_thread_rate(running)
+        threads = max(1, min(self.max_threads, math.ceil(share / per_thread)))
+        rate_limit = share if not live and data["binary"] == "ytdlp" else None
+
+        _set_option(data["cmd"], thread_flag, str(threads))
+        if rate_limit is not None:
+            _set_option(data["cmd"], RATE_LIMIT_FLAG, str(rate_limit))
+
+        allocation = {
+            "live": live,
+            "share": share,
+            "threads": threads,
+            "rateLimit": rate_limit,
+            "perThreadRate": int(per_thread),
+            "runningTasks": len(running),
+            "reason": reason,
+        }
+        data["bandwidth"] = allocation
+        logger.info(f"[{uid}] Bandwidth allocation: {allocation}")
+        return allocation
+
+
+bandwidth = BandwidthController()
@@ -1,86 +1,179 @@
 import os
+import re
 import shutil
-import subprocess
+import asyncio
+import hashlib
 import logging
+import tempfile
+import subprocess
 import urllib.request
 
-from io import BytesIO
 from pathlib import Path
+from typing import Dict, Optional
 from zipfile import ZipFile
 
 logger = logging.getLogger("app")
 
-YTARCHIVE_PATH = None
-YTDLP_PATH = None
+BINARIES = {
+    "ytarchive": {
+        "env": "YTARCHIVE_BIN",
+        "local": "./ytarchive",
+        "url": "https://github.com/Kethsar/ytarchive/releases/latest/download/ytarchive_linux_amd64.zip",
+        "zip_member": "ytarchive",
+    },
+    "ytdlp": {
+        "env": "YTDLP_BIN",
+        "local": "./yt-dlp",
+        "url": "https://github.com/yt-dlp/yt-dlp/releases/latest/download/yt-dlp",
+        "zip_member": None,
+    },
+}
+
+# Versioned copies kept next to the active binary, newest first; older ones are pruned.
+KEEP_VERSIONS = 3
+DOWNLOAD_TIMEOUT = 60
+CHUNK_SIZE = 1024 * 1024
+
+# name -> running install/update job
+_jobs: Dict[str, asyncio.Task] = {}
+# name -> {"state": ..., "message": ..., "version": ...} of the last job
+job_state: Dict[str, Dict[str, Optional[str]]] = {}
+
+
+def binary_path(name: str) -> Path:
+    """Returns the path a binary is run from. Never blocks on the network."""
+    spec = BINARIES[name]
+    return Path(os.environ.get(spec["env"], spec["local"])).absolute()
+
+
+def is_installed(name: str) -> bool:
+    return binary_path(name).is_file()
+
 
+def _download(url: str, dest) -> None:
+    """Streams a URL into an open binary file."""
+    with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as resp:
+        shutil.copyfileobj(resp, dest, CHUNK_SIZE)
 
-def get_ytarchive():
-    """Downloads and extracts the ytarchive binary."""
-    logger.info("ytarchive not found. Downloading...")
-    url = "https://github.com/Kethsar/ytarchive/releases/latest/download/ytarchive_linux_amd64.zip"
+
+def _verify(path: Path) -> str:
+    """Checks that a downloaded binary runs and returns its reported version."""
+    os.chmod(path, 0o755)
+    result = subprocess.run([str(path), "--version"], capture_output=True, text=True, timeout=30)
+    output = (result.stdout or result.stderr).strip()
+    if result.returncode != 0 or not output:
+        raise RuntimeError(f"{path.name} --version failed with code {result.returncode}: {output[:200]}")
+    return output.splitlines()[0]
+
+
+def install_binary(name: str) -> str:
+    """
+    Downloads, verifies and atomically activates the latest release of a binary.
+    Blocking; run it in a worker thread. Returns the installed version.
+
+    The release is streamed to a temporary file, checked with `--version`, kept
+    as `.versions/<name>-<version>` and the active path is switched to it with a
+    single rename. Processes already running keep executing the file they started.
+    """
+    spec = BINARIES[name]
+    target = binary_path(name)
+    versions_dir = target.parent / ".versions"
+    versions_dir.mkdir(parents=True, exist_ok=True)
+
+    logger.info(f"Downloading {name} from {spec['url']}")
+    with tempfile.NamedTemporaryFile(dir=versions_dir, prefix=f".{name}-", delete=False) as tmp:
+        download_path = Path(tmp.name)
+    staged = download_path
     try:
-        with urllib.request.urlopen(url) as resp:
-            with ZipFile(BytesIO(resp.read())) as zfile:
-                zfile.extractall("./")
-        subprocess.call("chmod +x ./ytarchive", shell=True)
-        logger.info("Finished setting up ytarchive")
-        return Path("./ytarchive").resolve() 
+        with open(download_path, "wb") as out:
+            _download(spec["url"], out)
+
+        if spec["zip_member"]:
+            staged = download_path.with_suffix(".bin")
+            with ZipFile(download_path) as zfile, zfile.open(spec["zip_member"]) as src, open(staged, "wb") as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            download_path.unlink()
+
+        version = _verify(staged)
+        digest = hashlib.sha256(staged.read_bytes()).hexdigest()[:12]
+        tag = re.sub(r"[^A-Za-z0-9._-]+", "_", version)[:40]
+        versioned = versions_dir / f"{target.name}-{tag}-{digest}"
+        os.replace(staged, versioned)
+
+        link = target.parent / f".{target.name}.swap"
+        if link.is_symlink() or link.exists():
+            link.unlink()
+        link.symlink_to(versioned)
+        os.replace(link, target)
     except Exception:
-        logger.error("Failed to download or set up ytarchive.", exc_info=True)
-        return Path("./ytarchive").resolve()
+        for leftover in (download_path, staged):
+            if leftover.exists():
+                leftover.unlink()
+        raise
 
+    _prune_versions(versions_dir, target.name, versioned)
+    logger.info(f"Installed {name} {version} at {target}")
+    return version
 
-def get_ytdlp():
-    """Downloads and sets up the yt-dlp binary."""
-    logger.info("Starting to download yt-dlp")
+
+def _prune_versions(versions_dir: Path, stem: str, active: Path):
+    candidates = sorted(versions_dir.glob(f"{stem}-*"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in candidates[KEEP_VERSIONS:]:
+        if old != active:
+            old.unlink(missing_ok=True)
+
+
+def get_ytarchive() -> str:
+    """Downloads and activates the latest ytarchive binary (blocking)."""
+    return install_binary("ytarchive")
+
+
+def get_ytdlp() -> str:
+    """Downloads and activates the latest yt-dlp binary (blocking)."""
+    return install_binary("ytdlp")
+
+
+async def _run_job(name: str):
+    job_state[name] = {"state": "running", "message": f"Updating {name}...", "version": None}
     try:
-        url = "https://github.com/yt-dlp/yt-dlp/releases/latest/download/yt-dlp"
-        urllib.request.urlretrieve(url, "./yt-dlp")
-        subprocess.call("chmod +x ./yt-dlp", shell=True)
-        logger.info("Finished setting up yt-dlp")
-        return Path("./yt-dlp").resolve() 
-        
-    except Exception:
-        logger.error("Failed to download or set up yt-dlp.", exc_info=True)
-        return Path("./yt-dlp").resolve
+        version = await asyncio.to_thread(install_binary, name)
+        job_state[name] = {"state": "done", "message": f"{name} updated to {version}.", "version": version}
+    except Exception as e:
+        logger.error(f"Failed to download or set up {name}.", exc_info=True)
+        job_state[name] = {"state": "failed", "message": f"{name} update failed: {e}", "version": None}
+    finally:
+        _jobs.pop(name, None)
+
+
+def start_update(name: str) -> bool:
+    """Starts a background install/update job. Returns False if one is already running."""
+    if name in _jobs:
+        return False
+    _jobs[name] = asyncio.create_task(_run_job(name))
+    return True
+
+
+async def ensure_installed(name: str):
+    """
+    Waits for a binary to be available, installing it in the background if it
+    is missing. Raises RuntimeError if it could not be installed.
+    """
+    if is_installed(name):
+        return
+    start_update(name)
+    job = _jobs.get(name)
+    if job is not None:
+        await asyncio.shield(job)
+    if not is_installed(name):
+        state = job_state.get(name) or {}
+        raise RuntimeError(state.get("message") or f"{name} is not installed at {binary_path(name)}.")
 
 
 def initialize_binaries():
-    """Determines and sets the paths for ytarchive and yt-dlp."""
-    global YTARCHIVE_PATH, YTDLP_PATH
-    
-    if "YTARCHIVE_BIN" in os.environ:
-        path = Path(os.environ["YTARCHIVE_BIN"])
-        logger.info("Using YTARCHIVE_BIN env variable")
-        if path.is_file():
-            logger.info("Using ytarchive binaries from ENV")
-            YTARCHIVE_PATH = path.resolve()
+    """Starts background installs for missing binaries. Returns immediately."""
+    for name in BINARIES:
+        if is_installed(name):
+            logger.info(f"Using {name} at {binary_path(name)}")
         else:
-            YTARCHIVE_PATH = get_ytarchive()
-    else:
-        path = Path("./ytarchive")
-        logger.warning("No YTARCHIVE_BIN env variable set. Checking local")
-        if path.is_file():
-            logger.info("Using local ytarchive binaries")
-            YTARCHIVE_PATH = path.resolve()
-        else:
-            YTARCHIVE_PATH = get_ytarchive()
-
-    if "YTDLP_BIN" in os.environ:
-        path = Path(os.environ["YTDLP_BIN"])
-        logger.info("Using YTDLP_BIN env variable")
-        if path.is_file():
-            logger.info("Using yt-dlp binaries from ENV")
-            YTDLP_PATH = path
-        else:
-            YTDLP_PATH = get_ytdlp()
-    else:
-        path = Path("./yt-dlp")
-        logger.warning("No YTDLP_BIN env variable set. Checking local")
-        if path.is_file():
-            logger.info("Using local yt-dlp binaries")
-            YTDLP_PATH = path.resolve() 
-        else:
-            YTDLP_PATH = get_ytdlp()
-
-initialize_binaries()
+            logger.warning(f"{name} not found at {binary_path(name)}, downloading in the background.")
+            start_update(name)
@@ -0,0 +1,145 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import traceback
+
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from config.config import CALLBACK_EXECUTOR, CALLBACK_NICE, CALLBACK_TIMEOUT, CALLBACK_WORKERS
+from config.schemas import TaskStatus
+from services.metrics import callback_duration_seconds
+from services.task_state import touch
+
+logger = logging.getLogger("app")
+
+try:
+    from callbacks import callbacks
+except ImportError:
+    callbacks = None
+
+_executor: Optional[Executor] = None
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def _invoke_callback(cb_id: str, final_file: str) -> Dict[str, Any]:
+    """Runs a callback by ID. Module level so it can be pickled into a process pool."""
+    from callbacks import callbacks
+    return callbacks[cb_id](final_file)
+
+
+def _lower_priority(nice: int):
+    """Worker initializer: sets the niceness of the calling worker thread or process."""
+    try:
+        # On Linux niceness is per thread, so this leaves the event loop thread alone.
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), nice)
+    except (AttributeError, OSError) as e:
+        logger.warning(f"Could not set callback worker niceness to {nice}: {e}")
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        initializer, initargs = (_lower_priority, (CALLBACK_NICE,)) if CALLBACK_NICE else (None, ())
+        if CALLBACK_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=CALLBACK_WORKERS, initializer=initializer, initargs=initargs)
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=CALLBACK_WORKERS, thread_name_prefix="callback", initializer=initializer, initargs=initargs,
+            )
+    return _executor
+
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(CALLBACK_WORKERS)
+    return _slots
+
+
+def _merge_result(data: Dict[str, Any], result: Dict[str, Any]):
+    """
+    Merges a callback's `front`/`end` output blocks into the task's final log
+    and spooled log, downgrading a successful task to WARNING if they report errors.
+    """
+    current_log = data["final_log"]
+    log = data["log"]
+    blocks = []
+
+    if "front" in result and result["front"]:
+        for key, block in result["front"].items():
+            current_log = f"{key}:\n{block['out']}\n\n{current_log}"
+            blocks.append(f"\n{key}:\n{block['out']}")
+            if block.get("err"):
+                current_log = f"{key} ERROR:\n{block['err']}\n\n{current_log}"
+                blocks.append(f"\n{key} ERROR:\n{block['err']}")
+
+    if "end" in result and result["end"]:
+        for key, block in result["end"].items():
+            current_log += f"\n\n{key}:\n{block['out']}"
+            blocks.append(f"\n{key}:\n{block['out']}")
+            if block.get("err"):
+                current_log += f"\n\n{key} ERROR:\n{block['err']}"
+                blocks.append(f"\n{key} ERROR:\n{block['err']}")
+
+    log_text = "".join(blocks)
+    if log_text:
+        log.spool(log_text)
+    data["final_log"] = current_log
+    # Classified here, once, instead of by scanning final_log on every /status request.
+    if data["status"] == TaskStatus.DONE.value and "ERROR:" in log_text:
+        data["status"] = TaskStatus.WARNING.value
+
+
+def _set_state(data: Dict[str, Any], cb_id: str, state: str):
+    data["callback_state"][cb_id] = state
+    touch(data)
+
+
+async def run_callbacks(uid: str, data: Dict[str, Any], final_file: str):
+    """
+    Runs a task's callbacks one after another in the worker pool.
+
+    At most CALLBACK_WORKERS callbacks run at once across all tasks, each
+    bounded by CALLBACK_TIMEOUT. Per-callback state (queued, running, done,
+    failed, timeout) is kept in `data["callback_state"]`.
+    """
+    data["callback_state"] = {cb_id: "queued" for cb_id in data["callbacks"]}
+    touch(data)
+    loop = asyncio.get_running_loop()
+
+    for cb_id in data["callbacks"]:
+        async with _get_slots():
+            _set_state(data, cb_id, "running")
+            logger.info(f"[{uid}] Running callback {cb_id}")
+            future = loop.run_in_executor(_get_executor(), _invoke_callback, cb_id, final_file)
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(future, timeout=CALLBACK_TIMEOUT or None)
+                callback_duration_seconds.labels("done").observe(time.perf_counter() - started)
+                _merge_result(data, result)
+                _set_state(data, cb_id, "done")
+                logger.info(f"[{uid}] Callback {cb_id} executed successfully.")
+                continue
+
+            except asyncio.TimeoutError:
+                # A thread cannot be interrupted; it keeps its worker until it returns on its own.
+                logger.error(f"[{uid}] Callback {cb_id} timed out after {CALLBACK_TIMEOUT}s.")
+                callback_error = f"\n\n[CALLBACK ERROR: {cb_id}]\nTimed out after {CALLBACK_TIMEOUT} seconds."
+                state = "timeout"
+
+            except Exception:
+                logger.exception(f"[{uid}] Callback {cb_id} failed unexpectedly.")
+                callback_error = f"\n\n[CALLBACK ERROR: {cb_id}]\n{traceback.format_exc()}"
+                state = "failed"
+
+            callback_duration_seconds.labels(state).observe(time.perf_counter() - started)
+
+        data["final_log"] += callback_error
+        data["log"].spool(callback_error)
+        if data["status"] == TaskStatus.DONE.value:
+            data["status"] = TaskStatus.WARNING.value
+        _set_state(data, cb_id, state)
+
+    logger.info(f"[{uid}] Callbacks finished with final status: {TaskStatus(data['status']).name}")
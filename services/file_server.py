@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import mimetypes
+import aiofiles
+
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+from urllib.parse import quote
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+logger = logging.getLogger("app")
+
+# Bytes read per chunk when the server cannot send the file itself.
+CHUNK_SIZE = 256 * 1024
+# How often a followed file that has no new data is checked again (seconds).
+FOLLOW_POLL_INTERVAL = 0.5
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single-range `Range` header into an inclusive (start, end) pair.
+    Returns None for a missing, malformed or multi-range header, which is
+    answered with the whole file as HTTP allows.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, sep, last = header[6:].strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+class FileRangeResponse(Response):
+    """
+    Sends a file or a byte range of it.
+
+    If the server supports the ASGI zero-copy extension the file descriptor is
+    handed to it for `sendfile`; otherwise the file is read in chunks with
+    aiofiles. With `follow`, the response has no length: it keeps sending what
+    is appended to the file and ends once `follow()` returns False and the end
+    of the file has been reached, which serves a recording that is still being written.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        range_header: Optional[str] = None,
+        follow: Optional[Callable[[], bool]] = None,
+        send_body: bool = True,
+    ):
+        self.path = path
+        self.follow = follow
+        self.send_body = send_body
+        self.background = None
+        size = path.stat().st_size
+        self.start, self.end = 0, size - 1
+        self.status_code = 200
+
+        media_type = mimetypes.guess_type(path.name.removesuffix(".part"))[0] or "application/octet-stream"
+        headers = {
+            "accept-ranges": "bytes",
+            "content-type": media_type,
+            "content-disposition": f"inline; filename*=utf-8''{quote(path.name)}",
+        }
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            self.status_code = 416
+            self.start, self.end = 0, -1
+            headers["content-range"] = f"bytes */{size}"
+            byte_range = None
+        if byte_range is not None:
+            self.start, self.end = byte_range
+            self.status_code = 206
+            headers["content-range"] = f"bytes {self.start}-{self.end}/{size}"
+        if follow is None or self.status_code != 200:
+            headers["content-length"] = str(self.end - self.start + 1)
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        length = self.end - self.start + 1
+        following = self.follow is not None and self.status_code == 200
+        if not self.send_body or (length <= 0 and not following):
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if not following and "http.response.zerocopy" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopy", "file": f,
+                    "offset": self.start, "count": length, "more_body": False,
+                })
+            return
+
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.create_task(watch_disconnect()) if following else None
+        try:
+            async with aiofiles.open(self.path, "rb") as f:
+                await f.seek(self.start)
+                remaining = None if following else length
+                active = True
+                while (remaining is None or remaining > 0) and not disconnected.is_set():
+                    chunk = await f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                    if chunk:
+                        if remaining is not None:
+                            remaining -= len(chunk)
+                        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                        continue
+                    if remaining is not None or not active:
+                        break
+                    # Caught up with the writer. Once the task is done, one more pass picks up its last writes.
+                    active = self.follow()
+                    if active:
+                        await asyncio.sleep(FOLLOW_POLL_INTERVAL)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+        await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,309 @@
+import json
+import time
+import random
+import asyncio
+import logging
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Set
+from config.config import (
+    LIVE_CHECK_JITTER, LIVE_CHECK_MAX_INTERVAL, LIVE_CHECK_MIN_INTERVAL, LIVE_PROBE, LIVE_PROBE_BATCH,
+    LIVE_PROBE_MAX_FAILURES, LIVE_PROBE_STUB_FILE, LIVE_PROBE_TIMEOUT, YTARCHIVE_MAP, YTDLP_MAP,
+)
+from config.dependencies import tasks
+from services.binary_manager import binary_path, ensure_installed
+from services.metrics import live_checks
+from services.process_launcher import launch, terminate_tree
+from services.scheduler import scheduler
+from services.task_state import touch
+
+logger = logging.getLogger("app")
+
+# Options that make the binary itself wait for a stream to start.
+WAIT_FLAGS = {
+    "ytarchive": (YTARCHIVE_MAP["wait_for_live"][0], YTARCHIVE_MAP["retry_stream"][0]),
+    "ytdlp": (YTDLP_MAP["retry_stream"][0],),
+}
+VIDEO_URL_PREFIX = "https://youtu.be/"
+
+# yt-dlp's `live_status` values; only an upcoming stream keeps a task in the watcher.
+UPCOMING = "is_upcoming"
+
+# Doublings of the check interval after which it no longer grows (already far beyond any max_interval).
+MAX_BACKOFF_STEPS = 32
+
+
+def waits_for_live(data: Dict[str, Any]) -> bool:
+    """Whether a task's command would start a process that waits for the stream to go live."""
+    return any(flag in data["cmd"] for flag in WAIT_FLAGS.get(data["binary"], ()))
+
+
+def video_id(data: Dict[str, Any]) -> Optional[str]:
+    """The YouTube ID a task downloads, taken from the URL in its command."""
+    for arg in data["cmd"]:
+        if arg.startswith(VIDEO_URL_PREFIX):
+            return arg[len(VIDEO_URL_PREFIX):]
+    return None
+
+
+class LiveProbe(ABC):
+    """
+    Looks up the live status of several videos at once. `check` returns
+    {video_id: {"liveStatus": ..., "scheduledStart": ...}}; a video missing
+    from the result could not be checked.
+    """
+
+    @abstractmethod
+    async def check(self, video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        ...
+
+
+class YtdlpProbe(LiveProbe):
+    """Asks a single yt-dlp process for the live status of a batch of videos, without downloading anything."""
+
+    def __init__(self, timeout: float = LIVE_PROBE_TIMEOUT):
+        self.timeout = timeout
+
+    async def check(self, video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        await ensure_installed("ytdlp")
+        argv = [
+            str(binary_path("ytdlp")), "--ignore-errors", "--ignore-no-formats-error", "--no-warnings",
+            "--skip-download", "--print", "%(id)s %(live_status)s %(release_timestamp)s",
+            *(VIDEO_URL_PREFIX + vid for vid in video_ids),
+        ]
+        process = await launch(argv, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            await terminate_tree(process)
+            raise
+
+        results = {}
+        for line in stdout.decode("utf-8", "replace").splitlines():
+            parts = line.split()
+            if len(parts) != 3:
+                continue
+            vid, status, start = parts
+            results[vid] = {
+                "liveStatus": status,
+                "scheduledStart": float(start) if start.isdigit() else None,
+            }
+        return results
+
+
+class StubProbe(LiveProbe):
+    """
+    Reads live statuses from a JSON file ({"<id>": "is_live"} or
+    {"<id>": {"liveStatus": ..., "scheduledStart": ...}}), for tests and
+    local development. Videos missing from the file are upcoming.
+    """
+
+    def __init__(self, path: str = LIVE_PROBE_STUB_FILE):
+        self.path = path
+
+    async def check(self, video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                known = json.load(f)
+        except FileNotFoundError:
+            known = {}
+        results = {}
+        for vid in video_ids:
+            entry = known.get(vid, UPCOMING)
+            if isinstance(entry, str):
+                entry = {"liveStatus": entry}
+            results[vid] = {"liveStatus": entry.get("liveStatus", UPCOMING), "scheduledStart": entry.get("scheduledStart")}
+        return results
+
+
+PROBES = {"ytdlp": YtdlpProbe, "stub": StubProbe}
+
+
+class LiveWatcher:
+    """
+    Holds tasks that wait for a stream to go live, instead of starting a
+    binary that would sit idle polling on its own until then.
+
+    One loop checks every watched video through a `LiveProbe`, in batches of
+    up to LIVE_PROBE_BATCH. Checks back off exponentially from
+    LIVE_CHECK_MIN_INTERVAL to LIVE_CHECK_MAX_INTERVAL while nothing changes,
+    aim at the scheduled start time when one is known, and are jittered so
+    the videos of one schedule do not all hit the site at once. Videos due
+    soon after the first are checked in the same batch. Once a stream is no
+    longer upcoming the task is handed to the scheduler and starts the real
+    binary; its wait options stay, in case the stream takes a moment to start.
+    A task whose video fails LIVE_PROBE_MAX_FAILURES checks in a row is
+    handed over too, so the binary can wait by itself.
+    """
+
+    def __init__(
+        self,
+        probe: Optional[LiveProbe] = None,
+        batch_size: int = LIVE_PROBE_BATCH,
+        min_interval: float = LIVE_CHECK_MIN_INTERVAL,
+        max_interval: float = LIVE_CHECK_MAX_INTERVAL,
+        jitter: float = LIVE_CHECK_JITTER,
+        max_failures: int = LIVE_PROBE_MAX_FAILURES,
+    ):
+        self.probe = probe
+        self.batch_size = max(1, batch_size)
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.jitter = jitter
+        self.max_failures = max_failures
+        self.watching: Set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.probe is not None
+
+    def submit(self, uid: str):
+        """Queues a task: through the watcher if it waits for a stream, straight to the scheduler otherwise."""
+        if not self._watch(uid):
+            scheduler.submit(uid)
+
+    def submit_many(self, uids: List[str]):
+        """Queues several tasks; those that do not wait for a stream reach the scheduler in one go."""
+        scheduler.submit_many([uid for uid in uids if not self._watch(uid)])
+
+    def _watch(self, uid: str) -> bool:
+        """Starts watching a task that waits for a stream. Returns False for any other task."""
+        data = tasks[uid]
+        vid = video_id(data)
+        if not self.enabled or not waits_for_live(data) or vid is None:
+            return False
+        now = time.time()
+        data["live_wait"] = {
+            "videoId": vid,
+            "liveStatus": None,
+            "scheduledStart": None,
+            "checks": 0,
+            "failures": 0,
+            "unchanged": 0,
+            "lastCheck": None,
+            "nextCheck": now,
+            "since": now,
+        }
+        self.watching.add(uid)
+        touch(data)
+        logger.info(f"[{uid}] Watching {vid} until the stream goes live.")
+        self._wakeup.set()
+        return True
+
+    def cancel(self, uid: str) -> bool:
+        """Stops watching a task. Returns False if it was not watched."""
+        if uid not in self.watching:
+            return False
+        self.watching.discard(uid)
+        logger.info(f"[{uid}] Removed from the live watcher.")
+        return True
+
+    def rename(self, old: str, new: str) -> bool:
+        if old not in self.watching:
+            return False
+        self.watching.discard(old)
+        self.watching.add(new)
+        return True
+
+    def _interval(self, wait: Dict[str, Any], now: float) -> float:
+        """Delay until a video's next check: backed off, aimed at its scheduled start, jittered."""
+        interval = min(self.max_interval, self.min_interval * 2 ** min(wait["unchanged"], MAX_BACKOFF_STEPS))
+        start = wait["scheduledStart"]
+        if start and start > now:
+            interval = max(self.min_interval, min(self.max_interval, start - now))
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _release(self, uid: str, data: Dict[str, Any], reason: str):
+        """Hands a watched task to the scheduler."""
+        self.watching.discard(uid)
+        logger.info(f"[{uid}] {reason}; starting the download.")
+        data.pop("live_wait", None)
+        scheduler.submit(uid)
+
+    def _apply(self, uid: str, result: Optional[Dict[str, Any]], now: float):
+        data = tasks.get(uid)
+        if data is None or uid not in self.watching:
+            return
+        wait = data["live_wait"]
+        wait["checks"] += 1
+        wait["lastCheck"] = now
+        if result is None:
+            wait["failures"] += 1
+            live_checks.labels("failed").inc()
+            if self.max_failures and wait["failures"] >= self.max_failures:
+                self._release(uid, data, f"Live status could not be checked {wait['failures']} times")
+                return
+        else:
+            wait["failures"] = 0
+            live_checks.labels("ok").inc()
+            if result["liveStatus"] != UPCOMING:
+                self._release(uid, data, f"Stream status is {result['liveStatus']}")
+                return
+            unchanged = result["scheduledStart"] == wait["scheduledStart"] and wait["liveStatus"] == UPCOMING
+            if not unchanged:
+                wait["unchanged"] = 0
+            elif wait["unchanged"] < MAX_BACKOFF_STEPS and self.min_interval * 2 ** wait["unchanged"] < self.max_interval:
+                # Stops counting once the backoff reached max_interval, so it never outgrows a float.
+                wait["unchanged"] += 1
+            wait["liveStatus"] = result["liveStatus"]
+            wait["scheduledStart"] = result["scheduledStart"]
+        wait["nextCheck"] = now + self._interval(wait, now)
+        touch(data)
+
+    def _due(self, now: float) -> List[str]:
+        """Watched tasks to check now; those due within the jitter window join the batch."""
+        window = now + self.min_interval * self.jitter
+        due = [uid for uid in self.watching if uid in tasks and tasks[uid]["live_wait"]["nextCheck"] <= window]
+        due.sort(key=lambda uid: tasks[uid]["live_wait"]["nextCheck"])
+        return due
+
+    async def check_due(self):
+        """Checks every due video, one probe call per batch."""
+        due = self._due(time.time())
+        for start in range(0, len(due), self.batch_size):
+            batch = due[start:start + self.batch_size]
+            ids = {tasks[uid]["live_wait"]["videoId"] for uid in batch if uid in tasks}
+            try:
+                results = await self.probe.check(sorted(ids))
+            except Exception:
+                logger.exception(f"Live status check of {len(ids)} videos failed.")
+                results = {}
+            now = time.time()
+            for uid in batch:
+                if uid in tasks:
+                    self._apply(uid, results.get(tasks[uid]["live_wait"]["videoId"]), now)
+
+    async def _watch_loop(self):
+        while True:
+            # Due checks run on every pass, so a steady stream of new tasks waking the loop cannot postpone them.
+            self._wakeup.clear()
+            self.watching.intersection_update(tasks)
+            try:
+                await self.check_due()
+            except Exception:
+                logger.exception("Live watcher check failed.")
+
+            self.watching.intersection_update(tasks)
+            if self.watching:
+                next_check = min(tasks[uid]["live_wait"]["nextCheck"] for uid in self.watching)
+                timeout = max(0.0, next_check - time.time())
+            else:
+                timeout = None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self.enabled:
+            self._loop_task = asyncio.create_task(self._watch_loop())
+
+    def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+
+live_watcher = LiveWatcher(PROBES[LIVE_PROBE]() if LIVE_PROBE in PROBES else None)
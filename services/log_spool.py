@@ -0,0 +1,137 @@
+import os
+import shutil
+import asyncio
+import logging
+import aiofiles
+
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from config.config import LOG_DIR, LOG_FLUSH_INTERVAL
+
+logger = logging.getLogger("app")
+
+
+class LogSpool:
+    """
+    Appends the full output of every task to `<LOG_DIR>/<uid>.log`.
+
+    Writers only append to an in-memory buffer; a background loop flushes all
+    buffers every LOG_FLUSH_INTERVAL seconds, so the stream readers never wait
+    on disk I/O.
+    """
+
+    def __init__(self, directory: str = LOG_DIR, interval: float = LOG_FLUSH_INTERVAL):
+        self.directory = Path(directory) if directory else None
+        self.interval = interval
+        self._pending: Dict[str, List[str]] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def path(self, uid: str) -> Optional[Path]:
+        if not self.enabled:
+            return None
+        return self.directory / f"{uid.replace('/', '_')}.log"
+
+    def writer(self, uid: str) -> Optional[Callable[[str], None]]:
+        """Returns a callable that spools one line of output for `uid`."""
+        if not self.enabled:
+            return None
+
+        def write(line: str):
+            buffer = self._pending.get(uid)
+            if buffer is None:
+                buffer = self._pending[uid] = []
+            buffer.append(line)
+
+        return write
+
+    async def flush(self, uid: Optional[str] = None):
+        """Writes buffered lines to disk, for one task or all of them."""
+        async with self._lock:
+            if uid is None:
+                pending, self._pending = self._pending, {}
+            elif uid in self._pending:
+                pending = {uid: self._pending.pop(uid)}
+            else:
+                return
+
+            for task_uid, lines in pending.items():
+                try:
+                    async with aiofiles.open(self.path(task_uid), "a", encoding="utf-8") as f:
+                        await f.write("\n".join(lines) + "\n")
+                except OSError:
+                    logger.exception(f"[{task_uid}] Failed to write task log.")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def start(self):
+        if not self.enabled:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._loop_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+        await self.flush()
+
+    async def rename(self, old: str, new: str):
+        """Moves a task's buffered lines and log file to a new ID."""
+        if not self.enabled:
+            return
+        async with self._lock:
+            lines = self._pending.pop(old, None)
+            if lines:
+                self._pending.setdefault(new, [])[:0] = lines
+            try:
+                os.replace(self.path(old), self.path(new))
+            except FileNotFoundError:
+                pass
+
+    async def copy(self, source: str, dest: str):
+        """Copies a task's log so far to another task's log file."""
+        if not self.enabled:
+            return
+        await self.flush(source)
+        try:
+            await asyncio.to_thread(shutil.copyfile, self.path(source), self.path(dest))
+        except FileNotFoundError:
+            pass
+
+    def size(self, uid: str) -> int:
+        path = self.path(uid)
+        try:
+            return path.stat().st_size if path else 0
+        except FileNotFoundError:
+            return 0
+
+    async def read(self, uid: str, offset: int, limit: int) -> Tuple[bytes, int]:
+        """Returns up to `limit` bytes of a task's log starting at `offset`, and the total log size."""
+        await self.flush(uid)
+        size = self.size(uid)
+        if offset >= size:
+            return b"", size
+        async with aiofiles.open(self.path(uid), "rb") as f:
+            await f.seek(offset)
+            return await f.read(limit), size
+
+    def remove(self, uid: str):
+        """Drops a task's buffered lines and deletes its log file."""
+        self._pending.pop(uid, None)
+        path = self.path(uid)
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+log_spool = LogSpool()
@@ -0,0 +1,209 @@
+import time
+import asyncio
+import logging
+
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger("app")
+
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+DURATION_BUCKETS = (10, 60, 300, 900, 3600, 4 * 3600, 12 * 3600, 24 * 3600)
+
+BINARIES = ("ytarchive", "ytdlp")
+STREAMS = ("STDOUT", "STDERR")
+
+
+def _escape(value: str) -> str:
+    """Escapes a label value as the Prometheus text format requires; task IDs come straight from requests."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """A monotonically increasing value."""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Histogram:
+    """Cumulative histogram over fixed bucket bounds; observing never allocates."""
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Family:
+    """A named metric with one pre-created child per label combination."""
+
+    def __init__(self, name: str, help: str, kind: str, label_names: Sequence[str] = (),
+                 label_values: Iterable[Tuple[str, ...]] = ((),), buckets: Sequence[float] = ()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.buckets = buckets
+        self.children: Dict[Tuple[str, ...], object] = {}
+        for values in label_values:
+            self.labels(*values)
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            child = Histogram(self.buckets) if self.kind == "histogram" else Counter()
+            self.children[values] = child
+        return child
+
+    def render(self, out: List[str]):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        for values, child in self.children.items():
+            if isinstance(child, Histogram):
+                cumulative = 0
+                bounds = [repr(bound) for bound in child.bounds] + ["+Inf"]
+                for bound, count in zip(bounds, child.counts):
+                    cumulative += count
+                    labels = _labels(self.label_names + ("le",), values + (bound,))
+                    out.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _labels(self.label_names, values)
+                out.append(f"{self.name}_sum{labels} {child.sum}")
+                out.append(f"{self.name}_count{labels} {child.count}")
+            else:
+                out.append(f"{self.name}{_labels(self.label_names, values)} {child.value}")
+
+
+class Collected:
+    """A metric whose samples are read from application state when /metrics is scraped."""
+
+    def __init__(self, name: str, help: str, kind: str, label_names: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.collect = collect
+
+    def render(self, out: List[str]):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        for values, value in self.collect():
+            out.append(f"{self.name}{_labels(self.label_names, values)} {value}")
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[object] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        out: List[str] = []
+        for metric in self.metrics:
+            try:
+                metric.render(out)
+            except Exception:
+                logger.exception(f"Failed to render metric {metric.name}.")
+        out.append("")
+        return "\n".join(out)
+
+
+registry = Registry()
+
+lines_processed = registry.register(Family(
+    "ytarchive_ui_lines_processed_total", "Output lines processed, by stream.", "counter",
+    ("stream",), [(stream,) for stream in STREAMS],
+))
+redraws_dropped = registry.register(Family(
+    "ytarchive_ui_redraws_dropped_total", "Carriage-return progress redraws dropped by the stream reader.", "counter",
+)).labels()
+progress_coalesced = registry.register(Family(
+    "ytarchive_ui_progress_coalesced_total", "Progress lines superseded before being applied to task state.", "counter",
+)).labels()
+line_seconds = registry.register(Family(
+    "ytarchive_ui_process_line_seconds", "Time spent handling a single output line.", "histogram",
+    buckets=LATENCY_BUCKETS,
+)).labels()
+status_seconds = registry.register(Family(
+    "ytarchive_ui_status_seconds", "Time to build and serialize a /status response.", "histogram",
+    buckets=LATENCY_BUCKETS,
+)).labels()
+status_bytes = registry.register(Family(
+    "ytarchive_ui_status_bytes", "Size of /status response bodies.", "histogram",
+    buckets=SIZE_BUCKETS,
+)).labels()
+loop_lag_seconds = registry.register(Family(
+    "ytarchive_ui_event_loop_lag_seconds", "How late the event loop woke up a periodic probe.", "histogram",
+    buckets=LATENCY_BUCKETS,
+)).labels()
+task_duration_seconds = registry.register(Family(
+    "ytarchive_ui_task_duration_seconds", "Duration of finished downloads, by binary and outcome.", "histogram",
+    ("binary", "outcome"), [(binary, outcome) for binary in BINARIES for outcome in ("done", "error")],
+    buckets=DURATION_BUCKETS,
+))
+live_checks = registry.register(Family(
+    "ytarchive_ui_live_checks_total", "Live status checks of watched videos, by outcome.", "counter",
+    ("outcome",), [("ok",), ("failed",)],
+))
+callback_duration_seconds = registry.register(Family(
+    "ytarchive_ui_callback_duration_seconds", "Duration of post-download callbacks, by outcome.", "histogram",
+    ("outcome",), [("done",), ("failed",), ("timeout",)],
+    buckets=DURATION_BUCKETS,
+))
+
+
+async def monitor_event_loop(interval: float = 0.5):
+    """Measures how much later than requested the event loop resumes a sleeping task."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag_seconds.observe(max(0.0, loop.time() - start - interval))
+
+
+class StatusMetricsMiddleware:
+    """ASGI middleware recording latency and body size of GET /status responses."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != "/status":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal size
+            if message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+                if not message.get("more_body", False):
+                    status_seconds.observe(time.perf_counter() - start)
+                    status_bytes.observe(size)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
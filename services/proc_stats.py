@@ -0,0 +1,112 @@
+import os
+
+from collections import deque
+from typing import Any, Dict, Iterable, Optional, Tuple
+from config.config import RESOURCE_HISTORY
+
+PROC = "/proc"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Totals of one process group: (CPU ticks, RSS pages, bytes read, bytes written, processes).
+GroupTotals = Tuple[int, int, int, int, int]
+
+
+def _read_stat(pid: str) -> Optional[Tuple[int, int, int]]:
+    """Returns (process group, CPU ticks including reaped children, RSS pages) from /proc/<pid>/stat."""
+    try:
+        with open(f"{PROC}/{pid}/stat", "rb") as f:
+            raw = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces and parentheses; the fields after it start at the last ")".
+    fields = raw[raw.rindex(b")") + 2:].split()
+    cpu = int(fields[11]) + int(fields[12]) + int(fields[13]) + int(fields[14])
+    return int(fields[2]), cpu, int(fields[21])
+
+
+def _read_io(pid: str) -> Tuple[int, int]:
+    """Returns the bytes a process (and its reaped children) read from and wrote to storage."""
+    read = write = 0
+    try:
+        with open(f"{PROC}/{pid}/io", "rb") as f:
+            for line in f:
+                if line.startswith(b"read_bytes:"):
+                    read = int(line[11:])
+                elif line.startswith(b"write_bytes:"):
+                    write = int(line[12:])
+    except OSError:
+        pass
+    return read, write
+
+
+def scan(groups: Iterable[int]) -> Dict[int, GroupTotals]:
+    """
+    Reads /proc once and sums CPU, RSS and I/O over the processes of each of
+    the given process groups. Runs on a worker thread.
+    """
+    wanted = set(groups)
+    totals: Dict[int, list] = {}
+    with os.scandir(PROC) as entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            stat = _read_stat(entry.name)
+            if stat is None or stat[0] not in wanted:
+                continue
+            group, cpu, rss = stat
+            read, write = _read_io(entry.name)
+            total = totals.setdefault(group, [0, 0, 0, 0, 0])
+            total[0] += cpu
+            total[1] += rss
+            total[2] += read
+            total[3] += write
+            total[4] += 1
+    return {group: tuple(total) for group, total in totals.items()}
+
+
+class ResourceSeries:
+    """Rolling resource samples of one task's process tree, oldest first, in a fixed-size ring."""
+    __slots__ = ("samples", "read_bytes", "write_bytes", "_last")
+
+    FIELDS = ("time", "cpuPercent", "rssBytes", "readRate", "writeRate", "children")
+
+    def __init__(self, size: int = RESOURCE_HISTORY):
+        self.samples: deque = deque(maxlen=max(1, size))
+        self.read_bytes = 0
+        self.write_bytes = 0
+        self._last: Optional[Tuple[float, int, int, int]] = None
+
+    def add(self, now: float, totals: GroupTotals):
+        """Records a sample from the group totals; rates need two samples, so the first one only sets the baseline."""
+        cpu, rss_pages, read, write, processes = totals
+        last = self._last
+        self._last = (now, cpu, read, write)
+        # Exited processes take their counters with them unless reaped by one still in the group.
+        self.read_bytes = max(self.read_bytes, read)
+        self.write_bytes = max(self.write_bytes, write)
+        if last is None or now <= last[0]:
+            return
+        elapsed = now - last[0]
+        self.samples.append((
+            now,
+            round(max(0, cpu - last[1]) / CLOCK_TICKS / elapsed * 100, 1),
+            rss_pages * PAGE_SIZE,
+            int(max(0, read - last[2]) / elapsed),
+            int(max(0, write - last[3]) / elapsed),
+            processes - 1,
+        ))
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """The newest sample and the I/O totals, for the status API."""
+        if not self.samples:
+            return None
+        return {
+            **dict(zip(self.FIELDS, self.samples[-1])),
+            "readBytes": self.read_bytes,
+            "writeBytes": self.write_bytes,
+        }
+
+    def as_dict(self) -> Dict[str, list]:
+        """All samples as one list per field."""
+        return {name: [sample[i] for sample in self.samples] for i, name in enumerate(self.FIELDS)}
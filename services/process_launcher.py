@@ -0,0 +1,132 @@
+import os
+import shutil
+import signal
+import asyncio
+import logging
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from config.config import PROCESS_IO_CLASS, PROCESS_IO_LEVEL, PROCESS_NICE, PROCESS_RLIMITS
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger("app")
+
+# Each download runs in its own session (and so its own process group) where supported.
+USE_PROCESS_GROUPS = os.name == "posix"
+
+IO_CLASSES = {"realtime": "1", "best-effort": "2", "idle": "3"}
+
+RLIMITS = {
+    name: getattr(resource, constant)
+    for name, constant in (
+        ("as", "RLIMIT_AS"), ("core", "RLIMIT_CORE"), ("cpu", "RLIMIT_CPU"),
+        ("fsize", "RLIMIT_FSIZE"), ("nofile", "RLIMIT_NOFILE"), ("nproc", "RLIMIT_NPROC"),
+    )
+    if resource is not None and hasattr(resource, constant)
+}
+
+
+def process_settings(
+    nice: Optional[int] = None,
+    io_class: Optional[str] = None,
+    io_level: Optional[int] = None,
+    rlimits: Optional[Dict[str, int]] = None,
+) -> Dict[str, Any]:
+    """Merges per-task scheduling settings over the deployment defaults."""
+    return {
+        "nice": PROCESS_NICE if nice is None else nice,
+        "io_class": io_class or PROCESS_IO_CLASS or None,
+        "io_level": PROCESS_IO_LEVEL if io_level is None else io_level,
+        "rlimits": {**PROCESS_RLIMITS, **(rlimits or {})},
+    }
+
+
+def _priority_prefix(settings: Dict[str, Any]) -> Tuple[List[str], bool]:
+    """
+    Returns `prlimit`/`ionice`/`nice` wrappers for the requested limits and
+    priorities, and whether the resource limits are covered by them. Each
+    wrapper execs the next program in place, so the process keeps its PID and
+    no shell is involved.
+    """
+    prefix: List[str] = []
+    rlimits = {name: value for name, value in settings.get("rlimits", {}).items() if name in RLIMITS}
+    prlimit = shutil.which("prlimit") if rlimits else None
+    if prlimit:
+        prefix += [prlimit] + [f"--{name}={value}:{value}" for name, value in rlimits.items()] + ["--"]
+    io_class = settings.get("io_class")
+    if io_class:
+        ionice = shutil.which("ionice")
+        if ionice:
+            prefix += [ionice, "-c", IO_CLASSES[io_class]]
+            if io_class != "idle" and settings.get("io_level") is not None:
+                prefix += ["-n", str(settings["io_level"])]
+        else:
+            logger.warning("ionice is not available; I/O priority is not applied.")
+    if settings.get("nice"):
+        nice = shutil.which("nice")
+        if nice:
+            prefix += [nice, "-n", str(settings["nice"])]
+        else:
+            logger.warning("nice is not available; CPU priority is not applied.")
+    return prefix, prlimit is not None
+
+
+def _apply_rlimits(pid: int, rlimits: Dict[str, int]):
+    """Sets resource limits on a running process; its children inherit them."""
+    for name, value in rlimits.items():
+        if name not in RLIMITS or not hasattr(resource, "prlimit"):
+            logger.warning(f"Resource limit '{name}' is not supported here and is ignored.")
+            continue
+        try:
+            resource.prlimit(pid, RLIMITS[name], (value, value))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not set resource limit {name}={value} on process {pid}: {e}")
+
+
+async def launch(argv: Sequence[str], settings: Optional[Dict[str, Any]] = None, **kwargs) -> asyncio.subprocess.Process:
+    """
+    Starts `argv` without a shell, in a new process group, with the given
+    nice/ionice priorities and resource limits.
+    """
+    settings = settings or {}
+    prefix, limited = _priority_prefix(settings)
+    process = await asyncio.create_subprocess_exec(
+        *prefix, *argv,
+        start_new_session=USE_PROCESS_GROUPS,
+        **kwargs,
+    )
+    if settings.get("rlimits") and not limited:
+        # Without the prlimit tool the limits are set right after the start instead.
+        _apply_rlimits(process.pid, settings["rlimits"])
+    return process
+
+
+def signal_tree(process: asyncio.subprocess.Process, sig: int):
+    """Sends a signal to the process and everything in its process group."""
+    if USE_PROCESS_GROUPS:
+        try:
+            os.killpg(process.pid, sig)
+            return
+        except ProcessLookupError:
+            return
+        except OSError:
+            logger.exception(f"Could not signal process group {process.pid}, signalling the process only.")
+    process.send_signal(sig)
+
+
+async def terminate_tree(process: asyncio.subprocess.Process, timeout: float = 5) -> bool:
+    """
+    Terminates a process together with its children (e.g. ffmpeg), killing the
+    group if it does not exit within `timeout` seconds. Returns False if it had to be killed.
+    """
+    signal_tree(process, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(process.wait(), timeout=timeout)
+        return True
+    except asyncio.TimeoutError:
+        signal_tree(process, signal.SIGKILL if hasattr(signal, "SIGKILL") else signal.SIGTERM)
+        await process.wait()
+        return False
@@ -0,0 +1,244 @@
+import re
+import time
+import asyncio
+
+from typing import Callable, Dict, Optional
+from config.config import PROGRESS_UPDATE_RATE
+from services.metrics import progress_coalesced
+
+_UNITS = {
+    "B": 1,
+    "KB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3, "TB": 1000 ** 4,
+    "KIB": 1024, "MIB": 1024 ** 2, "GIB": 1024 ** 3, "TIB": 1024 ** 4,
+}
+
+# Minimum interval between two samples used to derive ytarchive's download speed.
+SPEED_SAMPLE_SECONDS = 2.0
+
+_SIZE = r"[\d.]+\s*[KMGT]?i?B"
+
+YTDLP_PROGRESS_RE = re.compile(
+    rf"\[download\]\s+(?P<percent>[\d.]+)%"
+    rf"(?:\s+of\s+~?\s*(?P<total>{_SIZE}))?"
+    rf"(?:\s+in\s+[\d:]+)?"
+    rf"(?:\s+at\s+(?P<speed>{_SIZE})/s)?"
+    rf"(?:\s+ETA\s+(?P<eta>[\d:]+))?"
+    rf"(?:.*?\(frag\s+(?P<frag>\d+)/(?P<frags>\d+)\))?"
+)
+YTARCHIVE_FIELD_RE = re.compile(rf"(Video Fragments|Audio Fragments|Total Downloaded):\s*({_SIZE}|\d+)")
+
+_YTDLP_MARKERS = (" at ", "ETA", "%")
+_YTARCHIVE_MARKERS = ("Video Fragments:", "Audio Fragments:", "Total Downloaded:")
+
+
+def ytdlp_progress_key(line: str) -> Optional[str]:
+    """
+    Returns the slot key of a yt-dlp progress line (its `N: ` format prefix,
+    or "" without one), or None for any other line. Uses plain string checks only.
+    """
+    if line.startswith("[download]"):
+        key = ""
+    elif line[:1].isdigit():
+        head, sep, rest = line.partition(":")
+        body = rest.lstrip()
+        if not sep or not head.isdigit() or len(body) == len(rest) or not body.startswith("[download]"):
+            return None
+        key = line[:len(line) - len(body)]
+    else:
+        return None
+    tail = line[len(key) + 10:]
+    for marker in _YTDLP_MARKERS:
+        if marker in tail:
+            return key
+    return None
+
+
+def ytarchive_progress_key(line: str) -> Optional[str]:
+    """Returns "" for a ytarchive progress line and None for any other line."""
+    if "Fragments:" not in line and "Downloaded:" not in line:
+        return None
+    for marker in _YTARCHIVE_MARKERS:
+        if marker in line:
+            return ""
+    return None
+
+
+def progress_key(binary: str, line: str) -> Optional[str]:
+    """Classifies an output line: a progress slot key, or None for a regular line."""
+    if binary == "ytarchive":
+        return ytarchive_progress_key(line)
+    return ytdlp_progress_key(line)
+
+
+def parse_size(text: Optional[str]) -> Optional[int]:
+    """Converts a size such as '10.5MiB' to bytes."""
+    if not text:
+        return None
+    text = text.replace(" ", "")
+    number = text.rstrip("KMGTiB")
+    unit = text[len(number):].upper()
+    try:
+        return int(float(number) * _UNITS[unit])
+    except (KeyError, ValueError):
+        return None
+
+
+def parse_eta(text: Optional[str]) -> Optional[int]:
+    """Converts an ETA such as '01:02:03' to seconds."""
+    if not text:
+        return None
+    seconds = 0
+    for part in text.split(":"):
+        if not part.isdigit():
+            return None
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+class TaskProgress:
+    """Compact numeric progress of a single task, updated from its progress lines."""
+    __slots__ = (
+        "percent", "downloaded_bytes", "total_bytes", "speed", "eta",
+        "fragment", "fragment_count", "video_fragments", "audio_fragments", "updated_at",
+        "_sample_bytes", "_sample_time",
+    )
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+    def update_ytdlp(self, line: str) -> bool:
+        match = YTDLP_PROGRESS_RE.search(line)
+        if not match:
+            return False
+        self.percent = float(match.group("percent"))
+        total = parse_size(match.group("total"))
+        if total is not None:
+            self.total_bytes = total
+            self.downloaded_bytes = int(total * self.percent / 100)
+        self.speed = parse_size(match.group("speed"))
+        self.eta = parse_eta(match.group("eta"))
+        if match.group("frag"):
+            self.fragment = int(match.group("frag"))
+            self.fragment_count = int(match.group("frags"))
+        self.updated_at = time.time()
+        return True
+
+    def update_ytarchive(self, line: str) -> bool:
+        found = False
+        for name, value in YTARCHIVE_FIELD_RE.findall(line):
+            found = True
+            if name == "Video Fragments":
+                self.video_fragments = int(value)
+            elif name == "Audio Fragments":
+                self.audio_fragments = int(value)
+            else:
+                self.downloaded_bytes = parse_size(value)
+                self._sample_speed()
+        if found:
+            self.updated_at = time.time()
+        return found
+
+    def _sample_speed(self):
+        """Derives the speed from the downloaded total, since ytarchive does not print one."""
+        now = time.time()
+        if self.downloaded_bytes is None:
+            return
+        if self._sample_time is None:
+            self._sample_bytes, self._sample_time = self.downloaded_bytes, now
+            return
+        elapsed = now - self._sample_time
+        if elapsed >= SPEED_SAMPLE_SECONDS:
+            self.speed = int(max(0, self.downloaded_bytes - self._sample_bytes) / elapsed)
+            self._sample_bytes, self._sample_time = self.downloaded_bytes, now
+
+    def update(self, binary: str, line: str) -> bool:
+        """Parses a progress line of the given binary. Returns True if anything changed."""
+        if binary == "ytarchive":
+            return self.update_ytarchive(line)
+        return self.update_ytdlp(line)
+
+    def as_dict(self) -> Optional[Dict[str, Optional[float]]]:
+        """Returns the fields for the status API, or None if no progress was seen yet."""
+        if self.updated_at is None:
+            return None
+        return {
+            "percent": self.percent,
+            "downloadedBytes": self.downloaded_bytes,
+            "totalBytes": self.total_bytes,
+            "speed": self.speed,
+            "eta": self.eta,
+            "fragment": self.fragment,
+            "fragmentCount": self.fragment_count,
+            "videoFragments": self.video_fragments,
+            "audioFragments": self.audio_fragments,
+            "updatedAt": self.updated_at,
+        }
+
+
+class ProgressCoalescer:
+    """
+    Limits how often progress lines reach the task state.
+
+    Each slot is applied at most `rate` times per second. A line arriving
+    sooner is held as the slot's pending line, replacing (and counting) any
+    line already held, and applied by a timer once the slot is due. `flush()`
+    applies everything held right away; call it before a regular line is
+    logged so output order is kept.
+    """
+    __slots__ = ("interval", "apply", "coalesced", "_last", "_pending", "_timer")
+
+    def __init__(self, apply: Callable[[str, str], None], rate: float = PROGRESS_UPDATE_RATE):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self.apply = apply
+        self.coalesced = 0
+        self._last: Dict[str, float] = {}
+        self._pending: Dict[str, str] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def offer(self, key: str, line: str):
+        """Applies a progress line now, or holds it until its slot is due."""
+        if key in self._pending:
+            self._pending[key] = line
+            self.coalesced += 1
+            progress_coalesced.inc()
+            return
+        now = time.monotonic()
+        last = self._last.get(key)
+        if last is None or now - last >= self.interval:
+            self._last[key] = now
+            self.apply(key, line)
+            return
+        self._pending[key] = line
+        if self._timer is None:
+            self._schedule(now)
+
+    def _schedule(self, now: float):
+        due = min(self._last[key] for key in self._pending) + self.interval
+        self._timer = asyncio.get_running_loop().call_later(max(0.0, due - now), self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        now = time.monotonic()
+        for key in [key for key in self._pending if now - self._last[key] >= self.interval]:
+            self._last[key] = now
+            self.apply(key, self._pending.pop(key))
+        if self._pending:
+            self._schedule(now)
+
+    def flush(self):
+        """Applies all held lines immediately."""
+        if not self._pending:
+            return
+        now = time.monotonic()
+        pending, self._pending = self._pending, {}
+        for key, line in pending.items():
+            self._last[key] = now
+            self.apply(key, line)
+
+    def close(self):
+        """Flushes and stops the timer; call once the task's output has ended."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.flush()
@@ -0,0 +1,80 @@
+import os
+import time
+import asyncio
+import logging
+
+from typing import Any, Dict, Optional
+from config.config import RESOURCE_HISTORY, RESOURCE_SAMPLE_INTERVAL
+from config.dependencies import tasks
+from services.proc_stats import PROC, ResourceSeries, scan
+from services.task_state import touch
+
+logger = logging.getLogger("app")
+
+
+class ResourceSampler:
+    """
+    Samples CPU, memory and I/O of every running download every
+    RESOURCE_SAMPLE_INTERVAL seconds.
+
+    Each download runs in its own process group, so one pass over /proc
+    (on a worker thread) finds every process of every task, including the
+    ffmpeg children. Each tick adds one sample per running task to a ring of
+    RESOURCE_HISTORY samples, so the cost does not grow with a task's age.
+    """
+
+    def __init__(self, interval: float = RESOURCE_SAMPLE_INTERVAL, history: int = RESOURCE_HISTORY):
+        self.interval = interval
+        self.history = history
+        self._loop_task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0 and os.path.isdir(PROC)
+
+    @staticmethod
+    def _running() -> Dict[int, Dict[str, Any]]:
+        running = {}
+        for data in tasks.values():
+            process = data.get("process")
+            if process is not None and process.returncode is None:
+                running[process.pid] = data
+        return running
+
+    async def sample(self):
+        """Takes one sample of every running task."""
+        running = self._running()
+        if not running:
+            return
+        totals = await asyncio.get_running_loop().run_in_executor(None, scan, list(running))
+        now = time.time()
+        for group, data in running.items():
+            if group not in totals:
+                continue
+            series = data.get("resources")
+            if series is None:
+                series = data["resources"] = ResourceSeries(self.history)
+            series.add(now, totals[group])
+            touch(data)
+
+    async def _sample_loop(self):
+        while True:
+            try:
+                await self.sample()
+            except Exception:
+                logger.exception("Failed to sample task resources.")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.enabled:
+            self._loop_task = asyncio.create_task(self._sample_loop())
+        elif self.interval > 0:
+            logger.info(f"{PROC} is not available; task resources are not sampled.")
+
+    def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+
+resource_sampler = ResourceSampler()
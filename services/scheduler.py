@@ -0,0 +1,173 @@
+import time
+import asyncio
+import logging
+
+from typing import Dict, List, Optional
+from config.config import DISK_RECHECK_INTERVAL, MAX_CONCURRENT_DOWNLOADS, MAX_CONCURRENT_PER_BINARY
+from config.dependencies import tasks
+from services.storage import storage
+from services.task_runner import run_download
+from services.task_state import touch
+
+logger = logging.getLogger("app")
+
+
+class DownloadScheduler:
+    """
+    Sits between the routers and `run_download`, starting tasks only while the
+    global and per-binary concurrency limits allow it.
+
+    Waiting tasks are kept in a single queue ordered by priority (higher first)
+    and FIFO within a priority. A task blocked by its binary's limit, or
+    waiting for disk space, does not hold back the tasks behind it.
+    """
+
+    def __init__(self, max_total: int = MAX_CONCURRENT_DOWNLOADS, max_per_binary: Optional[Dict[str, int]] = None):
+        self.max_total = max_total
+        self.max_per_binary = dict(MAX_CONCURRENT_PER_BINARY if max_per_binary is None else max_per_binary)
+        self.queue: List[str] = []
+        # uid -> position in `queue`, so /status can look positions up without scanning the queue.
+        self._index: Dict[str, int] = {}
+        self.running: Dict[str, int] = {}
+        self._recheck: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def running_total(self) -> int:
+        return sum(self.running.values())
+
+    def _has_slot(self, binary: str) -> bool:
+        if self.max_total and self.running_total >= self.max_total:
+            return False
+        limit = self.max_per_binary.get(binary, 0)
+        return not limit or self.running.get(binary, 0) < limit
+
+    def _reindex(self, start: int = 0):
+        """Refreshes the positions of queued tasks from `start` on, bumping the version of those that moved."""
+        for index in range(start, len(self.queue)):
+            uid = self.queue[index]
+            if self._index.get(uid) != index:
+                self._index[uid] = index
+                touch(tasks[uid])
+
+    def _insert(self, uid: str) -> int:
+        """Adds a task to the queue behind those of equal or higher priority. Returns its position."""
+        data = tasks[uid]
+        data["queued_at"] = time.time()
+        priority = data.get("priority", 0)
+
+        index = len(self.queue)
+        while index > 0 and tasks[self.queue[index - 1]].get("priority", 0) < priority:
+            index -= 1
+        self.queue.insert(index, uid)
+        return index
+
+    def submit(self, uid: str):
+        """Queues a task and starts it right away if a slot is free."""
+        self._reindex(self._insert(uid))
+        self._dispatch()
+
+    def submit_many(self, uids: List[str]):
+        """Queues several tasks at once, then starts as many as the limits allow."""
+        if not uids:
+            return
+        first = min(self._insert(uid) for uid in uids)
+        self._reindex(first)
+        self._dispatch()
+
+    def position(self, uid: str) -> Optional[int]:
+        """Returns the 0-based queue position of a waiting task, or None."""
+        return self._index.get(uid)
+
+    def is_queued(self, uid: str) -> bool:
+        return uid in self._index
+
+    def cancel(self, uid: str) -> bool:
+        """Removes a waiting task from the queue. Running tasks are not affected."""
+        index = self.position(uid)
+        if index is None:
+            return False
+        self.queue.pop(index)
+        del self._index[uid]
+        self._reindex(index)
+        logger.info(f"[{uid}] Removed from download queue.")
+        return True
+
+    def rename(self, old: str, new: str) -> bool:
+        """Keeps a waiting task's queue position under a new ID."""
+        index = self.position(old)
+        if index is None:
+            return False
+        self.queue[index] = new
+        self._index[new] = self._index.pop(old)
+        return True
+
+    def move(self, uid: str, position: int) -> bool:
+        """Moves a waiting task to a new queue position. Running tasks are not affected."""
+        index = self.position(uid)
+        if index is None:
+            return False
+        self.queue.pop(index)
+        position = max(0, min(position, len(self.queue)))
+        self.queue.insert(position, uid)
+        self._reindex(min(index, position))
+        self._dispatch()
+        return True
+
+    def _admit(self, uid: str, data: dict) -> bool:
+        """Runs the disk admission check, recording why the task waits if it does not pass."""
+        reason = storage.admit(data)
+        if reason != data.get("disk_wait"):
+            if reason:
+                logger.warning(f"[{uid}] {reason}")
+            data["disk_wait"] = reason
+            touch(data)
+        return reason is None
+
+    def _dispatch(self):
+        index = 0
+        first_started: Optional[int] = None
+        waiting_for_disk = False
+        while index < len(self.queue):
+            if self.max_total and self.running_total >= self.max_total:
+                break
+            uid = self.queue[index]
+            data = tasks[uid]
+            if not self._has_slot(data["binary"]):
+                index += 1
+                continue
+            if not self._admit(uid, data):
+                waiting_for_disk = True
+                index += 1
+                continue
+
+            self.queue.pop(index)
+            del self._index[uid]
+            if first_started is None:
+                first_started = index
+            binary = data["binary"]
+            self.running[binary] = self.running.get(binary, 0) + 1
+            data["wait_time"] = time.time() - data["queued_at"]
+            touch(data)
+            data["task"] = asyncio.create_task(self._run(uid, binary))
+
+        if first_started is not None:
+            # Positions are refreshed once per pass, however many tasks started.
+            self._reindex(first_started)
+
+        if waiting_for_disk and self._recheck is None:
+            # Space is freed outside the scheduler's view (moves, deletions), so look again later.
+            self._recheck = asyncio.get_running_loop().call_later(DISK_RECHECK_INTERVAL, self._on_recheck)
+
+    def _on_recheck(self):
+        self._recheck = None
+        self._dispatch()
+
+    async def _run(self, uid: str, binary: str):
+        try:
+            await run_download(uid)
+        finally:
+            self.running[binary] -= 1
+            self._dispatch()
+
+
+scheduler = DownloadScheduler()
@@ -0,0 +1,254 @@
+import os
+import time
+import errno
+import shutil
+import asyncio
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from config.config import (
+    DISK_ADMISSION, DISK_ESTIMATE_LIVE, DISK_ESTIMATE_VOD, DISK_RESERVE, DOWNLOAD_DIR,
+    MOVE_REPORT_INTERVAL, MOVE_WORKERS, STAGING_DIR,
+)
+from config.dependencies import tasks
+from services.bandwidth import is_live
+from services.task_state import touch
+
+logger = logging.getLogger("app")
+
+# Bytes copied per copy_file_range/read call while moving a file between filesystems.
+MOVE_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Files of a download that are still being written, never moved as sidecars.
+_TEMP_SUFFIXES = (".part", ".ytdl", ".moving")
+
+# copy_file_range errors that mean "not possible between these files", as opposed to a failed copy.
+_NO_COPY_RANGE = {errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL, errno.EBADF}
+
+
+def work_dir() -> str:
+    """Directory tasks write to: the staging directory if one is set, else the download directory."""
+    return STAGING_DIR or DOWNLOAD_DIR
+
+
+def _copy_file(src: Path, dest: Path, report: Dict[str, Any]):
+    """
+    Copies `src` to `dest` through a temporary name, in kernel space with
+    copy_file_range where the filesystems allow it. Runs on a worker thread;
+    copied bytes are added to `report["bytes"]` as it goes, and the copy stops
+    once `report["cancelled"]` is set.
+    """
+    tmp = dest.with_name(dest.name + ".moving")
+    with open(src, "rb") as fin, open(tmp, "wb") as fout:
+        in_fd, out_fd = fin.fileno(), fout.fileno()
+        use_copy_range = hasattr(os, "copy_file_range")
+        copied_total = 0
+        while True:
+            if report["cancelled"]:
+                raise InterruptedError("Move cancelled.")
+            if use_copy_range:
+                try:
+                    copied = os.copy_file_range(in_fd, out_fd, MOVE_CHUNK_SIZE)
+                except OSError as e:
+                    if e.errno not in _NO_COPY_RANGE or copied_total:
+                        raise
+                    use_copy_range = False
+                    continue
+            else:
+                chunk = fin.read(MOVE_CHUNK_SIZE)
+                copied = len(chunk)
+                if copied:
+                    fout.write(chunk)
+            if not copied:
+                break
+            copied_total += copied
+            report["bytes"] += copied
+        fout.flush()
+        os.fsync(out_fd)
+    shutil.copystat(src, tmp)
+    os.replace(tmp, dest)
+
+
+def _move_file(src: Path, dest: Path, report: Dict[str, Any]):
+    """Renames `src` to `dest`, or copies and deletes it when they are on different filesystems."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    size = src.stat().st_size
+    try:
+        os.rename(src, dest)
+        report["bytes"] += size
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    try:
+        _copy_file(src, dest, report)
+    except BaseException:
+        dest.with_name(dest.name + ".moving").unlink(missing_ok=True)
+        raise
+    os.remove(src)
+
+
+def _move_files(moves: List[Tuple[Path, Path]], report: Dict[str, Any]):
+    """Moves a task's files one after the other, stopping before the next one once the move is cancelled."""
+    for src, dest in moves:
+        if report["cancelled"]:
+            raise InterruptedError("Move cancelled.")
+        _move_file(src, dest, report)
+
+
+def _sidecars(path: Path) -> List[Path]:
+    """Files next to an output file that share its name up to the extension (thumbnail, description, .info.json)."""
+    prefix = path.stem + "."
+    return sorted(
+        entry for entry in path.parent.iterdir()
+        if entry != path and entry.name.startswith(prefix) and entry.is_file() and not entry.name.endswith(_TEMP_SUFFIXES)
+    )
+
+
+class Storage:
+    """
+    Optional staging of downloads on local scratch storage, and disk space
+    admission control.
+
+    With STAGING_DIR set, tasks download and merge there and their output
+    file, with the sidecar files named after it, is moved to DOWNLOAD_DIR
+    afterwards on a worker thread: a rename on the same filesystem, otherwise
+    a copy_file_range copy. Before the scheduler
+    starts a task, `admit` checks that the staging and download filesystems
+    have room for its estimated size on top of what running and moving tasks
+    are still expected to write.
+    """
+
+    def __init__(
+        self,
+        staging_dir: str = STAGING_DIR,
+        download_dir: str = DOWNLOAD_DIR,
+        admission: bool = DISK_ADMISSION,
+        reserve: int = DISK_RESERVE,
+        workers: int = MOVE_WORKERS,
+    ):
+        self.staging_dir = Path(staging_dir) if staging_dir else None
+        self.download_dir = Path(download_dir)
+        self.admission = admission
+        self.reserve = reserve
+        self._mover = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="mover")
+
+    @staticmethod
+    def estimate(data: Dict[str, Any]) -> int:
+        """Expected final size of a task: the size the binary reported, or a default for its kind."""
+        total = data["progress"].total_bytes
+        if total:
+            return total
+        return DISK_ESTIMATE_LIVE if is_live(data) else DISK_ESTIMATE_VOD
+
+    def _pending_writes(self) -> Tuple[int, int]:
+        """Bytes running tasks are still expected to write to the work directory, and moves to DOWNLOAD_DIR."""
+        work, moving = 0, 0
+        for data in tasks.values():
+            move = data.get("move")
+            if move and move["state"] == "moving":
+                moving += move["total"] - move["bytes"]
+                continue
+            if data["completed"] or (data.get("task") is None and data.get("process") is None):
+                continue
+            remaining = max(0, self.estimate(data) - (data["progress"].downloaded_bytes or 0))
+            work += remaining
+            if self.staging_dir is not None:
+                moving += remaining
+        return work, moving
+
+    @staticmethod
+    def _free(path: Path) -> Optional[Tuple[int, int]]:
+        """Returns (device, free bytes) of the filesystem holding `path`, or None if it cannot be checked."""
+        try:
+            stat = os.statvfs(path)
+            return os.stat(path).st_dev, stat.f_bavail * stat.f_frsize
+        except (OSError, AttributeError):
+            return None
+
+    def admit(self, data: Dict[str, Any]) -> Optional[str]:
+        """Returns None if a task may start, or why it has to wait for disk space."""
+        if not self.admission:
+            return None
+        work, moving = self._pending_writes()
+        size = self.estimate(data)
+        checks = [(Path(work_dir()), size + work)]
+        if self.staging_dir is not None:
+            staging, downloads = self._free(self.staging_dir), self._free(self.download_dir)
+            # On a single filesystem the move is a rename and needs no extra space.
+            if staging is None or downloads is None or staging[0] != downloads[0]:
+                checks.append((self.download_dir, size + moving))
+        for path, need in checks:
+            free = self._free(path)
+            if free is not None and free[1] - need < self.reserve:
+                return (
+                    f"Waiting for disk space on {path}: {need // 2 ** 20} MiB needed "
+                    f"(plus {self.reserve // 2 ** 20} MiB reserve), {free[1] // 2 ** 20} MiB free."
+                )
+        return None
+
+    def destination(self, path: Optional[str]) -> Optional[Path]:
+        """Where a file in the staging directory belongs in DOWNLOAD_DIR, or None for files outside it."""
+        if self.staging_dir is None or not path:
+            return None
+        try:
+            relative = Path(path).resolve().relative_to(self.staging_dir.resolve())
+        except ValueError:
+            return None
+        return self.download_dir / relative
+
+    async def move_to_downloads(self, uid: str, data: Dict[str, Any], path: Optional[str]) -> Optional[str]:
+        """
+        Moves a finished task's staged output file and its sidecar files to
+        DOWNLOAD_DIR and returns the output file's new path. Progress is kept
+        in `data["move"]`; if the move fails the file stays in the staging
+        directory and its path there is returned. When cancelled, the file
+        being copied is removed from DOWNLOAD_DIR before the error propagates.
+        """
+        dest = self.destination(path)
+        if dest is None or not os.path.isfile(path):
+            return path
+
+        moves = [(Path(path), dest)] + [(sidecar, dest.with_name(sidecar.name)) for sidecar in _sidecars(Path(path))]
+        total = sum(src.stat().st_size for src, _ in moves)
+        report = {"state": "moving", "bytes": 0, "total": total, "destination": str(dest), "error": None, "cancelled": False}
+        data["move"] = report
+        touch(data)
+        logger.info(f"[{uid}] Moving {path} and {len(moves) - 1} sidecar files to {dest.parent} ({total} bytes).")
+        started = time.monotonic()
+        future = asyncio.get_running_loop().run_in_executor(self._mover, _move_files, moves, report)
+        try:
+            while True:
+                done, _ = await asyncio.wait({future}, timeout=MOVE_REPORT_INTERVAL)
+                if done:
+                    break
+                touch(data)
+        except asyncio.CancelledError:
+            # The copy stops at its next chunk and removes its partial file; wait for that before giving up.
+            report["cancelled"] = True
+            await asyncio.wait({future})
+            future.exception()
+            logger.warning(f"[{uid}] Move to {dest.parent} cancelled.")
+            raise
+
+        try:
+            future.result()
+        except Exception as e:
+            report["state"] = "failed"
+            report["error"] = str(e)
+            touch(data)
+            logger.error(f"[{uid}] Could not move {path} to {dest}, it stays in the staging directory: {e}")
+            return path
+
+        report["state"] = "done"
+        touch(data)
+        logger.info(f"[{uid}] Moved to {dest} in {time.monotonic() - started:.1f}s.")
+        return str(dest)
+
+    def stop(self):
+        self._mover.shutdown(wait=False)
+
+
+storage = Storage()
@@ -0,0 +1,63 @@
+import re
+
+from typing import List, Tuple
+
+# Bytes requested from a subprocess pipe per read.
+STREAM_CHUNK_SIZE = 64 * 1024
+# A record growing past this without a terminator is emitted as is.
+RECORD_LIMIT = 64 * 1024
+
+_TERMINATOR_RE = re.compile(rb"\r\n|\r|\n")
+
+
+class RecordSplitter:
+    """
+    Splits a byte stream into records on `\\n`, `\\r\\n` and bare `\\r`.
+
+    Only complete records are decoded. A record ended by a bare `\\r` is a
+    terminal redraw: if another record follows it in the same chunk it would
+    have been overwritten on screen, so it is dropped (and counted) instead of
+    being passed on.
+    """
+    __slots__ = ("_pending", "dropped")
+
+    def __init__(self):
+        self._pending = b""
+        self.dropped = 0
+
+    def feed(self, chunk: bytes) -> List[str]:
+        """Returns the records completed by `chunk`, decoded and stripped."""
+        data = self._pending + chunk if self._pending else chunk
+        parts: List[Tuple[bytes, bool]] = []
+        start = 0
+        end = len(data)
+
+        for match in _TERMINATOR_RE.finditer(data):
+            # A trailing \r may be the first half of \r\n; decide once more data arrives.
+            if match.end() == end and match.group() == b"\r":
+                break
+            parts.append((data[start:match.start()], match.group() == b"\r"))
+            start = match.end()
+
+        self._pending = data[start:]
+        if len(self._pending) > RECORD_LIMIT:
+            parts.append((self._pending, False))
+            self._pending = b""
+
+        records = []
+        last = len(parts) - 1
+        for i, (raw, is_redraw) in enumerate(parts):
+            if is_redraw and i < last:
+                if raw.strip():
+                    self.dropped += 1
+                continue
+            line = raw.decode("utf-8", errors="replace").strip()
+            if line:
+                records.append(line)
+        return records
+
+    def flush(self) -> List[str]:
+        """Returns whatever is left once the stream has ended."""
+        line = self._pending.decode("utf-8", errors="replace").strip()
+        self._pending = b""
+        return [line] if line else []
@@ -0,0 +1,185 @@
+import time
+import zlib
+import asyncio
+import logging
+
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional
+from config.config import (
+    HISTORY_CACHE_SIZE, HISTORY_HOT_MAX, HISTORY_HOT_TTL, HISTORY_MAX_TASKS, HISTORY_SWEEP_INTERVAL,
+)
+from config.dependencies import tasks
+from services.log_spool import log_spool
+from services.task_state import record_removal, task_version
+
+logger = logging.getLogger("app")
+
+
+class ArchivedTask:
+    """A finished task in the cold tier: its summary fields plus its zlib-compressed log."""
+    __slots__ = (
+        "uid", "binary", "cmd", "callbacks", "priority", "status", "created_at", "finished_at", "wait_time",
+        "callback_state", "progress", "bandwidth", "output_path", "version", "log_blob",
+    )
+
+    def __init__(self, uid: str, data: Dict[str, Any], log_blob: bytes):
+        self.uid = uid
+        self.binary = data["binary"]
+        self.cmd = data["cmd"]
+        self.callbacks = list(data.get("callbacks") or [])
+        self.priority = data.get("priority", 0)
+        self.status = data["status"]
+        self.created_at = data.get("created_at")
+        self.finished_at = finished_at(data)
+        self.wait_time = data.get("wait_time")
+        self.callback_state = dict(data.get("callback_state") or {})
+        self.progress = data["progress"].as_dict()
+        self.bandwidth = data.get("bandwidth")
+        self.output_path = data.get("output_path")
+        self.version = task_version(data)
+        self.log_blob = log_blob
+
+
+def finished_at(data: Dict[str, Any]) -> float:
+    """When a task finished, falling back to its creation time for tasks restored without one."""
+    return data.get("finished_at") or data.get("created_at") or 0.0
+
+
+def _archivable(data: Dict[str, Any]) -> bool:
+    """A task can leave the hot tier once it has finished and its file move and callbacks are done."""
+    if not data["completed"]:
+        return False
+    for key in ("finalize_task", "callback_task"):
+        task = data.get(key)
+        if task is not None and not task.done():
+            return False
+    return True
+
+
+class TaskHistory:
+    """
+    Cold tier for finished tasks.
+
+    A periodic sweep moves finished tasks out of the `tasks` dict once they are
+    older than HISTORY_HOT_TTL or more than HISTORY_HOT_MAX of them are kept.
+    Only a summary and the zlib-compressed log are retained; logs are
+    decompressed on access and the most recently used ones are cached. To
+    incremental /status clients an archived task looks removed. Past
+    HISTORY_MAX_TASKS the oldest archived tasks are dropped for good.
+    """
+
+    def __init__(
+        self,
+        hot_ttl: float = HISTORY_HOT_TTL,
+        hot_max: int = HISTORY_HOT_MAX,
+        max_tasks: int = HISTORY_MAX_TASKS,
+        cache_size: int = HISTORY_CACHE_SIZE,
+        interval: float = HISTORY_SWEEP_INTERVAL,
+    ):
+        self.hot_ttl = hot_ttl
+        self.hot_max = hot_max
+        self.max_tasks = max_tasks
+        self.cache_size = cache_size
+        self.interval = interval
+        # uid -> archived task, oldest archived first.
+        self._entries: "OrderedDict[str, ArchivedTask]" = OrderedDict()
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def compressed_bytes(self) -> int:
+        return sum(len(entry.log_blob) for entry in self._entries.values())
+
+    def get(self, uid: str) -> Optional[ArchivedTask]:
+        return self._entries.get(uid)
+
+    def entries(self) -> Iterator[ArchivedTask]:
+        """Archived tasks, most recently archived first."""
+        return reversed(self._entries.values())
+
+    def log(self, uid: str) -> str:
+        """Returns the decompressed log of an archived task."""
+        text = self._cache.get(uid)
+        if text is not None:
+            self._cache.move_to_end(uid)
+            return text
+        text = zlib.decompress(self._entries[uid].log_blob).decode("utf-8")
+        if self.cache_size > 0:
+            self._cache[uid] = text
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return text
+
+    def remove(self, uid: str) -> bool:
+        """Forgets an archived task. Returns False if it was not archived."""
+        self._cache.pop(uid, None)
+        return self._entries.pop(uid, None) is not None
+
+    def _due(self, now: float) -> List[str]:
+        """IDs of hot tasks that should move to the cold tier, oldest first."""
+        finished = sorted(
+            ((finished_at(data), uid) for uid, data in tasks.items() if _archivable(data)),
+        )
+        due = [uid for at, uid in finished if self.hot_ttl and now - at >= self.hot_ttl]
+        if self.hot_max:
+            over = len(finished) - len(due) - self.hot_max
+            if over > 0:
+                due.extend(uid for _, uid in finished[len(due):len(due) + over])
+        return due
+
+    async def sweep(self):
+        """Moves due tasks to the cold tier and drops archived tasks over the limit."""
+        loop = asyncio.get_running_loop()
+        due = self._due(time.time())
+
+        for uid in due:
+            data = tasks.get(uid)
+            if data is None:
+                continue
+            raw = (data.get("final_log") or "").encode("utf-8")
+            # Compression runs off the event loop; the task stays visible until it is done.
+            blob = await loop.run_in_executor(None, zlib.compress, raw)
+            if tasks.get(uid) is not data or not _archivable(data):
+                continue
+            self._entries[uid] = ArchivedTask(uid, data, blob)
+            del tasks[uid]
+            record_removal(uid)
+
+        dropped = 0
+        while self.max_tasks and len(self._entries) > self.max_tasks:
+            uid, _ = self._entries.popitem(last=False)
+            self._cache.pop(uid, None)
+            # Recorded again so the task store deletes its row too.
+            record_removal(uid)
+            log_spool.remove(uid)
+            dropped += 1
+
+        if due or dropped:
+            logger.info(f"Task history: {len(due)} tasks archived, {dropped} dropped, {len(self._entries)} archived in total.")
+
+    async def _sweep_loop(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Failed to sweep finished tasks into the history.")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Starts the periodic sweep; the first one runs right away."""
+        if self.hot_ttl or self.hot_max:
+            self._loop_task = asyncio.create_task(self._sweep_loop())
+
+    def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+
+task_history = TaskHistory()
@@ -0,0 +1,131 @@
+import logging
+
+from collections import deque
+from itertools import islice
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+from config.config import LOG_MAX_LINES, LOG_MAX_LINE_LENGTH
+from services.task_state import clock
+
+logger = logging.getLogger("app")
+
+# Entry layout: [text, slot key or None, absolute line index, version of last change]
+_TEXT, _KEY, _INDEX, _VERSION = range(4)
+
+
+class TaskLog:
+    """
+    Bounded line store for the output of a single task.
+
+    Progress lines are kept in one slot per progress prefix and rewritten in
+    place, so recording a line is O(1) regardless of how long the task has run.
+    Once `max_lines` is reached the oldest lines are dropped. Every line has an
+    absolute index and the version of its last change, which lets `since()`
+    return only what a client has not seen yet.
+
+    If a `sink` is given, the complete output is also passed to it line by line.
+    Progress slots are written to it only when another line follows them or the
+    log is closed, so the spooled log holds the last progress state before each
+    message rather than every redraw.
+    """
+    __slots__ = ("max_lines", "max_line_length", "dropped", "version", "sink", "_lines", "_slots", "_dirty")
+
+    def __init__(
+        self,
+        max_lines: int = LOG_MAX_LINES,
+        max_line_length: int = LOG_MAX_LINE_LENGTH,
+        sink: Optional[Callable[[str], None]] = None,
+    ):
+        self.max_lines = max(1, max_lines)
+        self.max_line_length = max_line_length
+        self.dropped = 0
+        self.version = 0
+        self.sink = sink
+        self._lines: Deque[List] = deque()
+        self._slots: Dict[str, List] = {}
+        self._dirty: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    @property
+    def end(self) -> int:
+        """Absolute index one past the last line."""
+        return self.dropped + len(self._lines)
+
+    def _clip(self, line: str) -> str:
+        if self.max_line_length and len(line) > self.max_line_length:
+            return line[:self.max_line_length] + " [...]"
+        return line
+
+    def _push(self, text: str, key: Optional[str]) -> List:
+        if len(self._lines) >= self.max_lines:
+            evicted = self._lines.popleft()
+            self.dropped += 1
+            if evicted[_KEY] is not None and self._slots.get(evicted[_KEY]) is evicted:
+                del self._slots[evicted[_KEY]]
+        self.version = clock.tick()
+        entry = [text, key, self.end, self.version]
+        self._lines.append(entry)
+        return entry
+
+    def _flush_slots(self):
+        for key in self._dirty:
+            entry = self._slots.get(key)
+            if entry is not None:
+                self.sink(entry[_TEXT])
+        self._dirty.clear()
+
+    def append(self, line: str):
+        """Appends a regular (non-progress) line."""
+        if self.sink is not None:
+            if self._dirty:
+                self._flush_slots()
+            self.sink(line)
+        self._push(self._clip(line), None)
+
+    def update_progress(self, key: str, line: str):
+        """Rewrites the progress slot for `key`, creating it at the end of the log if needed."""
+        if self.sink is not None:
+            self._dirty.add(key)
+        entry = self._slots.get(key)
+        if entry is not None:
+            self.version = clock.tick()
+            entry[_TEXT] = self._clip(line)
+            entry[_VERSION] = self.version
+            return
+        self._slots[key] = self._push(self._clip(line), key)
+
+    def spool(self, text: str):
+        """Passes text to the sink only, without keeping it in the in-memory tail."""
+        if self.sink is not None:
+            self.sink(text)
+
+    def close(self):
+        """Writes out pending progress slots; call once the task's process has exited."""
+        if self.sink is not None and self._dirty:
+            self._flush_slots()
+
+    def since(self, version: int) -> Tuple[int, List[str]]:
+        """
+        Returns `(offset, lines)` where `lines` are all lines from absolute index
+        `offset` onwards and every line changed after `version` is included.
+        """
+        start = self.end
+        # Lines are appended in version order, so new lines form a contiguous tail;
+        # only progress slots can change further up.
+        for entry in reversed(self._lines):
+            if entry[_VERSION] <= version:
+                break
+            start = entry[_INDEX]
+        for entry in self._slots.values():
+            if entry[_VERSION] > version and entry[_INDEX] < start:
+                start = entry[_INDEX]
+        return start, [entry[_TEXT] for entry in islice(self._lines, start - self.dropped, None)]
+
+    def text(self, tail: int = 0) -> str:
+        """Renders the log the way it is shown to clients, optionally only its last `tail` lines."""
+        skip = max(0, len(self._lines) - tail) if tail else 0
+        body = "\n".join(entry[_TEXT] for entry in islice(self._lines, skip, None))
+        if self.dropped + skip:
+            return f"[... {self.dropped + skip} earlier lines truncated ...]\n{body}"
+        return body
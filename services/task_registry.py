@@ -0,0 +1,368 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+from urllib.parse import urlsplit
+from fastapi import Request
+from fastapi.responses import RedirectResponse
+from config.config import (
+    REGISTRY_PATH, REGISTRY_SYNC_INTERVAL, REGISTRY_WORKER_TIMEOUT, TASK_REGISTRY, WORKER_ID, WORKER_ID_PATH, WORKER_URL,
+)
+from config.dependencies import tasks
+from services import task_state
+from services.task_state import clock, record_removal, task_version
+
+logger = logging.getLogger("app")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    uid TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    share_key TEXT,
+    item TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_owner ON tasks (owner);
+CREATE TABLE IF NOT EXISTS actions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    owner TEXT NOT NULL,
+    action TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS actions_owner ON actions (owner);
+"""
+
+# Builds the published status item (JSON) of a task owned by this worker.
+Describe = Callable[[str, Dict[str, Any]], str]
+ActionHandler = Callable[[Dict[str, Any]], Union[None, Awaitable[None]]]
+
+
+class RemoteTask:
+    """A task owned by another worker, as last published by it."""
+    __slots__ = ("uid", "owner", "url", "share_key", "item", "revision", "version", "parsed")
+
+    def __init__(self, uid: str, owner: str, url: str, share_key: Optional[Tuple[str, str, str]], item: Dict[str, Any], revision: Tuple[int, float]):
+        self.uid = uid
+        self.owner = owner
+        self.url = url
+        self.share_key = share_key
+        self.item = item
+        self.revision = revision
+        # Local version, so incremental /status clients see remote changes like local ones.
+        self.version = clock.tick()
+        # (tail, response item) of the last /status rendering; a changed task gets a new RemoteTask.
+        self.parsed: Optional[Tuple[int, Any]] = None
+
+
+def _stable_worker_id(path: str) -> str:
+    """WORKER_ID, or an ID generated on the first start and kept in `path` so it survives container rebuilds."""
+    if WORKER_ID:
+        return WORKER_ID
+    try:
+        with open(path) as f:
+            worker_id = f.read().strip()
+        if worker_id:
+            return worker_id
+    except FileNotFoundError:
+        pass
+    worker_id = uuid.uuid4().hex[:12]
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(worker_id)
+    os.replace(tmp, path)
+    return worker_id
+
+
+class TaskRegistry(ABC):
+    """
+    Where the tasks of every worker are known. Each task is owned by the
+    worker that runs it: that worker holds its subprocess and state in
+    `tasks` and publishes it; the other workers see it in `remote` and route
+    control actions on it to the owner with `send`. Handlers for the actions
+    a worker accepts are registered with `on`.
+    """
+
+    def __init__(self, worker_id: str = WORKER_ID, url: str = WORKER_URL):
+        self.worker_id = worker_id
+        self.url = url
+        self.remote: Dict[str, RemoteTask] = {}
+        self._handlers: Dict[str, ActionHandler] = {}
+        # IDs this worker gave to tasks it routed to another worker.
+        self._routed: Set[str] = set()
+
+    @property
+    def shared(self) -> bool:
+        return False
+
+    def task_id(self, base: str) -> str:
+        """The base of the IDs this worker gives to new tasks; only this worker creates IDs with it."""
+        return base
+
+    def on(self, action: str, handler: ActionHandler):
+        self._handlers[action] = handler
+
+    def owner(self, uid: str) -> Optional[str]:
+        """The worker owning a task, or None if no worker knows it."""
+        if uid in tasks:
+            return self.worker_id
+        remote = self.remote.get(uid)
+        return remote.owner if remote else None
+
+    def known(self, uid: str) -> bool:
+        """Whether another worker has (or is about to have) a task with this ID."""
+        return uid in self.remote or uid in self._routed
+
+    def shared_downloads(self) -> Dict[Tuple[str, str, str], RemoteTask]:
+        """Maps the (video, binary, quality) of every unfinished download of other workers to its task."""
+        index: Dict[Tuple[str, str, str], RemoteTask] = {}
+        for remote in self.remote.values():
+            if remote.share_key is not None:
+                index.setdefault(remote.share_key, remote)
+        return index
+
+    def redirect(self, request: Request, uid: str) -> Optional[RedirectResponse]:
+        """Redirects a request about another worker's task to that worker, if its URL is known."""
+        remote = self.remote.get(uid)
+        if remote is None or not remote.url:
+            return None
+        path = urlsplit(str(request.url))
+        target = f"{remote.url}{path.path}" + (f"?{path.query}" if path.query else "")
+        return RedirectResponse(target, status_code=307)
+
+    @abstractmethod
+    def send(self, owner: str, action: str, payload: Dict[str, Any]):
+        """Queues a control action for the worker owning a task."""
+
+    async def _run_action(self, action: str, payload: Dict[str, Any]):
+        handler = self._handlers.get(action)
+        if handler is None:
+            logger.error(f"No handler for routed action '{action}'.")
+            return
+        try:
+            result = handler(payload)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception:
+            logger.exception(f"Routed action '{action}' failed.")
+
+    @abstractmethod
+    async def start(self, describe: Describe):
+        """Starts publishing this worker's tasks, each described by `describe`."""
+
+    @abstractmethod
+    async def stop(self):
+        """Withdraws this worker's tasks from the registry."""
+
+
+class LocalRegistry(TaskRegistry):
+    """Single-worker registry: every task is owned by this process and nothing is published."""
+
+    def send(self, owner: str, action: str, payload: Dict[str, Any]):
+        raise RuntimeError(f"Task owner {owner} is unknown to the local task registry.")
+
+    async def start(self, describe: Describe):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class SqliteRegistry(TaskRegistry):
+    """
+    Registry shared through a SQLite database that every worker can open
+    (the same host, or a filesystem with working locks).
+
+    Like the task store, it is write-behind: every REGISTRY_SYNC_INTERVAL
+    seconds one transaction on a dedicated thread writes this worker's
+    heartbeat, the tasks changed since the last sync and the queued
+    outgoing actions, takes the actions addressed to this worker, and
+    reads the versions of everyone else's tasks. Only the items of tasks
+    whose version changed are read afterwards. Tasks of workers without a
+    recent heartbeat are dropped from `remote`.
+
+    Task IDs end with "@<worker>" of the worker that created them, so two
+    workers never hand out the same ID even before they have synced.
+    """
+
+    def __init__(self, path: str = REGISTRY_PATH, interval: float = REGISTRY_SYNC_INTERVAL, timeout: float = REGISTRY_WORKER_TIMEOUT, worker_id_path: str = WORKER_ID_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.worker_id_path = worker_id_path
+        self.path = path
+        self.interval = interval
+        self.timeout = timeout
+        self._db: Optional[sqlite3.Connection] = None
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-registry")
+        self._describe: Optional[Describe] = None
+        self._published: Dict[str, int] = {}
+        self._cursor = 0
+        self._outbox: List[Tuple[str, str, str, float]] = []
+        self._running: Set[asyncio.Task] = set()
+        self._loop_task: Optional[asyncio.Task] = None
+
+    @property
+    def shared(self) -> bool:
+        return True
+
+    def task_id(self, base: str) -> str:
+        return f"{base}@{self.worker_id}"
+
+    def send(self, owner: str, action: str, payload: Dict[str, Any]):
+        if "uid" in payload:
+            self._routed.add(payload["uid"])
+        self._outbox.append((owner, action, json.dumps(payload), time.time()))
+
+    def _open(self):
+        self.worker_id = _stable_worker_id(self.worker_id_path)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        with self._db:
+            # Tasks published by a previous run of this worker are republished from the restored state.
+            self._db.execute("DELETE FROM tasks WHERE owner = ?", (self.worker_id,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO workers (worker, url, heartbeat) VALUES (?, ?, ?)",
+                (self.worker_id, self.url, time.time()),
+            )
+
+    def _close(self):
+        with self._db:
+            self._db.execute("DELETE FROM tasks WHERE owner = ?", (self.worker_id,))
+            self._db.execute("DELETE FROM workers WHERE worker = ?", (self.worker_id,))
+        self._db.close()
+
+    def _sync(self, rows: List[Tuple], deleted: List[str], outbox: List[Tuple]) -> Tuple[List[Tuple], List[Tuple]]:
+        now = time.time()
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO workers (worker, url, heartbeat) VALUES (?, ?, ?)",
+                (self.worker_id, self.url, now),
+            )
+            if rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO tasks (uid, owner, version, updated_at, share_key, item) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+            if deleted:
+                self._db.executemany(
+                    "DELETE FROM tasks WHERE uid = ? AND owner = ?", [(uid, self.worker_id) for uid in deleted]
+                )
+            if outbox:
+                self._db.executemany("INSERT INTO actions (owner, action, payload, created_at) VALUES (?, ?, ?, ?)", outbox)
+            actions = self._db.execute(
+                "SELECT id, action, payload FROM actions WHERE owner = ? ORDER BY id", (self.worker_id,)
+            ).fetchall()
+            if actions:
+                self._db.execute("DELETE FROM actions WHERE owner = ? AND id <= ?", (self.worker_id, actions[-1][0]))
+            others = self._db.execute(
+                "SELECT t.uid, t.owner, w.url, t.version, t.updated_at, t.share_key FROM tasks t "
+                "JOIN workers w ON w.worker = t.owner WHERE t.owner != ? AND w.heartbeat >= ?",
+                (self.worker_id, now - self.timeout),
+            ).fetchall()
+        return actions, others
+
+    def _read_items(self, uids: List[str]) -> Dict[str, str]:
+        items = {}
+        for start in range(0, len(uids), 500):
+            chunk = uids[start:start + 500]
+            query = f"SELECT uid, item FROM tasks WHERE uid IN ({', '.join('?' * len(chunk))})"
+            items.update(self._db.execute(query, chunk).fetchall())
+        return items
+
+    async def _run_io(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._io, fn, *args)
+
+    def _changed_rows(self) -> Tuple[List[Tuple], List[str]]:
+        """Rows of the local tasks changed since the last sync, and the IDs of removed ones."""
+        now = time.time()
+        rows = []
+        for uid, data in tasks.items():
+            version = task_version(data)
+            if self._published.get(uid) == version:
+                continue
+            share_key = data.get("share_key")
+            if data["completed"] or "source" in data:
+                share_key = None
+            rows.append((uid, self.worker_id, version, now, json.dumps(share_key) if share_key else None, self._describe(uid, data)))
+            self._published[uid] = version
+
+        deleted = [uid for uid in task_state.removed_since(self._cursor) if uid not in tasks]
+        for uid in deleted:
+            self._published.pop(uid, None)
+        self._cursor = clock.value
+        return rows, deleted
+
+    async def sync(self):
+        """Publishes local changes, runs the actions sent to this worker and refreshes `remote`."""
+        if self._db is None:
+            return
+
+        rows, deleted = self._changed_rows()
+        outbox, self._outbox = self._outbox, []
+        actions, others = await self._run_io(self._sync, rows, deleted, outbox)
+
+        seen = set()
+        changed: Dict[str, Tuple] = {}
+        for uid, owner, url, version, updated_at, share_key in others:
+            if uid in tasks:
+                continue
+            seen.add(uid)
+            remote = self.remote.get(uid)
+            if remote is None or remote.owner != owner or remote.revision != (version, updated_at):
+                changed[uid] = (owner, url, (version, updated_at), tuple(json.loads(share_key)) if share_key else None)
+
+        items = await self._run_io(self._read_items, list(changed)) if changed else {}
+        for uid, (owner, url, revision, share_key) in changed.items():
+            if uid in items:
+                self.remote[uid] = RemoteTask(uid, owner, url, share_key, json.loads(items[uid]), revision)
+        for uid in [uid for uid in self.remote if uid not in seen]:
+            del self.remote[uid]
+            record_removal(uid)
+
+        for _, action, payload in actions:
+            task = asyncio.create_task(self._run_action(action, json.loads(payload)))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _sync_loop(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Failed to sync the task registry.")
+            await asyncio.sleep(self.interval)
+
+    async def start(self, describe: Describe):
+        self._describe = describe
+        await self._run_io(self._open)
+        self._cursor = clock.value
+        self._loop_task = asyncio.create_task(self._sync_loop())
+        logger.info(f"Task registry opened at {self.path} as worker {self.worker_id}.")
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+        if self._db is not None:
+            await self.sync()
+            await self._run_io(self._close)
+            self._db = None
+
+
+REGISTRIES = {"local": LocalRegistry, "sqlite": SqliteRegistry}
+
+task_registry: TaskRegistry = REGISTRIES[TASK_REGISTRY]()
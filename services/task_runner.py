@@ -1,47 +1,132 @@
 import re
+import time
 import asyncio
 import logging
 import traceback
 
-from typing import Dict, Any, Awaitable, Callable, List
+from typing import Dict, Any, Callable, List, Optional, Tuple
 from config.dependencies import tasks
 from config.schemas import TaskStatus 
+from services.bandwidth import bandwidth
+from services.binary_manager import ensure_installed
+from services.callback_runner import callbacks, run_callbacks
+from services.command_builder import format_cmd
+from services.log_spool import log_spool
+from services.metrics import STREAMS, line_seconds, lines_processed, redraws_dropped, task_duration_seconds
+from services.process_launcher import launch, process_settings
+from services.stream_reader import STREAM_CHUNK_SIZE, RecordSplitter
+from services.progress import ProgressCoalescer, TaskProgress, progress_key
+from services.storage import storage
+from services.task_history import task_history
+from services.task_log import TaskLog
+from services.task_registry import task_registry
+from services.task_state import touch
 
 logger = logging.getLogger("app")
 
-try:
-    from callbacks import callbacks
-except ImportError:
-    callbacks = None
-
-DOWNLOAD_GROUP_RE = re.compile(r"^(?P<prefix>\d+:\s+)?\[download\]")
+_LINE_COUNTERS = {stream: lines_processed.labels(stream) for stream in STREAMS}
 
 def get_id(base: str) -> str:
-    """Generates a unique ID based on a base string (e.g., youtubeID)."""
-    if base not in tasks:
+    """Generates a unique ID based on a base string (e.g., youtubeID), skipping IDs kept in the history or used by other workers."""
+    base = task_registry.task_id(base)
+    if base not in tasks and base not in task_history and not task_registry.known(base):
         return base
     i = 0
     while True:
         candidate = f"{base}.{i}"
-        if candidate not in tasks:
+        if candidate not in tasks and candidate not in task_history and not task_registry.known(candidate):
             return candidate
         i += 1
 
+def shared_downloads() -> Dict[Tuple[str, str, str], str]:
+    """Maps the (video, binary, quality) of every unfinished download to the ID of the task running it."""
+    index: Dict[Tuple[str, str, str], str] = {}
+    for uid, data in tasks.items():
+        share_key = data.get("share_key")
+        if share_key is not None and not data["completed"] and "source" not in data:
+            index.setdefault(share_key, uid)
+    return index
+
+def subscribe(uid: str, data: Dict[str, Any], source_uid: str):
+    """Attaches a new task to the download of `source_uid` instead of starting its own."""
+    source = tasks[source_uid]
+    data["source"] = source
+    data["source_uid"] = source_uid
+    source.setdefault("subscribers", []).append(uid)
+    touch(data)
+
+async def _finish_subscribers(data: Dict[str, Any], final_file: Optional[str]):
+    """Hands the outcome of a finished download to the tasks sharing it and starts their callbacks."""
+    for sub_uid in data.get("subscribers", []):
+        sub = tasks.get(sub_uid)
+        if sub is None or sub.get("source") is not data:
+            continue
+        await log_spool.copy(sub["source_uid"], sub_uid)
+        for key in (
+            "status", "final_log", "started_at", "finished_at", "wait_time", "progress", "bandwidth", "error_output", "output_path", "move",
+        ):
+            if key in data:
+                sub[key] = data[key]
+        sub["active"] = data["active"]
+        sub["completed"] = True
+        del sub["source"]
+        touch(sub)
+        logger.info(f"[{sub_uid}] Shared download finished with status: {TaskStatus(sub['status']).name}")
+        if callbacks and sub.get("callbacks") and final_file:
+            sub["callback_task"] = asyncio.create_task(run_callbacks(sub_uid, sub, final_file))
+    data["subscribers"] = []
+
+def new_task_entry(
+    uid: str,
+    binary: str,
+    cmd: List[str],
+    callback_ids: List[str],
+    priority: int = 0,
+    settings: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Creates the internal state dict for a task that has not been scheduled yet."""
+    data = {
+        "binary": binary,
+        "cmd": cmd,
+        "process_settings": settings or process_settings(),
+        "process": None,
+        "task": None,
+        "log": TaskLog(sink=log_spool.writer(uid)),
+        "progress": TaskProgress(),
+        "line_counts": {stream: 0 for stream in STREAMS},
+        "error_output": False,
+        "active": False,
+        "completed": False,
+        "output": {"out": "", "err": ""},
+        "callbacks": callback_ids,
+        "status": TaskStatus.PENDING.value,
+        "priority": priority,
+        "created_at": time.time(),
+    }
+    touch(data)
+    return data
+
 def extract_final_file_path(out_text: str, binary: str) -> str | None:
-    """Extracts the final downloaded file path from the output logs."""
-    match = re.search(r'(?:Merging formats into|Destination):\s*["\']?(?P<path>.+?)["\']?$', out_text, re.MULTILINE)
+    """Extracts the final downloaded file path from the output logs (the last one reported)."""
+    matches = re.findall(r'(?:Merging formats into|Destination):\s*["\']?(.+?)["\']?$', out_text, re.MULTILINE)
     
     if binary == "ytarchive" and "Final file:" in out_text:
         return out_text.split("Final file:")[-1].strip()
-    elif binary == "ytdlp" and match:
-        return match.group('path').strip()
+    elif binary == "ytdlp" and matches:
+        return matches[-1].strip()
     return None
 
-async def _process_stream_line(
+def _apply_progress(data: Dict[str, Any], key: str, line: str):
+    """Writes a (coalesced) progress line to the task's log slot and parsed progress."""
+    data["active"] = True
+    data["log"].update_progress(key, line)
+    data["progress"].update(data["binary"], line)
+
+def _process_stream_line(
     uid: str,
     data: Dict[str, Any],
     line: str,
-    progress_re: re.Pattern,
+    coalescer: ProgressCoalescer,
     stream_name: str
 ):
     """Handles parsing and logging for a single line from stdout/stderr."""
@@ -49,29 +134,27 @@ async def _process_stream_line(
         if data.get("status") == TaskStatus.PENDING.value:
             data["status"] = TaskStatus.ACTIVE.value
         data["started_log"] = True
+        touch(data)
 
-    logger.debug(f"[{uid}] {stream_name}: {line}") 
-    prev = data["progress_log"].splitlines() if data["progress_log"] else []
-    
-    is_progress = progress_re.search(line)
-    
-    if is_progress:
-        data["active"] = True
-        
-        group_match = DOWNLOAD_GROUP_RE.search(line)
-        prefix_key = group_match.group('prefix') if group_match and group_match.group('prefix') else ""
-        
-        found_match = False
-        for i in range(len(prev) - 1, -1, -1):
-            if prev[i].startswith(prefix_key) and progress_re.search(prev[i]):
-                prev[i] = line
-                found_match = True
-                break
-        if not found_match:
-            prev.append(line)
-    else:
-        prev.append(line)
-    data["progress_log"] = "\n".join(prev)
+    data["line_counts"][stream_name] += 1
+    _LINE_COUNTERS[stream_name].inc()
+
+    key = progress_key(data["binary"], line)
+    if key is not None:
+        coalescer.offer(key, line)
+        return
+
+    logger.debug(f"[{uid}] {stream_name}: {line}")
+    if not data["error_output"] and "ERROR:" in line:
+        data["error_output"] = True
+    if "Destination:" in line or "Merging formats into" in line or "Final file:" in line:
+        # Remembers the file being written, so it can be served while the task runs.
+        output_path = extract_final_file_path(line, data["binary"])
+        if output_path:
+            data["output_path"] = output_path
+    # Progress held back by the coalescer belongs before this line.
+    coalescer.flush()
+    data["log"].append(line)
 
 async def run_download(uid: str):
     """
@@ -87,60 +170,69 @@ async def run_download(uid: str):
     binary_type = data["binary"]
 
     logger.info(f"[{uid}] Starting task (Status: {TaskStatus(data.get('status', TaskStatus.PENDING)).name})")
-    logger.info(f"[{uid}] Executing command:\n{cmd}")
-    
-    ytdlp_progress_re = re.compile(r"(?:^\d+:\s+)?\[download\].+(?: at |ETA|\%)")
-    ytarchive_progress_re = re.compile(r"(Video Fragments|Audio Fragments|Total Downloaded):")
     
-    stream_buffers = {"STDOUT": "", "STDERR": ""} 
+    coalescer = ProgressCoalescer(lambda key, line: _apply_progress(data, key, line))
 
-    async def handle_stream(stream: asyncio.StreamReader, callback: Callable[[str], Awaitable[None]], stream_type: str):
+    async def handle_stream(stream: asyncio.StreamReader, callback: Callable[[str], None], stream_type: str):
+        splitter = RecordSplitter()
         while True:
             try:
-                chunk = await stream.readline()
-                if not chunk:
-                    break
-                decoded = chunk.decode("utf-8", errors="replace")
-                
+                chunk = await stream.read(STREAM_CHUNK_SIZE)
             except Exception as e:
                 logger.error(f"[{uid}] Stream reading error on {stream_type}: {e}", exc_info=True)
                 break
 
-            r_parts = decoded.split('\r')
-            for part in r_parts:
-                line = part.strip()
-                if line:
-                    await callback(line)
-    
-    async def handle_stdout(line: str):
+            dropped = splitter.dropped
+            for line in (splitter.feed(chunk) if chunk else splitter.flush()):
+                callback(line)
+            if splitter.dropped != dropped:
+                redraws_dropped.inc(splitter.dropped - dropped)
+            if not chunk:
+                break
+
+    def handle_stdout(line: str):
         """Processes standard output for progress tracking and logging."""
-        current_re = ytarchive_progress_re if binary_type == "ytarchive" else ytdlp_progress_re
-        await _process_stream_line(uid, data, line, current_re, "STDOUT")
+        start = time.perf_counter()
+        _process_stream_line(uid, data, line, coalescer, "STDOUT")
+        line_seconds.observe(time.perf_counter() - start)
 
-    async def handle_stderr(line: str):
+    def handle_stderr(line: str):
         """Processes standard error for errors and logging."""
-        current_re = ytarchive_progress_re if binary_type == "ytarchive" else ytdlp_progress_re
-        await _process_stream_line(uid, data, line, current_re, "STDERR")
+        start = time.perf_counter()
+        _process_stream_line(uid, data, line, coalescer, "STDERR")
+        line_seconds.observe(time.perf_counter() - start)
 
     proc = None
     try:
-        proc = await asyncio.create_subprocess_shell(
+        # Inside the try, so a missing binary or a failed install fails the task instead of leaving it pending.
+        await ensure_installed(binary_type)
+        bandwidth.allocate(uid, data)
+
+        logger.info(f"[{uid}] Executing command:\n{format_cmd(cmd)}")
+        proc = await launch(
             cmd,
+            data["process_settings"],
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
-            limit=1024 * 1024 # 1MB
+            limit=STREAM_CHUNK_SIZE * 4
         )
         data["process"] = proc
         data["status"] = TaskStatus.ACTIVE.value
+        data["started_at"] = time.time()
+        touch(data)
         
     except Exception:
-        launch_error = f"\n\n[SYSTEM ERROR] Failed to launch subprocess:\n{traceback.format_exc()}"
-        logger.exception(f"[{uid}] Critical error during process creation.")
+        launch_error = f"\n\n[SYSTEM ERROR] Failed to start the process:\n{traceback.format_exc()}"
+        logger.exception(f"[{uid}] Critical error while starting the process.")
         
-        data["progress_log"] = data.get("progress_log", "") + launch_error
+        data["log"].append(launch_error)
+        data["log"].close()
         data["completed"] = True
         data["status"] = TaskStatus.ERROR.value
-        data["final_log"] = data["progress_log"]
+        data["finished_at"] = time.time()
+        data["final_log"] = data["log"].text()
+        touch(data)
+        await _finish_subscribers(data, None)
         return
 
     t_out = asyncio.create_task(handle_stream(proc.stdout, handle_stdout, "STDOUT"))
@@ -148,54 +240,47 @@ async def run_download(uid: str):
     logger.info(f"[{uid}] Waiting for process to finish...")
     await asyncio.gather(t_out, t_err)
     rc = await proc.wait()
+    coalescer.close()
+    data["log"].close()
     data["completed"] = True
 
     if rc != 0:
         logger.error(f"[{uid}] Process **failed** with return code: {rc}")
         data["status"] = TaskStatus.ERROR.value
+    elif data["error_output"]:
+        logger.warning(f"[{uid}] Process exited with return code {rc} but reported errors.")
+        data["status"] = TaskStatus.WARNING.value
     else:
         logger.info(f"[{uid}] Process exited successfully with return code: {rc}")
         data["status"] = TaskStatus.DONE.value
+    data["finished_at"] = time.time()
+    task_duration_seconds.labels(binary_type, "error" if rc else "done").observe(data["finished_at"] - data["started_at"])
 
-    data["final_log"] = data["progress_log"]
+    data["final_log"] = data["log"].text()
+    touch(data)
+
+    final_file = data.get("output_path") or extract_final_file_path(data["final_log"], data["binary"])
+    data["output_path"] = final_file
+    if storage.destination(final_file) is not None:
+        # Moving off the staging directory can take a while, so it does not hold the download slot.
+        data["finalize_task"] = asyncio.create_task(_finalize(uid, data, final_file))
+    else:
+        await _finalize(uid, data, final_file)
 
+    logger.info(f"[{uid}] Task finished with final status: {TaskStatus(data['status']).name}")
+
+async def _finalize(uid: str, data: Dict[str, Any], final_file: Optional[str]):
+    """Moves a finished task's output out of the staging directory, then runs its and its subscribers' callbacks."""
+    final_file = await storage.move_to_downloads(uid, data, final_file)
+    data["output_path"] = final_file
+    touch(data)
     if callbacks and data.get("callbacks"):
         logger.info(f"[{uid}] Executing callbacks: {data['callbacks']}")
-        final_file = extract_final_file_path(data["final_log"], data["binary"])
-        
+
         if not final_file:
             logger.warning(f"[{uid}] Final file path not detected. Callbacks skipped.")
-        
-        if final_file:
+        else:
             logger.info(f"[{uid}] Final file path detected: {final_file}")
-            for cb_id in data["callbacks"]:
-                try:
-                    logger.info(f"[{uid}] Running callback {cb_id}")
-                    result = callbacks[cb_id](final_file)
-                    current_log = data["final_log"]
-
-                    if "front" in result and result["front"]:
-                        for key, block in result["front"].items():
-                            current_log = f"{key}:\n{block['out']}\n\n{current_log}"
-                            if block.get("err"):
-                                current_log = f"{key} ERROR:\n{block['err']}\n\n{current_log}"
-                    
-                    if "end" in result and result["end"]:
-                        for key, block in result["end"].items():
-                            current_log += f"\n\n{key}:\n{block['out']}"
-                            if block.get("err"):
-                                current_log += f"\n\n{key} ERROR:\n{block['err']}"
-
-                    data["final_log"] = current_log
-                    logger.info(f"[{uid}] Callback {cb_id} executed successfully.")
-
-                except Exception:
-                    logger.exception(f"[{uid}] Callback {cb_id} failed unexpectedly.")
-                    
-                    callback_error = f"\n\n[CALLBACK ERROR: {cb_id}]\n{traceback.format_exc()}"
-                    data["final_log"] += callback_error 
-                    
-                    if data["status"] == TaskStatus.DONE.value:
-                        data["status"] = TaskStatus.WARNING.value
-
-    logger.info(f"[{uid}] Task finished with final status: {TaskStatus(data['status']).name}")
+            # Callbacks run in the worker pool on their own, so the download slot is freed right away.
+            data["callback_task"] = asyncio.create_task(run_callbacks(uid, data, final_file))
+    await _finish_subscribers(data, final_file)
@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+# How many task removals are remembered for incremental /status clients.
+REMOVED_HISTORY = 1000
+
+
+class VersionClock:
+    """Process-wide monotonically increasing version counter for task state."""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def tick(self) -> int:
+        self.value += 1
+        return self.value
+
+
+clock = VersionClock()
+
+# uid -> version at which the task was removed, oldest first.
+removed: "OrderedDict[str, int]" = OrderedDict()
+# Cursors older than this may have missed removals and need a full resync.
+removed_floor = 0
+
+
+def touch(data: Dict[str, Any]) -> int:
+    """Marks a task as changed and returns its new version."""
+    data["version"] = clock.tick()
+    return data["version"]
+
+
+def task_version(data: Dict[str, Any]) -> int:
+    """
+    Returns the latest version of a task, including changes to its log and,
+    for a task sharing another task's download, changes to that task.
+    """
+    log = data.get("log")
+    version = data.get("version", 0)
+    if log is not None and log.version > version:
+        version = log.version
+    source = data.get("source")
+    if source is not None:
+        version = max(version, task_version(source))
+    return version
+
+
+def record_removal(uid: str):
+    """Remembers that a task was removed so incremental clients can drop it."""
+    global removed_floor
+    removed.pop(uid, None)
+    removed[uid] = clock.tick()
+    while len(removed) > REMOVED_HISTORY:
+        _, version = removed.popitem(last=False)
+        removed_floor = version
+
+
+def removed_since(since: int) -> List[str]:
+    """Returns the IDs of tasks removed after the given version."""
+    return [uid for uid, version in removed.items() if version > since]
+
+
+def needs_full_sync(since: int) -> bool:
+    """Whether a cursor is too old (or from a previous process) to be served incrementally."""
+    return since > clock.value or since < removed_floor
@@ -0,0 +1,312 @@
+import os
+import json
+import shlex
+import time
+import signal
+import asyncio
+import logging
+import sqlite3
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+from config.config import TASK_DB_PATH, TASK_RECOVERY_POLICY, TASK_STORE_FLUSH_INTERVAL
+from config.dependencies import tasks
+from config.schemas import TaskStatus
+from services import task_state
+from services.command_builder import format_cmd
+from services.task_history import ArchivedTask, task_history
+from services.task_runner import extract_final_file_path, new_task_entry, subscribe
+from services.task_state import task_version, touch
+
+logger = logging.getLogger("app")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    uid TEXT PRIMARY KEY,
+    binary TEXT NOT NULL,
+    cmd TEXT NOT NULL,
+    callbacks TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    completed INTEGER NOT NULL,
+    log TEXT NOT NULL,
+    pid INTEGER,
+    created_at REAL,
+    updated_at REAL,
+    settings TEXT,
+    share_key TEXT
+)
+"""
+
+_COLUMNS = (
+    "uid", "binary", "cmd", "callbacks", "priority", "status", "completed", "log", "pid", "created_at", "updated_at",
+    "settings", "share_key",
+)
+# Columns added after the first release, created on databases that lack them.
+_ADDED_COLUMNS = {"settings": "TEXT", "share_key": "TEXT"}
+_META_COLUMNS = tuple(column for column in _COLUMNS if column not in ("uid", "log"))
+
+# Log lines saved with a running task. Its full log is in the log spool; the final log is saved once it completes.
+RUNNING_LOG_TAIL = 20
+
+
+class TaskStore:
+    """
+    Write-behind SQLite persistence for the `tasks` dict.
+
+    The hot path never touches the database: a background loop compares each
+    task's version with the last one written and flushes the changed rows in
+    one transaction on a dedicated thread. Removed tasks are picked up from
+    `task_state.removed`; tasks moved to the history keep their rows. Rows of
+    running tasks only carry the end of the log, and a finished task's log is
+    written once; later changes only update the other columns.
+    """
+
+    def __init__(self, path: str = TASK_DB_PATH, interval: float = TASK_STORE_FLUSH_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._db: Optional[sqlite3.Connection] = None
+        # A single thread owns the connection, which also serialises all writes.
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-store")
+        self._written: Dict[str, int] = {}
+        # Finished tasks whose final log has been written.
+        self._final_logs: Set[str] = set()
+        self._cursor = 0
+        self._loop_task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _open(self):
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(SCHEMA)
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(tasks)")}
+        for column, kind in _ADDED_COLUMNS.items():
+            if column not in existing:
+                self._db.execute(f"ALTER TABLE tasks ADD COLUMN {column} {kind}")
+        self._db.commit()
+
+    def _read_all(self) -> List[Tuple]:
+        return self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM tasks ORDER BY created_at").fetchall()
+
+    def _write(self, rows: List[Tuple], updates: List[Tuple], deleted: List[str]):
+        with self._db:
+            if rows:
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO tasks ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                    rows,
+                )
+            if updates:
+                self._db.executemany(
+                    f"UPDATE tasks SET {', '.join(f'{column} = ?' for column in _META_COLUMNS)} WHERE uid = ?",
+                    updates,
+                )
+            if deleted:
+                self._db.executemany("DELETE FROM tasks WHERE uid = ?", [(uid,) for uid in deleted])
+
+    async def _run_io(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._io, fn, *args)
+
+    @staticmethod
+    def _archived_row(entry: ArchivedTask) -> Tuple:
+        return (
+            entry.uid,
+            entry.binary,
+            format_cmd(entry.cmd),
+            json.dumps(entry.callbacks),
+            entry.priority,
+            entry.status,
+            1,
+            task_history.log(entry.uid),
+            None,
+            entry.created_at,
+            entry.finished_at,
+            None,
+            None,
+        )
+
+    @staticmethod
+    def _log(data: Dict[str, Any]) -> str:
+        if data.get("completed"):
+            return data["final_log"] or ""
+        return data["log"].text(RUNNING_LOG_TAIL)
+
+    @staticmethod
+    def _meta(data: Dict[str, Any]) -> Tuple:
+        """The values of `_META_COLUMNS` for a task."""
+        process = data.get("process")
+        return (
+            data["binary"],
+            format_cmd(data["cmd"]),
+            json.dumps(data.get("callbacks") or []),
+            data.get("priority", 0),
+            data.get("status", TaskStatus.PENDING.value),
+            int(data.get("completed", False)),
+            process.pid if process and process.returncode is None else None,
+            data.get("created_at"),
+            time.time(),
+            json.dumps(data.get("process_settings")),
+            json.dumps(data["share_key"]) if data.get("share_key") else None,
+        )
+
+    async def flush(self):
+        """Writes every task changed since the last flush in a single transaction."""
+        if self._db is None:
+            return
+
+        rows, updates = [], []
+        # Bookkeeping is applied only once the rows are written, so a failed write is retried by the next flush.
+        written: Dict[str, int] = {}
+        final_logs = []
+        for uid, data in tasks.items():
+            version = task_version(data)
+            if self._written.get(uid) == version:
+                continue
+            written[uid] = version
+            meta = self._meta(data)
+            if uid in self._final_logs:
+                updates.append((*meta, uid))
+                continue
+            # `log` follows the first six metadata columns in `_COLUMNS`.
+            rows.append((uid, *meta[:6], self._log(data), *meta[6:]))
+            if data.get("completed"):
+                final_logs.append(uid)
+        # Tasks archived before their final state was written still need their row.
+        for entry in task_history.entries():
+            if self._written.get(entry.uid) != entry.version:
+                rows.append(self._archived_row(entry))
+                written[entry.uid] = entry.version
+
+        deleted = [
+            uid for uid in task_state.removed_since(self._cursor)
+            if uid not in tasks and uid not in task_history
+        ]
+        cursor = task_state.clock.value
+
+        if rows or updates or deleted:
+            await self._run_io(self._write, rows, updates, deleted)
+
+        self._written.update(written)
+        self._final_logs.update(final_logs)
+        for uid in deleted:
+            self._written.pop(uid, None)
+            self._final_logs.discard(uid)
+        self._cursor = cursor
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to persist task state.")
+
+    async def start(self) -> List[str]:
+        """Opens the store, restores saved tasks and starts the flush loop. Returns IDs to re-queue."""
+        if not self.enabled:
+            return []
+
+        await self._run_io(self._open)
+        requeue = [uid for uid in (self._restore(row) for row in await self._run_io(self._read_all)) if uid]
+        requeue = _share_requeued(requeue)
+        self._cursor = task_state.clock.value
+        self._loop_task = asyncio.create_task(self._flush_loop())
+        logger.info(f"Task store opened at {self.path} ({len(tasks)} tasks restored).")
+        return requeue
+
+    async def stop(self):
+        """Stops the flush loop and writes any pending changes."""
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+        if self._db is not None:
+            await self.flush()
+            await self._run_io(self._db.close)
+            self._db = None
+
+    def _restore(self, row: Tuple) -> Optional[str]:
+        """Recreates a task from its row. Returns the uid if it was interrupted and should be re-queued."""
+        record = dict(zip(_COLUMNS, row))
+        uid = record["uid"]
+        cmd = shlex.split(record["cmd"])
+        settings = json.loads(record["settings"]) if record["settings"] else None
+        data = new_task_entry(uid, record["binary"], cmd, json.loads(record["callbacks"]), record["priority"], settings)
+        data["created_at"] = record["created_at"]
+        if record["share_key"]:
+            data["share_key"] = tuple(json.loads(record["share_key"]))
+        tasks[uid] = data
+
+        if record["completed"]:
+            data["completed"] = True
+            data["status"] = record["status"]
+            data["final_log"] = record["log"]
+            data["finished_at"] = record["updated_at"]
+            data["output_path"] = extract_final_file_path(record["log"], record["binary"])
+            self._written[uid] = task_version(data)
+            self._final_logs.add(uid)
+            return None
+
+        if record["pid"]:
+            _terminate_orphan(uid, record["pid"], cmd[0])
+
+        if TASK_RECOVERY_POLICY == "requeue":
+            logger.warning(f"[{uid}] Task was interrupted by a restart, re-queueing.")
+            data["log"].append("[SYSTEM] Task was interrupted by a server restart and has been re-queued.")
+            return uid
+
+        logger.warning(f"[{uid}] Task was interrupted by a restart, marking as failed.")
+        data["completed"] = True
+        data["status"] = TaskStatus.ERROR.value
+        data["final_log"] = f"{record['log']}\n\n[SYSTEM ERROR] Task was interrupted by a server restart."
+        data["finished_at"] = time.time()
+        touch(data)
+        return None
+
+
+def _share_requeued(uids: List[str]) -> List[str]:
+    """
+    Re-attaches re-queued tasks that download the same video, binary and
+    quality to the first of them, so each download restarts once. Returns
+    the tasks to queue.
+    """
+    sources: Dict[Tuple[str, str, str], str] = {}
+    queued = []
+    for uid in uids:
+        data = tasks[uid]
+        share_key = data.get("share_key")
+        source_uid = sources.get(share_key) if share_key is not None else None
+        if source_uid is None:
+            if share_key is not None:
+                sources[share_key] = uid
+            queued.append(uid)
+            continue
+        subscribe(uid, data, source_uid)
+        logger.info(f"[{uid}] Sharing the re-queued download of task {source_uid}.")
+    return queued
+
+
+def _terminate_orphan(uid: str, pid: int, binary: str):
+    """Terminates a subprocess (and its process group) left behind by a previous run, if the PID still belongs to it."""
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            cmdline = f.read().replace(b"\0", b" ").decode("utf-8", errors="replace")
+    except OSError:
+        return
+
+    if binary not in cmdline:
+        return
+
+    logger.warning(f"[{uid}] Terminating orphaned process {pid} from a previous run.")
+    try:
+        if os.getpgid(pid) == pid:
+            os.killpg(pid, signal.SIGTERM)
+        else:
+            os.kill(pid, signal.SIGTERM)
+    except OSError:
+        logger.exception(f"[{uid}] Could not terminate orphaned process {pid}.")
+
+
+task_store = TaskStore()
@@ -60,12 +60,23 @@ const AppConfig = {
     // Flags related to MKV merging for yt-dlp
     MKV_HIERARCHY: ['--recode-video', '--remux-video', '--merge-output-format'],
 
+    // Height of a task row including the gap below it, in pixels; rows are positioned by index
+    TASK_ROW_HEIGHT: 104,
+    TASK_ROW_GAP: 14,
+
+    // Rows rendered above and below the visible part of the task list
+    TASK_ROW_OVERSCAN: 5,
+
+    // Only the end of longer logs is loaded into the log dialog
+    LOG_VIEW_MAX_BYTES: 1024 * 1024,
+
     // List of element IDs to cache at startup
     ELEMENT_IDS: [
         "startBtn", "updateYtarchiveBtn", "updateYtdlpBtn", "youtubeID", "notice",
         "callbackRow", "callbackList", "taskList", "customParams", "mkv", "quality",
         "binary", "parametersToggle", "parametersContent", "buttonGroup",
-        "updateControlsContainer",
+        "updateControlsContainer", "logModal", "logModalTitle", "logModalRaw",
+        "logModalClose", "logModalBody",
     ],
 
     get ALL_ELEMENT_IDS() {
@@ -179,121 +190,195 @@ class DOMHandler {
         }
     }
 
-    updateOrCreateTasks(sortedUids, data, taskElements, collapsedLogs) {
-        const container = this.getElement("taskList");
-        const fragment = document.createDocumentFragment();
+    formatBytes(bytes) {
+        const units = ["B", "KiB", "MiB", "GiB", "TiB"];
+        let value = bytes;
+        let unit = 0;
+        while (value >= 1024 && unit < units.length - 1) {
+            value /= 1024;
+            unit++;
+        }
+        return `${value.toFixed(unit ? 1 : 0)} ${units[unit]}`;
+    }
 
-        for (const uid of sortedUids) {
-            const rec = data[uid];
-            const logId = `log-${uid}`;
-            const statusText = AppConfig.TASK_STATUS_MAP[rec.status] || rec.status;
-            const outputText = (rec.output || "").replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
-            const currentLogText = `<br>${outputText.replace(/\n/g, "<br>")}`;
-
-            let isCollapsed = collapsedLogs.has(logId);
-            let taskDiv = taskElements.get(uid);
-
-            if (!taskDiv || !taskDiv.querySelector) {
-                taskDiv = document.createElement("div");
-                taskDiv.className = "task";
-                taskDiv.dataset.id = uid;
-
-                const idDisplay = document.createElement("strong");
-                idDisplay.textContent = uid;
-                idDisplay.dataset.idDisplay = true;
-
-                taskDiv.innerHTML = `
-                    <div class="task-header">
-                        <strong data-id-display>${uid}</strong>
-                        <span class="task-status ${statusText.toLowerCase()}">${statusText}</span>
-                        <button class="remove-btn" data-id="${uid}">Remove</button>
-                    </div>
-                    <div class="log-toggle" data-target="${logId}">
-                        ${isCollapsed ? '▶ Logs' : '▼ Logs'}
-                    </div>
-                    <div id="${logId}" class="log ${isCollapsed ? '' : 'expanded'}" data-auto-scroll="${!isCollapsed}">${currentLogText}</div>
-                `;
-
-                taskElements.set(uid, taskDiv);
-                fragment.appendChild(taskDiv);
-                this.ensureScrollListener(taskDiv);
-            } else {
-                taskDiv.querySelector('.task-status').textContent = statusText;
-                taskDiv.querySelector('.task-status').className = `task-status ${statusText.toLowerCase()}`;
+    formatProgress(rec) {
+        const p = rec.progress;
+        const bw = rec.bandwidth;
+        if (rec.diskWait) {
+            return rec.diskWait;
+        }
+        if (rec.liveWait) {
+            const w = rec.liveWait;
+            const start = w.scheduledStart ? ` · scheduled ${new Date(w.scheduledStart * 1000).toLocaleString()}` : "";
+            return `Waiting for the stream${start} · next check ${new Date(w.nextCheck * 1000).toLocaleTimeString()}`;
+        }
+        if (rec.move && rec.move.state !== "done") {
+            if (rec.move.state === "failed") return `Move failed: ${rec.move.error}`;
+            const percent = rec.move.total ? (100 * rec.move.bytes / rec.move.total).toFixed(1) : "100.0";
+            return `Moving to ${rec.move.destination} · ${percent}% of ${this.formatBytes(rec.move.total)}`;
+        }
+        const res = rec.resources;
+        if ((!p && !bw && !res) || rec.status !== TaskStatus.ACTIVE) {
+            return "";
+        }
 
-                const logDiv = taskDiv.querySelector(`#${logId}`);
-                const logToggle = taskDiv.querySelector('.log-toggle');
+        const parts = [];
+        if (p) {
+            if (p.percent != null) parts.push(`${p.percent.toFixed(1)}%`);
+            if (p.videoFragments != null) parts.push(`${p.videoFragments} frags`);
+            if (p.downloadedBytes != null) parts.push(this.formatBytes(p.downloadedBytes));
+            if (p.speed != null) parts.push(`${this.formatBytes(p.speed)}/s`);
+            if (p.eta != null) parts.push(`ETA ${Math.floor(p.eta / 60)}:${String(p.eta % 60).padStart(2, "0")}`);
+        }
+        if (bw) {
+            const limit = bw.rateLimit != null ? ` ≤ ${this.formatBytes(bw.rateLimit)}/s` : "";
+            parts.push(`${bw.threads} threads${limit}`);
+        }
+        if (res) {
+            parts.push(`CPU ${res.cpuPercent}% · RAM ${this.formatBytes(res.rssBytes)} · write ${this.formatBytes(res.writeRate)}/s`);
+        }
+        return parts.join(" · ");
+    }
 
-                if (logDiv.innerHTML !== currentLogText) {
-                    logDiv.innerHTML = currentLogText;
-                }
+    taskRowText(rec) {
+        const statusText = AppConfig.TASK_STATUS_MAP[rec.status] || String(rec.status);
+        const pendingCallbacks = Object.entries(rec.callbacks || {})
+            .filter(([, state]) => state !== "done")
+            .map(([cbId, state]) => `${cbId}: ${state}`);
+        const queueText = rec.queuePosition != null
+            ? `queued #${rec.queuePosition + 1}`
+            : pendingCallbacks.join(", ") || this.formatProgress(rec);
+        const queue = [queueText, rec.worker && `on ${rec.worker}`].filter(Boolean).join(" · ");
+        return { status: statusText, queue, line: rec.lastLine || "" };
+    }
 
-                const shouldBeExpanded = !isCollapsed;
-                const isCurrentlyExpanded = logDiv.classList.contains('expanded');
+    visibleTaskRange(count) {
+        const container = this.getElement("taskList");
+        const rowHeight = AppConfig.TASK_ROW_HEIGHT;
+        const top = container.getBoundingClientRect().top;
+        const first = Math.floor(-top / rowHeight) - AppConfig.TASK_ROW_OVERSCAN;
+        const last = Math.ceil((window.innerHeight - top) / rowHeight) + AppConfig.TASK_ROW_OVERSCAN;
+        return [Math.max(0, first), Math.min(count, Math.max(0, last))];
+    }
+
+    createTaskRow(uid) {
+        const taskDiv = document.createElement("div");
+        taskDiv.className = "task";
+        taskDiv.dataset.id = uid;
+        taskDiv.style.height = `${AppConfig.TASK_ROW_HEIGHT - AppConfig.TASK_ROW_GAP}px`;
+        taskDiv.innerHTML = `
+            <div class="task-header">
+                <strong></strong>
+                <span class="task-status" title="Show log"></span>
+                <span class="task-queue"></span>
+                <button class="log-btn">Log</button>
+                <button class="remove-btn">Remove</button>
+            </div>
+            <div class="task-line"></div>
+        `;
+        taskDiv.querySelector("strong").textContent = uid;
+        taskDiv.querySelectorAll(".task-status, .log-btn, .remove-btn").forEach(el => { el.dataset.id = uid; });
+        return {
+            element: taskDiv,
+            status: taskDiv.querySelector(".task-status"),
+            queue: taskDiv.querySelector(".task-queue"),
+            line: taskDiv.querySelector(".task-line"),
+            shown: {},
+        };
+    }
 
-                if (shouldBeExpanded !== isCurrentlyExpanded) {
-                    logDiv.classList.toggle('expanded', shouldBeExpanded);
-                    logToggle.textContent = shouldBeExpanded ? "▼ Logs" : "▶ Logs";
-                    if (shouldBeExpanded) {
-                        logDiv.dataset.autoScroll = "true";
-                    }
-                }
-            }
+    patchTaskRow(row, rec, index) {
+        const shown = row.shown;
+        if (shown.index !== index) {
+            row.element.style.top = `${index * AppConfig.TASK_ROW_HEIGHT}px`;
+            shown.index = index;
         }
 
-        container.appendChild(fragment);
-    }
-
-    ensureScrollListener(taskElement) {
-        const logDiv = taskElement.querySelector(".log");
-        if (!logDiv || logDiv.dataset.scrollListener === 'true') {
-            return;
+        const text = this.taskRowText(rec);
+        if (shown.status !== text.status) {
+            row.status.textContent = text.status;
+            row.status.className = `task-status ${text.status.toLowerCase()}`;
+        }
+        if (shown.queue !== text.queue) {
+            row.queue.textContent = text.queue;
         }
+        if (shown.line !== text.line) {
+            row.line.textContent = text.line;
+            row.line.title = text.line;
+        }
+        Object.assign(shown, text);
+    }
 
-        logDiv.addEventListener('scroll', () => {
-            const scrollTolerance = 5;
-            const isScrolledToBottom = (logDiv.scrollHeight - logDiv.scrollTop - logDiv.clientHeight) < scrollTolerance;
-            logDiv.dataset.autoScroll = isScrolledToBottom ? "true" : "false";
+    renderTaskList(order, tasks, dirty, rows) {
+        // Only the rows in view (plus some overscan) exist in the DOM; the container keeps the full height.
+        const container = this.getElement("taskList");
+        container.style.height = `${order.length * AppConfig.TASK_ROW_HEIGHT}px`;
+
+        const [first, last] = this.visibleTaskRange(order.length);
+        const visible = new Set(order.slice(first, last));
+        rows.forEach((row, uid) => {
+            if (!visible.has(uid)) {
+                this.removeElement(row.element);
+                rows.delete(uid);
+            }
         });
 
-        logDiv.dataset.scrollListener = 'true';
-    }
-
-    toggleLogState(tgl, collapsedLogs) {
-        const log = document.getElementById(tgl.dataset.target);
-        if (!log) {
-            return;
+        const fragment = document.createDocumentFragment();
+        for (let index = first; index < last; index++) {
+            const uid = order[index];
+            let row = rows.get(uid);
+            if (!row) {
+                row = this.createTaskRow(uid);
+                rows.set(uid, row);
+                fragment.appendChild(row.element);
+            } else if (!dirty.has(uid) && row.shown.index === index) {
+                continue;
+            }
+            this.patchTaskRow(row, tasks.get(uid), index);
         }
+        container.appendChild(fragment);
+    }
 
-        const logId = log.id;
-        const isOpen = log.classList.contains("expanded");
+    showLogModal(uid) {
+        this.getElement("logModalTitle").textContent = uid;
+        this.getElement("logModalRaw").href = `/status/${encodeURIComponent(uid)}/log`;
+        this.getElement("logModalBody").textContent = "";
+        this.getElement("logModal").hidden = false;
+    }
 
-        if (isOpen) {
-            log.classList.remove("expanded");
-            collapsedLogs.add(logId);
-            tgl.textContent = "▶ Logs";
-            log.dataset.autoScroll = "false";
-        } else {
-            log.classList.add("expanded");
-            collapsedLogs.delete(logId);
-            tgl.textContent = "▼ Logs";
-            this.setLogScroll(log, true);
-            log.dataset.autoScroll = "true";
-        }
+    hideLogModal() {
+        this.getElement("logModal").hidden = true;
+        this.getElement("logModalBody").textContent = "";
+    }
 
-        this.ensureScrollListener(log.closest(".task"));
+    appendLog(text) {
+        const body = this.getElement("logModalBody");
+        const scrollTolerance = 5;
+        const isScrolledToBottom = (body.scrollHeight - body.scrollTop - body.clientHeight) < scrollTolerance;
+        body.appendChild(document.createTextNode(text));
+        this.setLogScroll(body, isScrolledToBottom);
     }
 }
 
 class WebUIController {
     statusIntervalId = null;
-    collapsedLogs = new Set(JSON.parse(localStorage.getItem('collapsedLogs') || '[]'));
-    taskElements = new Map();
+    statusStream = null;
+    statusCursor = 0;
+    statusEtag = null;
+    statusInFlight = false;
+    tasks = new Map();
+    taskOrder = [];
+    dirtyTasks = new Set();
+    taskRows = new Map();
+    renderPending = false;
+    logView = null;
     dom = new DOMHandler();
 
     constructor() {
         this.removeTaskHandler = this.removeTaskHandler.bind(this);
-        this.toggleLog = this.toggleLog.bind(this);
+        this.openLog = this.openLog.bind(this);
+        this.closeLog = this.closeLog.bind(this);
+        this.scheduleRender = this.scheduleRender.bind(this);
         this.startDownload = this.startDownload.bind(this);
         this.updateYtarchive = this.updateYtarchive.bind(this);
         this.updateYtdlp = this.updateYtdlp.bind(this);
@@ -315,7 +400,7 @@ class WebUIController {
         this.setupListeners();
         this.dom.loadCallbacks();
         this.loadStatus();
-        this.startStatusInterval();
+        this.startStatusStream();
     }
 
     createParamConfigMap() {
@@ -346,11 +431,26 @@ class WebUIController {
             const target = event.target;
             if (target.classList.contains('remove-btn')) {
                 this.removeTaskHandler(target);
-            } else if (target.classList.contains('log-toggle')) {
-                this.toggleLog(target);
+            } else if (target.classList.contains('log-btn') || target.classList.contains('task-status')) {
+                this.openLog(target.dataset.id);
             }
         });
 
+        addListener("logModalClose", "click", this.closeLog);
+        addListener("logModal", "click", (event) => {
+            if (event.target === this.getElement("logModal")) {
+                this.closeLog();
+            }
+        });
+        document.addEventListener("keydown", (event) => {
+            if (event.key === "Escape" && this.logView) {
+                this.closeLog();
+            }
+        });
+
+        window.addEventListener("scroll", this.scheduleRender, { passive: true });
+        window.addEventListener("resize", this.scheduleRender);
+
         AppConfig.PARAMETER_CONFIG.forEach(config => {
             const element = this.getElement(config.elementId);
             if (!element) {
@@ -534,15 +634,6 @@ class WebUIController {
         return input;
     }
 
-    _getTaskElementStatus(youtubeID) {
-        const taskElement = this.taskElements.get(youtubeID);
-        if (!taskElement) {
-            return null;
-        }
-        const statusElement = taskElement.querySelector('.task-status');
-        return statusElement ? statusElement.textContent : 'Unknown';
-    }
-
     async startDownload() {
         const youtubeIDInput = this.getElement("youtubeID");
         const youtubeID = this.extractVideoId(youtubeIDInput.value.trim());
@@ -551,13 +642,11 @@ class WebUIController {
             return;
         }
 
-        const taskElement = this.taskElements.get(youtubeID);
-        if (taskElement) {
-            const statusText = this._getTaskElementStatus(youtubeID);
-            if (['Active', 'Starting'].includes(statusText)) {
-                this.dom.notify(`A task for video ID ${youtubeID} is already running (Status: ${statusText}).`, 'error');
-                return;
-            }
+        const task = this.tasks.get(youtubeID);
+        if (task && [TaskStatus.ACTIVE, TaskStatus.STARTING].includes(task.status)) {
+            const statusText = AppConfig.TASK_STATUS_MAP[task.status];
+            this.dom.notify(`A task for video ID ${youtubeID} is already running (Status: ${statusText}).`, 'error');
+            return;
         }
 
         youtubeIDInput.value = "";
@@ -622,7 +711,9 @@ class WebUIController {
             const data = await resp.json();
             youtubeIDInput.value = "";
             if (resp.ok) {
-                this.dom.notify("Task started: " + data.id);
+                this.dom.notify(data.sharedWith
+                    ? `Task ${data.id} shares the running download of ${data.sharedWith}`
+                    : "Task started: " + data.id);
                 await this.loadStatus();
             } else {
                 const detail = data.detail || `Server error (Status: ${resp.status}).`;
@@ -635,21 +726,22 @@ class WebUIController {
     }
 
     async updateYtdlp() {
-        await this._sendUpdateCommand("/update-ytdlp", "yt-dlp");
+        await this._sendUpdateCommand("/update-ytdlp", "yt-dlp", "ytdlp");
     }
 
     async updateYtarchive() {
-        await this._sendUpdateCommand("/update-ytarchive", "ytarchive");
+        await this._sendUpdateCommand("/update-ytarchive", "ytarchive", "ytarchive");
     }
 
-    async _sendUpdateCommand(url, name) {
+    async _sendUpdateCommand(url, name, binaryKey) {
         this.dom.notify(`Starting ${name} update...`, 'warning');
         try {
             const resp = await fetch(url, { method: "POST" });
             const data = await resp.json();
 
             if (resp.ok) {
-                this.dom.notify(data.message);
+                this.dom.notify(data.message, 'warning');
+                this._watchUpdateJob(binaryKey);
             } else {
                 const errorMessage = data.detail || "An unknown error occurred.";
                 this.dom.notify(errorMessage, 'error');
@@ -661,6 +753,23 @@ class WebUIController {
         this.loadStatus();
     }
 
+    _watchUpdateJob(binaryKey) {
+        const poll = async () => {
+            try {
+                const resp = await fetch("/binaries");
+                const job = resp.ok ? (await resp.json())[binaryKey] : null;
+                if (job && job.state === "running") {
+                    setTimeout(poll, 2000);
+                } else if (job && job.message) {
+                    this.dom.notify(job.message, job.state === "failed" ? 'error' : 'success');
+                }
+            } catch (error) {
+                console.error("Error checking update progress:", error);
+            }
+        };
+        setTimeout(poll, 2000);
+    }
+
     getRefreshIntervalMs() {
         const refreshIntervalEl = this.getElement("refreshInterval");
         const intervalSeconds = parseInt(refreshIntervalEl ? refreshIntervalEl.value : "2") || 2;
@@ -670,68 +779,125 @@ class WebUIController {
     startStatusInterval() {
         if (this.statusIntervalId) {
             clearInterval(this.statusIntervalId);
+            this.statusIntervalId = null;
+        }
+        if (this.statusStream) {
+            return;
         }
         this.statusIntervalId = setInterval(() => this.loadStatus(), this.getRefreshIntervalMs());
     }
 
-    async loadStatus() {
-        try {
-            const resp = await fetch("/status");
-            if (!resp.ok) {
-                const errorText = await resp.text();
-                console.error(`[LoadStatus Error ${resp.status}] Server responded with non-OK status. Response Body:`, errorText);
-                return;
+    startStatusStream() {
+        if (!window.EventSource) {
+            this.startStatusInterval();
+            return;
+        }
+
+        const stream = new EventSource(`/status/stream?since=${this.statusCursor}&tail=1`);
+        this.statusStream = stream;
+
+        stream.addEventListener("open", () => this.startStatusInterval());
+        stream.addEventListener("status", (event) => {
+            try {
+                this._applyStatusDelta(JSON.parse(event.data));
+            } catch (error) {
+                console.error("Error handling status event:", error);
             }
-            const data = await resp.json();
-            const incomingTaskIds = new Set(Object.keys(data));
-            const sortedUids = Array.from(incomingTaskIds);
+        });
+        stream.addEventListener("error", () => {
+            // EventSource retries by itself; only fall back to polling once it gives up.
+            if (stream.readyState === EventSource.CLOSED) {
+                console.warn("Status stream unavailable, falling back to polling.");
+                this.statusStream = null;
+                this.startStatusInterval();
+            }
+        });
+    }
 
-            this._removeOldTasks(incomingTaskIds);
-            this.dom.updateOrCreateTasks(sortedUids, data, this.taskElements, this.collapsedLogs);
+    _lastLine(output) {
+        const lines = (output || "").split("\n").filter(line => line.trim());
+        return lines.length ? lines[lines.length - 1] : null;
+    }
 
-            this.taskElements.forEach(taskDiv => {
-                const logDiv = taskDiv.querySelector('.log');
-                if (logDiv && logDiv.classList.contains('expanded') && logDiv.dataset.autoScroll === "true") {
-                    this.dom.setLogScroll(logDiv, true);
-                }
-            });
-        } catch (error) {
-            console.error("Error fetching status:", error);
+    _applyStatusDelta(delta) {
+        if (!delta.full && delta.cursor <= this.statusCursor) {
+            return;
         }
-    }
+        this.statusCursor = delta.cursor;
+
+        // The list only shows the last log line of each task (the status is requested with tail=1);
+        // full logs are fetched when the log dialog is opened.
+        let orderChanged = false;
+        if (delta.full) {
+            Array.from(this.tasks.keys())
+                .filter(uid => !(uid in delta.tasks))
+                .forEach(uid => { orderChanged = this._removeTask(uid) || orderChanged; });
+        }
+        delta.removed.forEach(uid => { orderChanged = this._removeTask(uid) || orderChanged; });
 
-    _cleanupTask(uid, taskElement) {
-        const removeBtn = taskElement.querySelector(".remove-btn");
-        const existingTimeoutId = removeBtn ? removeBtn.dataset.confirmTimeoutId : null;
-        if (existingTimeoutId) {
-            clearTimeout(existingTimeoutId);
+        for (const [uid, rec] of Object.entries(delta.tasks)) {
+            const previous = this.tasks.get(uid);
+            if (previous && previous.version === rec.version) {
+                continue;
+            }
+            orderChanged = orderChanged || !previous;
+            const { output, ...fields } = rec;
+            const lastLine = this._lastLine(output) ?? (previous ? previous.lastLine : "");
+            this.tasks.set(uid, { ...fields, lastLine });
+            this.dirtyTasks.add(uid);
         }
 
-        this.dom.removeElement(taskElement);
-        this.taskElements.delete(uid);
-        this.collapsedLogs.delete(`log-${uid}`);
+        if (orderChanged) {
+            this.taskOrder = Array.from(this.tasks.keys());
+        }
+        this.scheduleRender();
+    }
 
-        if (taskElement.dataset.id) {
-            localStorage.setItem('collapsedLogs', JSON.stringify(Array.from(this.collapsedLogs)));
+    scheduleRender() {
+        if (this.renderPending) {
+            return;
         }
+        this.renderPending = true;
+        requestAnimationFrame(() => {
+            this.renderPending = false;
+            this.dom.renderTaskList(this.taskOrder, this.tasks, this.dirtyTasks, this.taskRows);
+            this.dirtyTasks.clear();
+        });
     }
 
-    _removeOldTasks(incomingTaskIds) {
-        const tasksToRemove = new Map();
-        this.taskElements.forEach((element, uid) => {
-            if (!incomingTaskIds.has(uid)) {
-                tasksToRemove.set(uid, element);
+    async loadStatus() {
+        if (this.statusInFlight) {
+            return;
+        }
+        this.statusInFlight = true;
+
+        try {
+            const headers = this.statusEtag ? { "If-None-Match": this.statusEtag } : {};
+            const resp = await fetch(`/status?since=${this.statusCursor}&tail=1`, { headers, cache: "no-store" });
+            if (resp.status === 304) {
+                return;
             }
-        });
+            if (!resp.ok) {
+                const errorText = await resp.text();
+                console.error(`[LoadStatus Error ${resp.status}] Server responded with non-OK status. Response Body:`, errorText);
+                return;
+            }
+            this.statusEtag = resp.headers.get("ETag");
+            this._applyStatusDelta(await resp.json());
+        } catch (error) {
+            console.error("Error fetching status:", error);
+        } finally {
+            this.statusInFlight = false;
+        }
+    }
 
-        tasksToRemove.forEach((taskElement, uid) => {
-            this._cleanupTask(uid, taskElement);
-        });
+    _removeTask(uid) {
+        this.dirtyTasks.delete(uid);
+        return this.tasks.delete(uid);
     }
 
     async removeTaskHandler(btn) {
         const taskId = btn.dataset.id;
-        const taskElement = btn.closest(".task");
 
         if (btn.classList.contains('confirm-state')) {
             const existingTimeoutId = btn.dataset.confirmTimeoutId;
@@ -748,7 +914,10 @@ class WebUIController {
                 });
 
                 if (resp.ok) {
-                    this._cleanupTask(taskId, taskElement);
+                    if (this._removeTask(taskId)) {
+                        this.taskOrder = Array.from(this.tasks.keys());
+                        this.scheduleRender();
+                    }
                     this.dom.notify(`Task deleted: ${taskId}`);
                 } else {
                     console.error(`Failed to delete task ${taskId}. Status: ${resp.status}`);
@@ -780,9 +949,67 @@ class WebUIController {
     }
 
 
-    toggleLog(tgl) {
-        this.dom.toggleLogState(tgl, this.collapsedLogs);
-        localStorage.setItem('collapsedLogs', JSON.stringify(Array.from(this.collapsedLogs)));
+    async openLog(uid) {
+        this.closeLog();
+        const view = { uid, offset: 0, decoder: new TextDecoder(), timeoutId: null };
+        this.logView = view;
+        this.dom.showLogModal(uid);
+
+        try {
+            const resp = await fetch(`/status/${encodeURIComponent(uid)}/log?limit=1`, { cache: "no-store" });
+            if (!resp.ok) {
+                this.dom.appendLog(`Log not available (Status: ${resp.status}).`);
+                return;
+            }
+            const size = parseInt(resp.headers.get("X-Log-Size")) || 0;
+            if (size > AppConfig.LOG_VIEW_MAX_BYTES) {
+                view.offset = size - AppConfig.LOG_VIEW_MAX_BYTES;
+                view.skipPartialLine = true;
+                this.dom.appendLog(`[... ${this.dom.formatBytes(view.offset)} earlier output not shown, open the raw log for all of it ...]\n`);
+            }
+            await this._followLog(view);
+        } catch (error) {
+            console.error(`Error loading log of ${uid}:`, error);
+            this.dom.appendLog("Failed to load the log. (Network Error)");
+        }
+    }
+
+    async _followLog(view) {
+        // Reads the log from the current offset, then keeps polling while the task is still running.
+        while (this.logView === view) {
+            const resp = await fetch(`/status/${encodeURIComponent(view.uid)}/log?offset=${view.offset}`, { cache: "no-store" });
+            if (!resp.ok || this.logView !== view) {
+                return;
+            }
+            const size = parseInt(resp.headers.get("X-Log-Size")) || 0;
+            view.offset = parseInt(resp.headers.get("X-Log-Next-Offset")) || view.offset;
+            let text = view.decoder.decode(await resp.arrayBuffer(), { stream: true });
+            if (view.skipPartialLine && text) {
+                text = text.slice(text.indexOf("\n") + 1);
+                view.skipPartialLine = false;
+            }
+            if (text) {
+                this.dom.appendLog(text);
+            }
+            if (view.offset < size) {
+                continue;
+            }
+
+            const task = this.tasks.get(view.uid);
+            if (!task || ![TaskStatus.ACTIVE, TaskStatus.STARTING].includes(task.status)) {
+                return;
+            }
+            await new Promise(resolve => { view.timeoutId = setTimeout(resolve, this.getRefreshIntervalMs()); });
+        }
+    }
+
+    closeLog() {
+        if (!this.logView) {
+            return;
+        }
+        clearTimeout(this.logView.timeoutId);
+        this.logView = null;
+        this.dom.hideLogModal();
     }
 }
 